@@ -0,0 +1,331 @@
+"""
+Command line interface of the car counting system.
+
+    python main.py count IMAGE [--config FILE] [--profile-output DIR]
+    python main.py evaluate DATASET [--profile NAME ...] [--profiles-file FILE]
+    python main.py batch DIRECTORY [--output results.jsonl] [--workers N] [--io N]
+    python main.py watch DIRECTORY [--index FILE] [--output results.jsonl] [--poll]
+    python main.py results hourly|recent|cameras [--camera NAME] [--days N]
+    python main.py serve [--port N] [--workers N] [--queue-size N]
+    python main.py generate OUTPUT_DIR [--scenes N] [--cars N] ...
+
+Running main.py without arguments starts the GUI.
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CONFIG = os.path.join(REPO_ROOT, 'config.json')
+PROXY_MAX_SIDE = 800
+
+
+def _load_config_parameters(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('parameters')
+
+
+def builtin_profiles(config_path=DEFAULT_CONFIG):
+    """Profiles available by name: automatic and saved parameters, at full size and as a proxy."""
+    from app.core.evaluation import EvaluationProfile
+
+    profiles = {
+        'auto': EvaluationProfile('auto'),
+        'auto-proxy': EvaluationProfile('auto-proxy', max_side=PROXY_MAX_SIDE),
+    }
+    if os.path.exists(config_path):
+        params = _load_config_parameters(config_path)
+        profiles['config'] = EvaluationProfile('config', params)
+        profiles['config-proxy'] = EvaluationProfile('config-proxy', params, max_side=PROXY_MAX_SIDE)
+    return profiles
+
+
+def command_count(args):
+    import time
+    import cv2
+    from app.core.image_processor import process_image_pipeline
+    from app.core.instrumentation import JOB_SECONDS, JOBS, instrumentation_from_environment
+    from app.utils.profiling import profile_run
+
+    image = cv2.imread(args.image)
+    if image is None:
+        print(f"Error: No se pudo cargar la imagen: {args.image}", file=sys.stderr)
+        return 2
+    params = _load_config_parameters(args.config) if args.config else None
+
+    start = time.perf_counter()
+    with profile_run(args.image, params, args.profile_output):
+        _, car_count, _ = process_image_pipeline(image, params, instrumentation=instrumentation_from_environment())
+    JOB_SECONDS.labels(source='cli').observe(time.perf_counter() - start)
+    JOBS.labels(source='cli', outcome='finished').inc()
+    print(f"{os.path.basename(args.image)}: {car_count} coches")
+    return 0
+
+
+def command_evaluate(args):
+    from app.core.evaluation import (
+        build_report, evaluate_profiles, format_report, load_labeled_set, load_profiles_file
+    )
+
+    labeled = load_labeled_set(args.dataset)
+    if not labeled:
+        print(f"Error: No hay imágenes etiquetadas en {args.dataset}", file=sys.stderr)
+        return 2
+
+    available = builtin_profiles(args.config)
+    profiles = []
+    for name in args.profile or []:
+        if name not in available:
+            print(f"Error: Perfil desconocido '{name}'. Disponibles: {', '.join(available)}", file=sys.stderr)
+            return 2
+        profiles.append(available[name])
+    if args.profiles_file:
+        profiles.extend(load_profiles_file(args.profiles_file))
+    if not profiles:
+        profiles = list(available.values())
+
+    def report_progress(done, total, message):
+        if not args.quiet:
+            print(f"[{done}/{total}] {message}", file=sys.stderr)
+
+    reports = evaluate_profiles(labeled, profiles, args.iou, args.repeat, report_progress)
+    report = build_report(reports, args.iou)
+    print(format_report(report))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nInforme guardado en {args.output}")
+    return 0
+
+
+def command_generate(args):
+    from app.core.synthetic_scene import SceneSettings, generate_dataset
+
+    settings = SceneSettings(
+        car_length=(args.car_min, args.car_max),
+        orientation=(-args.max_angle, args.max_angle),
+        tree_count=args.trees,
+        shadows=not args.no_shadows,
+        lane_spacing=args.lane_spacing,
+    )
+    try:
+        paths = generate_dataset(args.output_dir, args.scenes, args.width, args.height, args.cars,
+                                 seed=args.seed, settings=settings)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    print(f"{len(paths)} escenas generadas en {args.output_dir}")
+    return 0
+
+
+def command_batch(args):
+    from app.services.ingestion import count_directory
+
+    params = _load_config_parameters(args.config) if args.config else None
+    output = open(args.output, 'w', encoding='utf-8') if args.output else None
+    store = _open_results_store(args.results_db)
+    total_cars = 0
+
+    def on_result(result):
+        nonlocal total_cars
+        total_cars += result.car_count
+        if output is not None:
+            output.write(json.dumps(result.as_dict(), ensure_ascii=False) + "\n")
+        if store is not None and not result.error:
+            store.add(result.path, result.car_count, result.detections, params, source='batch')
+        if result.error:
+            print(f"Error: {result.path}: {result.error}", file=sys.stderr)
+        elif not args.quiet:
+            print(f"{result.path}: {result.car_count} coches")
+
+    try:
+        counted, failed, seconds = count_directory(
+            args.directory, params, on_result, workers=args.workers, io_concurrency=args.io,
+            prefetch=args.prefetch, recursive=not args.no_recursive
+        )
+    finally:
+        if output is not None:
+            output.close()
+        if store is not None:
+            store.close()
+    rate = counted / seconds if seconds > 0 else 0.0
+    print(f"{counted} imágenes ({failed} con error), {total_cars} coches en {seconds:.1f} s ({rate:.1f} imágenes/s)")
+    return 1 if failed else 0
+
+
+def command_watch(args):
+    from app.services.watcher import WatchDaemon, write_result_line
+
+    params = _load_config_parameters(args.config) if args.config else None
+    index_path = args.index or os.path.join(args.directory, '.car_counter_index.sqlite')
+    output = open(args.output, 'a', encoding='utf-8') if args.output else None
+    store = _open_results_store(args.results_db)
+
+    def on_result(result):
+        if output is not None:
+            write_result_line(output, result)
+        if store is not None and not result.error:
+            store.add(result.path, result.car_count, result.detections, params, source='watch')
+            store.flush()
+        if not result.error and not args.quiet:
+            print(f"{result.path}: {result.car_count} coches ({result.latency * 1000.0:.0f} ms desde la llegada)")
+
+    daemon = WatchDaemon(args.directory, index_path, params, on_result, workers=args.workers,
+                         recursive=not args.no_recursive, polling=args.poll, interval=args.interval)
+    # Service managers stop daemons with SIGTERM; finish the files in progress first
+    signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+    print(f"Vigilando {args.directory} (Ctrl+C para detener)")
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if output is not None:
+            output.close()
+        if store is not None:
+            store.close()
+    return 0
+
+
+def command_results(args):
+    import time
+    from datetime import datetime
+    from app.services.results_store import ResultsStore
+
+    if not os.path.exists(args.db):
+        print(f"Error: No existe la base de datos {args.db}", file=sys.stderr)
+        return 2
+    store = ResultsStore(args.db)
+    start = time.time() - args.days * 86400 if args.days else None
+    try:
+        if args.view == 'hourly':
+            rows = store.hourly_counts(args.camera, start)
+            print(f"{'Hora':<17} {'Imágenes':>9} {'Coches':>9}")
+            for hour, images, cars in rows:
+                print(f"{datetime.fromtimestamp(hour):%Y-%m-%d %H:%M} {images:>9} {cars:>9}")
+        elif args.view == 'cameras':
+            for name in store.cameras():
+                print(name)
+        else:
+            for row in reversed(store.images(args.camera, start, limit=args.limit)):
+                print(f"{datetime.fromtimestamp(row['ts']):%Y-%m-%d %H:%M:%S} {row['camera']:<15} "
+                      f"{row['count']:>5}  {row['path']}")
+    finally:
+        store.close()
+    return 0
+
+
+def _open_results_store(path):
+    if not path:
+        return None
+    from app.services.results_store import ResultsStore
+    return ResultsStore(path)
+
+
+def command_serve(args):
+    from app.services.http_server import serve
+
+    params = _load_config_parameters(args.config) if args.config else None
+    print(f"Servidor de conteo en http://{args.host}:{args.port} (Ctrl+C para detener)")
+    serve(args.host, args.port, args.workers, args.queue_size, params, args.root)
+    return 0
+
+
+def _default_results_db():
+    from app.services.results_store import DEFAULT_RESULTS_DB, results_db_from_environment
+    return results_db_from_environment() or DEFAULT_RESULTS_DB
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='main.py', description="Sistema de Conteo de Coches")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    count = subparsers.add_parser('count', help='Contar los coches de una imagen')
+    count.add_argument('image')
+    count.add_argument('--config', help='Archivo de parámetros (por defecto, modo automático)')
+    count.add_argument('--profile-output', metavar='DIR',
+                       help='Perfilar la ejecución y guardar .prof y .collapsed en DIR')
+    count.set_defaults(handler=command_count)
+
+    evaluate = subparsers.add_parser('evaluate', help='Medir precisión y latencia sobre un conjunto etiquetado')
+    evaluate.add_argument('dataset', help='Directorio con imágenes y sus etiquetas <nombre>.json')
+    evaluate.add_argument('--profile', action='append',
+                          help='Perfil a evaluar (auto, auto-proxy, config, config-proxy); repetible')
+    evaluate.add_argument('--profiles-file', help='JSON con perfiles adicionales {nombre: {params, max_side}}')
+    evaluate.add_argument('--config', default=DEFAULT_CONFIG, help='Archivo de parámetros de los perfiles config')
+    evaluate.add_argument('--iou', type=float, default=0.5, help='IoU mínimo para emparejar cajas (0.5)')
+    evaluate.add_argument('--repeat', type=int, default=1, help='Ejecuciones cronometradas por imagen')
+    evaluate.add_argument('--output', help='Guardar el informe completo en JSON')
+    evaluate.add_argument('--quiet', action='store_true', help='No mostrar el progreso')
+    evaluate.set_defaults(handler=command_evaluate)
+
+    batch = subparsers.add_parser('batch', help='Contar todas las imágenes de un árbol de directorios')
+    batch.add_argument('directory')
+    batch.add_argument('--output', help='Guardar un resultado JSON por línea')
+    batch.add_argument('--config', help='Archivo de parámetros (por defecto, modo automático)')
+    batch.add_argument('--workers', type=int, help='Hilos del pipeline (por defecto, uno por CPU)')
+    batch.add_argument('--io', type=int, default=16, help='Lecturas de archivo simultáneas')
+    batch.add_argument('--prefetch', type=int, default=32, help='Imágenes decodificadas en espera')
+    batch.add_argument('--no-recursive', action='store_true', help='No entrar en subdirectorios')
+    batch.add_argument('--quiet', action='store_true', help='Mostrar solo el resumen')
+    batch.add_argument('--results-db', help='Guardar los conteos y detecciones en esta base de datos SQLite')
+    batch.set_defaults(handler=command_batch)
+
+    watch = subparsers.add_parser('watch', help='Contar las imágenes nuevas de una carpeta vigilada')
+    watch.add_argument('directory')
+    watch.add_argument('--index', help='Índice SQLite (por defecto, .car_counter_index.sqlite en la carpeta)')
+    watch.add_argument('--output', help='Añadir un resultado JSON por línea a este archivo')
+    watch.add_argument('--config', help='Archivo de parámetros (por defecto, modo automático)')
+    watch.add_argument('--workers', type=int, help='Hilos del pipeline (por defecto, uno por CPU)')
+    watch.add_argument('--poll', action='store_true', help='Escanear periódicamente en lugar de usar inotify')
+    watch.add_argument('--interval', type=float, default=2.0, help='Segundos entre escaneos con --poll')
+    watch.add_argument('--no-recursive', action='store_true', help='No vigilar subdirectorios')
+    watch.add_argument('--quiet', action='store_true', help='No mostrar cada resultado')
+    watch.add_argument('--results-db', help='Guardar los conteos y detecciones en esta base de datos SQLite')
+    watch.set_defaults(handler=command_watch)
+
+    results = subparsers.add_parser('results', help='Consultar el historial de conteos')
+    results.add_argument('view', choices=['hourly', 'recent', 'cameras'])
+    results.add_argument('--db', default=_default_results_db(), help='Base de datos de resultados')
+    results.add_argument('--camera', help='Filtrar por cámara (nombre de la carpeta de origen)')
+    results.add_argument('--days', type=float, default=30, help='Solo los últimos N días (0 = todo)')
+    results.add_argument('--limit', type=int, default=50, help='Filas de la vista recent')
+    results.set_defaults(handler=command_results)
+
+    serve = subparsers.add_parser('serve', help='Servicio HTTP local de conteo')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--workers', type=int, help='Hilos del pipeline (por defecto, hasta 4)')
+    serve.add_argument('--queue-size', type=int, default=16,
+                       help='Peticiones en espera antes de responder 503')
+    serve.add_argument('--config', help='Parámetros por defecto (por defecto, modo automático)')
+    serve.add_argument('--root', help='Restringir las rutas locales a este directorio')
+    serve.set_defaults(handler=command_serve)
+
+    generate = subparsers.add_parser('generate', help='Generar escenas sintéticas con etiquetas exactas')
+    generate.add_argument('output_dir')
+    generate.add_argument('--scenes', type=int, default=10)
+    generate.add_argument('--width', type=int, default=1600)
+    generate.add_argument('--height', type=int, default=1200)
+    generate.add_argument('--cars', type=int, default=40)
+    generate.add_argument('--seed', type=int, default=0)
+    generate.add_argument('--car-min', type=int, default=80, help='Longitud mínima de coche en píxeles')
+    generate.add_argument('--car-max', type=int, default=110, help='Longitud máxima de coche en píxeles')
+    generate.add_argument('--max-angle', type=float, default=0.0, help='Rotación máxima en grados')
+    generate.add_argument('--trees', type=int, default=0)
+    generate.add_argument('--lane-spacing', type=int, default=0)
+    generate.add_argument('--no-shadows', action='store_true')
+    generate.set_defaults(handler=command_generate)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,30 @@
+import threading
+
+
+class ProcessingCancelled(Exception):
+    """Raised inside the processing pipeline when its cancellation token is set."""
+
+
+class CancellationToken:
+    """
+    Thread-safe flag used to request cooperative cancellation of a pipeline run.
+
+    The GUI thread calls cancel(); the pipeline polls the token between stages
+    and inside its per-component loops and raises ProcessingCancelled.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        """Request cancellation. Safe to call from any thread, more than once."""
+        self._event.set()
+
+    def is_cancelled(self):
+        """Check whether cancellation has been requested."""
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        """Raise ProcessingCancelled if cancellation has been requested."""
+        if self._event.is_set():
+            raise ProcessingCancelled("Procesamiento cancelado")
@@ -0,0 +1,95 @@
+import json
+
+import cv2
+import numpy as np
+
+# One row per detected (or ground-truth) car, in image pixel coordinates:
+# bounding box x, y, w, h, pixel area of the component and its centroid.
+DETECTION_DTYPE = np.dtype([
+    ('x', np.int32),
+    ('y', np.int32),
+    ('w', np.int32),
+    ('h', np.int32),
+    ('area', np.int32),
+    ('cx', np.float32),
+    ('cy', np.float32),
+])
+
+DETECTION_FIELDS = DETECTION_DTYPE.names
+
+
+def empty_detections(size=0):
+    """Return a zero-filled detection array with `size` rows."""
+    return np.zeros(size, dtype=DETECTION_DTYPE)
+
+
+def detections_from_stats(stats, centroids, indices):
+    """
+    Build detections from cv2.connectedComponentsWithStats output.
+
+    Args:
+        stats: (N, 5) array of x, y, w, h, area per label
+        centroids: (N, 2) array of centroid x, y per label
+        indices: Labels to keep, e.g. the components accepted as cars
+    """
+    indices = np.asarray(indices, dtype=np.intp)
+    detections = empty_detections(len(indices))
+    if len(indices):
+        selected = stats[indices]
+        detections['x'] = selected[:, cv2.CC_STAT_LEFT]
+        detections['y'] = selected[:, cv2.CC_STAT_TOP]
+        detections['w'] = selected[:, cv2.CC_STAT_WIDTH]
+        detections['h'] = selected[:, cv2.CC_STAT_HEIGHT]
+        detections['area'] = selected[:, cv2.CC_STAT_AREA]
+        detections['cx'] = centroids[indices, 0]
+        detections['cy'] = centroids[indices, 1]
+    return detections
+
+
+def detections_to_list(detections):
+    """Convert a detection array to a list of JSON-serializable dictionaries."""
+    return [
+        {field: row[field].item() for field in DETECTION_FIELDS}
+        for row in detections
+    ]
+
+
+def detections_from_list(items):
+    """Build a detection array from dictionaries as produced by detections_to_list."""
+    detections = empty_detections(len(items))
+    for index, item in enumerate(items):
+        detections[index] = tuple(item.get(field, 0) for field in DETECTION_FIELDS)
+    return detections
+
+
+def save_labels(path, detections, count=None, metadata=None):
+    """
+    Write a ground-truth/detection sidecar file.
+
+    The JSON document holds the car count, the detections and optional
+    metadata. `count` defaults to the number of detections; it may be given
+    alone (with no boxes) for images that are only labeled by count.
+    """
+    document = {
+        'count': int(len(detections) if count is None else count),
+        'detections': detections_to_list(detections),
+    }
+    if metadata:
+        document['metadata'] = metadata
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=1)
+
+
+def load_labels(path):
+    """
+    Read a sidecar file written by save_labels.
+
+    Returns:
+        tuple: (count, detections, metadata); detections is empty for
+        count-only labels
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        document = json.load(f)
+    detections = detections_from_list(document.get('detections', []))
+    count = int(document.get('count', len(detections)))
+    return count, detections, document.get('metadata', {})
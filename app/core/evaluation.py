@@ -0,0 +1,313 @@
+"""
+Accuracy and latency evaluation of pipeline profiles on a labeled image set.
+
+A labeled set is a directory of images, each with a `<stem>.json` sidecar
+written by app.core.detections.save_labels (synthetic scenes produce these
+directly). Images labeled only by count contribute to the count error but
+not to box precision/recall.
+"""
+
+import json
+import os
+import statistics
+import time
+
+import cv2
+import numpy as np
+
+from app.core.detections import load_labels
+from app.core.image_processor import run_pipeline
+from app.core.instrumentation import instrumentation_from_environment
+from app.utils.logger import logger
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+
+
+class EvaluationProfile:
+    """
+    One configuration under evaluation.
+
+    Args:
+        name: Label used in the report
+        params: Custom parameters (None for automatic mode)
+        max_side: Process a copy downscaled so its longest side is at most this
+            many pixels (the proxy mode of the live preview); None for full size
+    """
+
+    def __init__(self, name, params=None, max_side=None):
+        self.name = name
+        self.params = params
+        self.max_side = max_side
+
+    def as_dict(self):
+        return {'name': self.name, 'params': self.params, 'max_side': self.max_side}
+
+
+class LabeledImage:
+    """An image path with its ground-truth count and boxes."""
+
+    def __init__(self, image_path, count, detections):
+        self.image_path = image_path
+        self.count = count
+        self.detections = detections
+
+    @property
+    def has_boxes(self):
+        """True when box-level metrics can be computed for this image."""
+        return len(self.detections) == self.count
+
+
+def load_labeled_set(directory):
+    """Return the LabeledImage of every image in `directory` that has a label sidecar."""
+    labeled = []
+    for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+        stem, extension = os.path.splitext(entry.name)
+        if not entry.is_file() or extension.lower() not in IMAGE_EXTENSIONS:
+            continue
+        label_path = os.path.join(directory, stem + '.json')
+        if not os.path.exists(label_path):
+            continue
+        count, detections, _ = load_labels(label_path)
+        labeled.append(LabeledImage(entry.path, count, detections))
+    return labeled
+
+
+def box_iou_matrix(predicted, truth):
+    """Pairwise IoU of the boxes of two detection arrays, shape (len(predicted), len(truth))."""
+    if len(predicted) == 0 or len(truth) == 0:
+        return np.zeros((len(predicted), len(truth)))
+    px0, py0 = predicted['x'][:, None].astype(np.float64), predicted['y'][:, None].astype(np.float64)
+    px1, py1 = px0 + predicted['w'][:, None], py0 + predicted['h'][:, None]
+    tx0, ty0 = truth['x'][None, :].astype(np.float64), truth['y'][None, :].astype(np.float64)
+    tx1, ty1 = tx0 + truth['w'][None, :], ty0 + truth['h'][None, :]
+
+    inter_w = np.clip(np.minimum(px1, tx1) - np.maximum(px0, tx0), 0, None)
+    inter_h = np.clip(np.minimum(py1, ty1) - np.maximum(py0, ty0), 0, None)
+    intersection = inter_w * inter_h
+    union = (px1 - px0) * (py1 - py0) + (tx1 - tx0) * (ty1 - ty0) - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+def match_detections(predicted, truth, iou_threshold=0.5):
+    """
+    Greedily match predictions to ground truth by decreasing IoU.
+
+    Returns:
+        tuple: (true_positives, false_positives, false_negatives)
+    """
+    iou = box_iou_matrix(predicted, truth)
+    candidates = np.argwhere(iou >= iou_threshold)
+    order = np.argsort(-iou[candidates[:, 0], candidates[:, 1]], kind='stable')
+    used_predicted, used_truth = set(), set()
+    for p, t in candidates[order]:
+        if p in used_predicted or t in used_truth:
+            continue
+        used_predicted.add(p)
+        used_truth.add(t)
+    true_positives = len(used_predicted)
+    return true_positives, len(predicted) - true_positives, len(truth) - true_positives
+
+
+def run_profile(image, profile):
+    """
+    Run the pipeline on `image` as `profile` describes.
+
+    Returns:
+        tuple: (car_count, detections in full-resolution coordinates)
+    """
+    height, width = image.shape[:2]
+    scale = 1.0
+    if profile.max_side and max(height, width) > profile.max_side:
+        scale = profile.max_side / max(height, width)
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    result = run_pipeline(image, profile.params, geometry_scale=scale,
+                          instrumentation=instrumentation_from_environment())
+    detections = result.detections
+    if scale != 1.0 and len(detections):
+        detections = detections.copy()
+        for field in ('x', 'y', 'w', 'h'):
+            detections[field] = np.round(detections[field] / scale)
+        detections['area'] = np.round(detections['area'] / (scale * scale))
+        detections['cx'] /= scale
+        detections['cy'] /= scale
+    return result.car_count, detections
+
+
+class ProfileReport:
+    """Aggregated accuracy and latency of one profile over a labeled set."""
+
+    def __init__(self, profile, iou_threshold=0.5):
+        self.profile = profile
+        self.iou_threshold = iou_threshold
+        self.images = []  # per-image dictionaries
+        self.true_positives = 0
+        self.false_positives = 0
+        self.false_negatives = 0
+
+    def add(self, labeled, predicted_count, detections, seconds):
+        row = {
+            'image': os.path.basename(labeled.image_path),
+            'expected': labeled.count,
+            'predicted': predicted_count,
+            'error': predicted_count - labeled.count,
+            'ms': seconds * 1000.0,
+        }
+        if labeled.has_boxes:
+            tp, fp, fn = match_detections(detections, labeled.detections, self.iou_threshold)
+            self.true_positives += tp
+            self.false_positives += fp
+            self.false_negatives += fn
+            row.update(tp=tp, fp=fp, fn=fn)
+        self.images.append(row)
+
+    @property
+    def mae(self):
+        return statistics.mean(abs(row['error']) for row in self.images) if self.images else 0.0
+
+    @property
+    def precision(self):
+        matched = self.true_positives + self.false_positives
+        return self.true_positives / matched if matched else 0.0
+
+    @property
+    def recall(self):
+        expected = self.true_positives + self.false_negatives
+        return self.true_positives / expected if expected else 0.0
+
+    @property
+    def f1(self):
+        total = self.precision + self.recall
+        return 2 * self.precision * self.recall / total if total else 0.0
+
+    @property
+    def median_ms(self):
+        return statistics.median(row['ms'] for row in self.images) if self.images else 0.0
+
+    @property
+    def mean_ms(self):
+        return statistics.mean(row['ms'] for row in self.images) if self.images else 0.0
+
+    def summary(self):
+        return {
+            'profile': self.profile.name,
+            'images': len(self.images),
+            'mae': self.mae,
+            'precision': self.precision,
+            'recall': self.recall,
+            'f1': self.f1,
+            'median_ms': self.median_ms,
+            'mean_ms': self.mean_ms,
+        }
+
+
+def evaluate_profiles(labeled_images, profiles, iou_threshold=0.5, repeat=1, progress_callback=None):
+    """
+    Evaluate every profile on every labeled image.
+
+    Each image is decoded once; the timed section covers the pipeline run
+    (including the downscale of proxy profiles). With repeat > 1 the fastest
+    of the runs is kept.
+
+    Args:
+        labeled_images: List of LabeledImage
+        profiles: List of EvaluationProfile
+        iou_threshold: Minimum IoU for a prediction to match a ground-truth box
+        repeat: Timed runs per image and profile
+        progress_callback: Optional callable(done, total, message)
+
+    Returns:
+        list: One ProfileReport per profile, in the given order
+    """
+    reports = [ProfileReport(profile, iou_threshold) for profile in profiles]
+
+    total = len(labeled_images) * len(profiles)
+    done = 0
+    for labeled in labeled_images:
+        image = cv2.imread(labeled.image_path)
+        if image is None:
+            logger.warning("No se pudo leer la imagen, se omite", image_path=labeled.image_path)
+            done += len(profiles)
+            continue
+        for report in reports:
+            best = None
+            for _ in range(max(1, repeat)):
+                start = time.perf_counter()
+                count, detections = run_profile(image, report.profile)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            report.add(labeled, count, detections, best)
+            done += 1
+            if progress_callback is not None:
+                progress_callback(done, total, f"{report.profile.name}: {os.path.basename(labeled.image_path)}")
+    return reports
+
+
+def pareto_frontier(summaries, error_key='mae', latency_key='median_ms'):
+    """
+    Return the summaries not dominated in (error, latency), sorted by latency.
+
+    A summary is dominated when another one is at least as good on both axes
+    and strictly better on one.
+    """
+    frontier = []
+    for candidate in summaries:
+        dominated = any(
+            other is not candidate
+            and other[error_key] <= candidate[error_key]
+            and other[latency_key] <= candidate[latency_key]
+            and (other[error_key] < candidate[error_key] or other[latency_key] < candidate[latency_key])
+            for other in summaries
+        )
+        if not dominated:
+            frontier.append(candidate)
+    return sorted(frontier, key=lambda summary: summary[latency_key])
+
+
+def build_report(reports, iou_threshold):
+    """Assemble the JSON-serializable evaluation report."""
+    summaries = [report.summary() for report in reports]
+    frontier = pareto_frontier(summaries)
+    frontier_names = {summary['profile'] for summary in frontier}
+    for summary in summaries:
+        summary['pareto'] = summary['profile'] in frontier_names
+    return {
+        'iou_threshold': iou_threshold,
+        'profiles': [report.profile.as_dict() for report in reports],
+        'summaries': summaries,
+        'pareto_frontier': [summary['profile'] for summary in frontier],
+        'images': {report.profile.name: report.images for report in reports},
+    }
+
+
+def format_report(report):
+    """Render the summary table and Pareto frontier of a report as text."""
+    lines = [f"{'perfil':<24} {'imgs':>5} {'MAE':>8} {'prec':>6} {'recall':>6} {'F1':>6} {'mediana':>10}  pareto"]
+    for summary in sorted(report['summaries'], key=lambda s: s['median_ms']):
+        lines.append(
+            f"{summary['profile']:<24} {summary['images']:>5} {summary['mae']:>8.2f} "
+            f"{summary['precision']:>6.2f} {summary['recall']:>6.2f} {summary['f1']:>6.2f} "
+            f"{summary['median_ms']:>8.1f}ms  {'*' if summary['pareto'] else ''}"
+        )
+    lines.append("")
+    lines.append("Frontera de Pareto (error vs. latencia): " + " -> ".join(report['pareto_frontier']))
+    return "\n".join(lines)
+
+
+def load_profiles_file(path):
+    """
+    Read profiles from a JSON file mapping names to {"params": {...} | "path.json",
+    "max_side": int}. A string `params` is read as a configuration file.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        document = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    profiles = []
+    for name, spec in document.items():
+        params = spec.get('params')
+        if isinstance(params, str):
+            with open(os.path.join(base_dir, params), 'r', encoding='utf-8') as f:
+                params = json.load(f).get('parameters')
+        profiles.append(EvaluationProfile(name, params, spec.get('max_side')))
+    return profiles
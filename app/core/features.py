@@ -0,0 +1,139 @@
+"""
+Per-component shape features measured on the component's own pixels.
+
+The geometric filter only has the connectedComponentsWithStats table, so it
+approximates the perimeter by the box outline 2*(w+h) and cannot tell a
+ragged tree from a solid car roof. component_features() measures, for each
+requested label, its contour perimeter, convex hull area, solidity,
+compactness and orientation. Each component is cut out of its bounding-box
+crop of the label image, so the cost is proportional to the components'
+boxes rather than the frame, and the labels are processed in batches on a
+small shared thread pool (the OpenCV calls release the GIL).
+
+    features = component_features(labels, stats, indices)
+    solidity = feature_column(features, 'solidity', num_labels, fill=np.nan)
+"""
+
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+FEATURE_DTYPE = np.dtype([
+    ('label', np.int32),
+    ('perimeter', np.float32),    # length of the external contour(s), pixels
+    ('hull_area', np.float32),    # pixels covered by the convex hull
+    ('solidity', np.float32),     # component area / hull area, 0-1
+    ('compactness', np.float32),  # 4*pi*contour area / perimeter^2, 1 for a disk
+    ('orientation', np.float32),  # major axis angle in degrees, -90..90, 0 = horizontal
+])
+
+# A batch ends after this many labels or crop pixels, whichever comes first
+FEATURE_BATCH = 64
+BATCH_PIXELS = 1 << 18
+# Below this many crop pixels in total the features are computed on the calling thread
+PARALLEL_MIN_PIXELS = 1 << 20
+MAX_FEATURE_WORKERS = 4
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _shared_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = max(1, min(MAX_FEATURE_WORKERS, os.cpu_count() or 1))
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='FeatureWorker')
+        return _executor
+
+
+def _measure(labels, stats, label, row):
+    x, y, w, h, area = (int(value) for value in stats[label])
+    mask = (labels[y:y + h, x:x + w] == label).view(np.uint8)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+    perimeter = sum(cv2.arcLength(contour, True) for contour in contours)
+    contour_area = sum(cv2.contourArea(contour) for contour in contours)
+    hull = cv2.convexHull(np.concatenate(contours)) if contours else None
+    # The hull polygon runs through pixel centres; Pick's theorem turns its
+    # area and outline into the number of pixels it covers
+    hull_area = cv2.contourArea(hull) + cv2.arcLength(hull, True) / 2 + 1 if hull is not None else float(area)
+    moments = cv2.moments(mask, binaryImage=True)
+    spread = moments['mu20'] - moments['mu02']
+
+    row['label'] = label
+    row['perimeter'] = perimeter
+    row['hull_area'] = hull_area
+    row['solidity'] = min(1.0, area / hull_area) if hull_area > 0 else 1.0
+    row['compactness'] = 4 * math.pi * contour_area / (perimeter * perimeter) if perimeter > 0 else 0.0
+    # Isotropic shapes (disks, squares) have no major axis; report 0 for them
+    isotropic = abs(spread) + abs(moments['mu11']) <= 1e-6 * (moments['mu20'] + moments['mu02'])
+    row['orientation'] = 0.0 if isotropic else math.degrees(0.5 * math.atan2(2 * moments['mu11'], spread))
+
+
+def _batches(crop_pixels):
+    """(start, end) ranges of labels holding up to FEATURE_BATCH labels or BATCH_PIXELS pixels."""
+    start = 0
+    pixels = 0
+    for position, count in enumerate(crop_pixels):
+        pixels += count
+        if position + 1 - start >= FEATURE_BATCH or pixels >= BATCH_PIXELS:
+            yield start, position + 1
+            start = position + 1
+            pixels = 0
+    if start < len(crop_pixels):
+        yield start, len(crop_pixels)
+
+
+def _measure_batch(labels, stats, indices, features, start, end, cancel_token):
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+    for position in range(start, end):
+        _measure(labels, stats, int(indices[position]), features[position])
+
+
+def component_features(labels, stats, indices=None, cancel_token=None, parallel=True):
+    """
+    Shape features of the components `indices` (all but the background by default).
+
+    Args:
+        labels: Label image from connectedComponentsWithStats
+        stats: Its stats table
+        indices: Labels to measure
+        cancel_token: Optional CancellationToken, checked once per batch
+        parallel: Spread the batches over the shared feature pool when the
+            crops add up to at least PARALLEL_MIN_PIXELS pixels
+
+    Returns:
+        Structured array (FEATURE_DTYPE) aligned with `indices`
+    """
+    if indices is None:
+        indices = np.arange(1, len(stats))
+    indices = np.asarray(indices, dtype=np.intp)
+    features = np.zeros(len(indices), dtype=FEATURE_DTYPE)
+    crop_pixels = (stats[indices, cv2.CC_STAT_WIDTH].astype(np.int64) * stats[indices, cv2.CC_STAT_HEIGHT]).tolist()
+    batches = list(_batches(crop_pixels))
+    if parallel and len(batches) > 1 and sum(crop_pixels) >= PARALLEL_MIN_PIXELS:
+        executor = _shared_executor()
+        futures = [executor.submit(_measure_batch, labels, stats, indices, features, start, end, cancel_token)
+                   for start, end in batches]
+        try:
+            for future in futures:
+                future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+    else:
+        for start, end in batches:
+            _measure_batch(labels, stats, indices, features, start, end, cancel_token)
+    return features
+
+
+def feature_column(features, name, num_labels, fill=np.nan):
+    """Array indexed by label holding `features[name]`, `fill` for unmeasured labels."""
+    column = np.full(num_labels, fill, dtype=np.float64)
+    column[features['label']] = features[name]
+    return column
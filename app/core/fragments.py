@@ -0,0 +1,119 @@
+"""
+Regrouping of cars that the thresholding broke into several small parts.
+
+A car often breaks into a roof and a hood (or a windscreen and a body)
+that are each below min_area and rejected as too small. merge_fragments()
+groups nearby sub-threshold components into candidate vehicles: every
+fragment is hashed into the cells of a uniform grid that its box, grown by
+the allowed gap, covers, so a fragment is only compared with the few
+fragments sharing a cell. Two fragments are joined when
+
+    gap        the space between their boxes is at most `max_gap` pixels
+               along both axes, and
+    alignment  they overlap along one axis by at least `min_overlap` of
+               the narrower of the two, as the parts of one car do
+
+Joined fragments form groups through a union-find; every group of two or
+more fragments becomes one candidate stats row (union box, summed area,
+area-weighted centroid) that the caller filters like any other component.
+The cost is linear in the number of fragments.
+
+    rows, centroids, members = merge_fragments(stats, centroids, fragments, max_gap=12)
+"""
+
+import numpy as np
+
+# Joined fragments must overlap along one axis by this fraction of the narrower one
+FRAGMENT_MIN_OVERLAP = 0.5
+# Largest space between two fragment boxes, in full-resolution pixels
+FRAGMENT_MAX_GAP = 12
+# Fragments below this fraction of min_area are noise, not car parts
+FRAGMENT_MIN_AREA_RATIO = 0.15
+
+
+class _UnionFind:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, item):
+        parent = self.parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, first, second):
+        first, second = self.find(first), self.find(second)
+        if first != second:
+            self.parent[max(first, second)] = min(first, second)
+
+
+def _joinable(first, second, max_gap, min_overlap):
+    x1, y1, w1, h1 = first
+    x2, y2, w2, h2 = second
+    overlap_x = min(x1 + w1, x2 + w2) - max(x1, x2)
+    overlap_y = min(y1 + h1, y2 + h2) - max(y1, y2)
+    if -overlap_x > max_gap or -overlap_y > max_gap:
+        return False
+    return overlap_x >= min_overlap * min(w1, w2) or overlap_y >= min_overlap * min(h1, h2)
+
+
+def merge_fragments(stats, centroids, indices, max_gap=FRAGMENT_MAX_GAP, min_overlap=FRAGMENT_MIN_OVERLAP,
+                    cancel_token=None):
+    """
+    Group the fragment components `indices` into candidate vehicles.
+
+    Args:
+        stats, centroids: Component tables from connectedComponentsWithStats
+        indices: Labels of the sub-threshold components to regroup
+        max_gap: Largest space between two joined boxes, in pixels
+        min_overlap: See FRAGMENT_MIN_OVERLAP
+        cancel_token: Optional CancellationToken, checked every 1024 fragments
+
+    Returns:
+        (candidate stats (k, 5), candidate centroids (k, 2), list of the
+        member labels of every candidate)
+    """
+    indices = np.asarray(indices, dtype=np.intp)
+    empty = (np.zeros((0, 5), np.int32), np.zeros((0, 2), np.float64), [])
+    if len(indices) < 2:
+        return empty
+
+    boxes = stats[indices, :4].tolist()
+    # Cells as large as a typical fragment plus the gap keep the cells covered
+    # by one grown box, and the fragments per cell, bounded
+    cell = max(1, int(np.median(np.maximum(stats[indices, 2], stats[indices, 3]))) + max_gap)
+    grid = {}
+    groups = _UnionFind(len(indices))
+    for position, (x, y, w, h) in enumerate(boxes):
+        if cancel_token is not None and position % 1024 == 0:
+            cancel_token.raise_if_cancelled()
+        for cell_y in range((y - max_gap) // cell, (y + h + max_gap) // cell + 1):
+            for cell_x in range((x - max_gap) // cell, (x + w + max_gap) // cell + 1):
+                occupants = grid.setdefault((cell_x, cell_y), [])
+                for other in occupants:
+                    if groups.find(other) != groups.find(position) and \
+                            _joinable(boxes[other], boxes[position], max_gap, min_overlap):
+                        groups.union(other, position)
+                occupants.append(position)
+
+    members_by_root = {}
+    for position in range(len(indices)):
+        members_by_root.setdefault(groups.find(position), []).append(position)
+    groups_found = [members for members in members_by_root.values() if len(members) > 1]
+    if not groups_found:
+        return empty
+
+    rows = []
+    merged_centroids = []
+    member_labels = []
+    for members in groups_found:
+        selected = stats[indices[members]]
+        left, top = selected[:, 0].min(), selected[:, 1].min()
+        right = (selected[:, 0] + selected[:, 2]).max()
+        bottom = (selected[:, 1] + selected[:, 3]).max()
+        areas = selected[:, 4].astype(np.float64)
+        rows.append((left, top, right - left, bottom - top, int(areas.sum())))
+        merged_centroids.append((areas @ centroids[indices[members]]) / areas.sum())
+        member_labels.append(indices[members].tolist())
+    return np.array(rows, np.int32), np.array(merged_centroids, np.float64), member_labels
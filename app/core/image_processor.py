@@ -1,17 +1,180 @@
 import cv2
 import numpy as np
 
-def visualize_labels(labels_image):
-    """Helper function to visualize a labels image from connectedComponents."""
-    if np.max(labels_image) == 0:
-        return np.zeros_like(labels_image)
+from app.core.cancellation import ProcessingCancelled
+from app.core.detections import detections_from_stats, empty_detections
+from app.core.features import component_features, feature_column
+from app.core.fragments import FRAGMENT_MAX_GAP, FRAGMENT_MIN_AREA_RATIO, merge_fragments
+from app.core.instrumentation import NULL_INSTRUMENTATION
+from app.core.splitting import SPLIT_MAX_PARTS, split_components
+from app.core.rendering import (TEXT_AUTO, label_hue_lut, colorize_labels, draw_component_overlay,
+                                draw_detection_overlay)
+from app.core.stage_sources import (ImageSource, GraySource, MaskSource, LabelsSource,
+                                    ComponentStatsSource, DetectionsSource)
+from app.utils.logger import logger
+
+# Bounding box of the timeline thumbnails, (width, height)
+THUMBNAIL_SIZE = (80, 50)
+
+# Approximate number of pixels processed between two cancellation checks
+# inside the stages that are split into horizontal bands.
+BAND_PIXELS = 1 << 20
+
+def _iter_row_bands(height, width):
+    """
+    Yield (start, end) row ranges covering roughly BAND_PIXELS pixels each.
+    Bands start on even rows, matching the 2x2 blocks of OpenCV's labeling.
+    """
+    rows_per_band = max(16, BAND_PIXELS // max(1, width))
+    rows_per_band -= rows_per_band % 2
+    for start in range(0, height, rows_per_band):
+        yield start, min(height, start + rows_per_band)
+
+def filter_in_bands(image, function, pad, cancel_token=None):
+    """
+    Apply the local filter `function(band)` band by band so a cancellation
+    request is honoured while it runs. Each band is filtered with `pad` rows of
+    real context above and below, so the output is identical to a single full
+    call as long as `pad` covers the filter's vertical reach.
+    """
+    height, width = image.shape[:2]
+    filtered = np.empty_like(image)
+    for start, end in _iter_row_bands(height, width):
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        top = max(0, start - pad)
+        bottom = min(height, end + pad)
+        band = function(image[top:bottom])
+        filtered[start:end] = band[start - top:start - top + (end - start)]
+    return filtered
+
+def bilateral_filter_in_bands(gray_image, diameter, sigma_color, sigma_space, cancel_token=None):
+    """cv2.bilateralFilter through filter_in_bands, with `diameter // 2` rows of context."""
+    return filter_in_bands(
+        gray_image, lambda band: cv2.bilateralFilter(band, diameter, sigma_color, sigma_space),
+        diameter // 2, cancel_token
+    )
+
+def morphology_in_bands(binary_image, operation, kernel, iterations=1, cancel_token=None):
+    """
+    cv2.morphologyEx through filter_in_bands. Opening and closing chain
+    2 * iterations erosions/dilations, each reaching up to the kernel height.
+    """
+    return filter_in_bands(
+        binary_image, lambda band: cv2.morphologyEx(band, operation, kernel, iterations=iterations),
+        2 * iterations * kernel.shape[0], cancel_token
+    )
+
+def connected_components_in_bands(binary_image, cancel_token=None):
+    """
+    cv2.connectedComponentsWithStats (8-connectivity) computed band by band so
+    a cancellation request is honoured while the labeling runs.
+
+    Each band is labelled on its own; components that touch across a band
+    seam are joined with a union-find and renumbered in the order of their
+    first 2x2 block, which is the order OpenCV's block-based labeling uses, so
+    labels and stats match a single full call. Centroids match up to float
+    rounding.
+
+    Returns:
+        (num_labels, labels, stats, centroids) like connectedComponentsWithStats
+    """
+    height, width = binary_image.shape[:2]
+    band_results = []
+    offsets = [0]
+    for start, end in _iter_row_bands(height, width):
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        count, band_labels, band_stats, band_centroids = cv2.connectedComponentsWithStats(
+            binary_image[start:end], connectivity=8
+        )
+        band_results.append((start, band_labels, band_stats, band_centroids))
+        offsets.append(offsets[-1] + count - 1)
+    if len(band_results) == 1:
+        _, band_labels, band_stats, band_centroids = band_results[0]
+        return len(band_stats), band_labels, band_stats, band_centroids
+
+    # Global index of a band's label l (l > 0) is offsets[band] + l; 0 stays background
+    parent = np.arange(offsets[-1] + 1)
+
+    def find(item):
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    for band in range(1, len(band_results)):
+        above = band_results[band - 1][1][-1]
+        below = band_results[band][1][0]
+        for shift in (-1, 0, 1):
+            upper = above[max(0, shift):width + min(0, shift)]
+            lower = below[max(0, -shift):width + min(0, -shift)]
+            touching = (upper > 0) & (lower > 0)
+            keys = np.unique((upper[touching] + offsets[band - 1]).astype(np.int64) * len(parent)
+                             + lower[touching] + offsets[band])
+            for first, second in zip(*divmod(keys, len(parent))):
+                first, second = find(first), find(second)
+                if first != second:
+                    parent[max(first, second)] = min(first, second)
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+    while True:
+        grandparent = parent[parent]
+        if np.array_equal(grandparent, parent):
+            break
+        parent = grandparent
+
+    # Each root is its component's earliest band label, i.e. its first block
+    roots = np.flatnonzero(parent == np.arange(len(parent)))
+    final = np.zeros(len(parent), np.int32)
+    final[roots] = np.arange(len(roots))
+    final = final[parent]
+    num_labels = len(roots)
+
+    labels = np.empty((height, width), np.int32)
+    stats = np.zeros((num_labels, 5), np.int64)
+    stats[:, 0] = width
+    stats[:, 1] = height
+    right = np.zeros(num_labels, np.int64)
+    bottom = np.zeros(num_labels, np.int64)
+    weighted = np.zeros((num_labels, 2))
+    for band, (start, band_labels, band_stats, band_centroids) in enumerate(band_results):
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        band_lut = final[np.r_[0, offsets[band] + 1:offsets[band + 1] + 1]]
+        labels[start:start + band_labels.shape[0]] = np.take(band_lut, band_labels)
+        present = band_stats[:, cv2.CC_STAT_AREA] > 0
+        targets = band_lut[present]
+        rows = band_stats[present].astype(np.int64)
+        np.minimum.at(stats[:, 0], targets, rows[:, 0])
+        np.minimum.at(stats[:, 1], targets, rows[:, 1] + start)
+        np.maximum.at(right, targets, rows[:, 0] + rows[:, 2])
+        np.maximum.at(bottom, targets, rows[:, 1] + start + rows[:, 3])
+        np.add.at(stats[:, 4], targets, rows[:, 4])
+        shifted = band_centroids[present] + (0, start)
+        np.add.at(weighted, targets, shifted * rows[:, 4:5])
+    stats[:, 2] = right - stats[:, 0]
+    stats[:, 3] = bottom - stats[:, 1]
+    centroids = weighted / np.maximum(stats[:, 4:5], 1)
+    return num_labels, labels, stats.astype(np.int32), centroids
+
+def visualize_labels(labels_image, cancel_token=None, max_label=None):
+    """
+    Colour-code a labels image from connectedComponents, band by band.
+    Pass `max_label` (num_labels - 1) when known to skip the full-frame maximum.
+    """
+    if max_label is None:
+        max_label = int(labels_image.max()) if labels_image.size else 0
+    height, width = labels_image.shape[:2]
+    labeled_img = np.zeros((height, width, 3), dtype=np.uint8)
+    if max_label == 0:
+        return labeled_img
     
-    # Normalize the labels image to be in the range 0-255
-    label_hue = np.uint8(179 * labels_image / np.max(labels_image))
-    blank_ch = 255 * np.ones_like(label_hue)
-    labeled_img = cv2.merge([label_hue, blank_ch, blank_ch])
-    labeled_img = cv2.cvtColor(labeled_img, cv2.COLOR_HSV2BGR)
-    labeled_img[label_hue == 0] = 0  # Set background to black
+    hue_lut = label_hue_lut(max_label)
+    for start, end in _iter_row_bands(height, width):
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        labeled_img[start:end] = colorize_labels(labels_image[start:end], hue_lut)
     return labeled_img
 
 def apply_morphological_opening(binary_image, kernel_size=3, iterations=1):
@@ -63,39 +226,29 @@ def draw_component_stats(image, stats, centroids, filtered_indices, min_area, ma
     
     return result_image
 
-def process_image_pipeline(image_opencv, custom_params=None):
-    """
-    Process an OpenCV image to detect and count cars, returning intermediate steps.
-    
-    Args:
-        image_opencv: Input image as OpenCV numpy array (BGR format)
-        custom_params: Optional dictionary with custom processing parameters
-        
-    Returns:
-        tuple: (pipeline_images, car_count, step_descriptions)
-            - pipeline_images: A list of OpenCV images from each processing stage
-            - car_count: Number of detected cars
-            - step_descriptions: List of descriptions for each step
-    """
-    if image_opencv is None:
-        raise ValueError("Input image is None")
+# Parámetros optimizados para mejor detección de coches
+DEFAULT_PARAMS = {
+    'block_size': 25,  # Bloque más grande para mejor adaptación local
+    'c_value': 2,      # C muy bajo para ser menos agresivo
+    'open_kernel': 2,  # Kernel pequeño para preservar detalles
+    'open_iterations': 1,  # Solo una iteración para no fragmentar
+    'close_kernel_w': 15, # Cierre horizontal más agresivo para unir partes
+    'close_kernel_h': 6,  # Cierre vertical moderado
+    'min_area': 800,   # Área mínima más baja para partes de coches
+    'max_area': 60000, # Área máxima más alta
+    'min_aspect': 0.2, # Aspecto muy permisivo
+    'max_aspect': 5.0, # Aspecto muy permisivo
+    'min_width': 20,   # Ancho mínimo más bajo
+    'max_width': 350,  # Ancho máximo más alto
+    'extent_threshold': 0.2,  # Umbral de extensión muy permisivo
+    'shape_features': False,  # Compacidad con el perímetro real del contorno en lugar de 2*(w+h)
+    'split_merged': False,  # Separar con watershed los componentes GRANDE que unen varios coches
+    'merge_fragments': False  # Agrupar fragmentos PEQUEÑO cercanos y alineados en candidatos a coche
+}
 
-    # Parámetros optimizados para mejor detección de coches
-    default_params = {
-        'block_size': 25,  # Bloque más grande para mejor adaptación local
-        'c_value': 2,      # C muy bajo para ser menos agresivo
-        'open_kernel': 2,  # Kernel pequeño para preservar detalles
-        'open_iterations': 1,  # Solo una iteración para no fragmentar
-        'close_kernel_w': 15, # Cierre horizontal más agresivo para unir partes
-        'close_kernel_h': 6,  # Cierre vertical moderado
-        'min_area': 800,   # Área mínima más baja para partes de coches
-        'max_area': 60000, # Área máxima más alta
-        'min_aspect': 0.2, # Aspecto muy permisivo
-        'max_aspect': 5.0, # Aspecto muy permisivo
-        'min_width': 20,   # Ancho mínimo más bajo
-        'max_width': 350,  # Ancho máximo más alto
-        'extent_threshold': 0.2  # Umbral de extensión muy permisivo
-    }
+def resolve_parameters(custom_params=None):
+    """Merge custom parameters over DEFAULT_PARAMS, falling back to the defaults on error."""
+    default_params = dict(DEFAULT_PARAMS)
     
     # Use custom parameters if provided, with error handling
     if custom_params:
@@ -109,109 +262,354 @@ def process_image_pipeline(image_opencv, custom_params=None):
             if params['min_area'] >= params['max_area']:
                 params['min_area'] = params['max_area'] // 2
         except Exception as e:
-            print(f"Warning: Error in custom parameters, using defaults: {e}")
+            logger.warning("Error in custom parameters, using defaults", error=e)
             params = default_params
     else:
         params = default_params
+    return params
+
+class PipelineResult:
+    """
+    Outcome of one run_pipeline call.
+    
+    Attributes:
+        images: List of OpenCV images, one per processing stage
+        car_count: Number of detected cars
+        descriptions: List of descriptions for each stage
+        stage_metrics: List of StageMetrics (empty unless instrumentation was enabled)
+        params: Effective parameters the run used
+        detections: Structured array (DETECTION_DTYPE) with the box, area and
+            centroid of every detected car, in image pixel coordinates
+        stage_sources: One StageSource per stage image when requested with
+            keep_stage_sources, else an empty list
+        error: Message of the exception that aborted the run, None when it
+            completed; a failed run reports car_count 0
+    """
+    
+    def __init__(self, images, car_count, descriptions, stage_metrics=None, params=None, detections=None,
+                 stage_sources=None, error=None):
+        self.images = images
+        self.car_count = car_count
+        self.descriptions = descriptions
+        self.stage_metrics = list(stage_metrics or [])
+        self.params = params
+        self.detections = detections if detections is not None else empty_detections()
+        self.stage_sources = list(stage_sources or [])
+        self.error = error
+        
+    def as_tuple(self):
+        """Return the legacy (pipeline_images, car_count, step_descriptions) tuple."""
+        return self.images, self.car_count, self.descriptions
+
+class PipelineStage:
+    """
+    One stage image yielded by iter_pipeline.
+    
+    Attributes:
+        index: Position of the stage in PipelineResult.images
+        image: BGR stage image, or None for visualizations left unrendered
+            by lazy_visualizations
+        description: Text shown for the stage
+        source: StageSource of the image when keep_stage_sources is set
+    """
+    
+    __slots__ = ('index', 'image', 'description', 'source')
+    
+    def __init__(self, index, image, description, source=None):
+        self.index = index
+        self.image = image
+        self.description = description
+        self.source = source
+
+def process_image_pipeline(image_opencv, custom_params=None, cancel_token=None, progress_callback=None,
+                           stage_cache=None, geometry_scale=1.0, instrumentation=None):
+    """
+    Process an OpenCV image to detect and count cars, returning intermediate steps.
+    
+    Takes the same arguments as run_pipeline.
+        
+    Returns:
+        tuple: (pipeline_images, car_count, step_descriptions)
+            - pipeline_images: A list of OpenCV images from each processing stage
+            - car_count: Number of detected cars
+            - step_descriptions: List of descriptions for each step
+    """
+    return run_pipeline(
+        image_opencv, custom_params,
+        cancel_token=cancel_token,
+        progress_callback=progress_callback,
+        stage_cache=stage_cache,
+        geometry_scale=geometry_scale,
+        instrumentation=instrumentation
+    ).as_tuple()
+
+def run_pipeline(image_opencv, custom_params=None, cancel_token=None, progress_callback=None,
+                 stage_cache=None, geometry_scale=1.0, instrumentation=None, keep_stage_sources=False,
+                 lazy_visualizations=False):
+    """
+    Process an OpenCV image to detect and count cars.
+    
+    Args:
+        image_opencv: Input image as OpenCV numpy array (BGR format)
+        custom_params: Optional dictionary with custom processing parameters
+        cancel_token: Optional CancellationToken checked between stages and inside
+            the per-component loops; raises ProcessingCancelled when set
+        progress_callback: Optional callable(percentage, message) invoked as each
+            stage starts, with percentage in the 0-100 range of this pipeline
+        stage_cache: Optional StageCache reused across calls on the same image so
+            unchanged upstream stages are not recomputed
+        geometry_scale: Ratio between this image and the full-resolution frame the
+            parameters were tuned for; kernel sizes, lengths and areas are scaled
+            by it so a downscaled proxy behaves like the original
+        instrumentation: Optional PipelineInstrumentation that measures every
+            stage; its records are also returned in PipelineResult.stage_metrics
+        keep_stage_sources: Also return compact sources of the stage images
+            (see app.core.stage_sources) in PipelineResult.stage_sources
+        lazy_visualizations: Skip the label colouring and the component-stats
+            overlay, which are only looked at on request; their entries in
+            PipelineResult.images are None and their stage sources serve as
+            recipes to render them later. Implies keep_stage_sources
+        
+    Returns:
+        PipelineResult
+    """
+    stages = iter_pipeline(
+        image_opencv, custom_params,
+        cancel_token=cancel_token,
+        progress_callback=progress_callback,
+        stage_cache=stage_cache,
+        geometry_scale=geometry_scale,
+        instrumentation=instrumentation,
+        keep_stage_sources=keep_stage_sources,
+        lazy_visualizations=lazy_visualizations
+    )
+    while True:
+        try:
+            next(stages)
+        except StopIteration as finished:
+            return finished.value
+
+def iter_pipeline(image_opencv, custom_params=None, cancel_token=None, progress_callback=None,
+                  stage_cache=None, geometry_scale=1.0, instrumentation=None, keep_stage_sources=False,
+                  lazy_visualizations=False):
+    """
+    Generator form of run_pipeline: yields a PipelineStage as soon as each
+    stage image is computed and returns the PipelineResult (the value of
+    StopIteration, or of `yield from`).
+    
+    Takes the same arguments as run_pipeline. Closing the generator early
+    stops the pipeline between two stages.
+    """
+    if image_opencv is None:
+        raise ValueError("Input image is None")
+    keep_stage_sources = keep_stage_sources or lazy_visualizations
+
+    params = resolve_parameters(custom_params)
+    inst = instrumentation if instrumentation is not None else NULL_INSTRUMENTATION
+
+    def checkpoint(percentage, message):
+        """Honour a pending cancellation and report progress for the next stage."""
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        if progress_callback is not None:
+            progress_callback(percentage, message)
+
+    s = geometry_scale
 
+    def scaled_length(value, minimum=1):
+        """Scale a pixel length measured on the full-resolution image."""
+        return max(minimum, int(round(value * s)))
+
+    def cached_stage(stage, key, compute):
+        """Return the stage output from stage_cache when `key` matches, else compute it."""
+        if stage_cache is None:
+            return compute()
+        value = stage_cache.lookup(stage, key)
+        if value is None:
+            value = stage_cache.store(stage, key, compute())
+        else:
+            inst.record_cached(stage)
+        return value
+
+    inst.start()
     try:
+        checkpoint(0, "Preparando imagen original...")
+        if stage_cache is not None:
+            stage_cache.bind(image_opencv)
         pipeline_images = []
         step_descriptions = []
+        stage_sources = [] if keep_stage_sources else None
+
+        def add_stage(image, description, make_source=None):
+            """Record a stage image and return the PipelineStage to yield."""
+            source = make_source() if keep_stage_sources else None
+            pipeline_images.append(image)
+            step_descriptions.append(description)
+            if keep_stage_sources:
+                stage_sources.append(source)
+            return PipelineStage(len(pipeline_images) - 1, image, description, source)
 
         # 0. Original Image
-        original_for_display = image_opencv.copy()
-        pipeline_images.append(original_for_display)
-        
+        with inst.stage('original') as stage:
+            original_for_display = image_opencv.copy()
+            stage.output(original_for_display)
         mode_text = "MANUAL" if custom_params else "AUTOMÁTICO"
-        step_descriptions.append(f"Imagen original cargada para análisis - Modo: {mode_text}")
+        yield add_stage(original_for_display, f"Imagen original cargada para análisis - Modo: {mode_text}",
+                        lambda: ImageSource(original_for_display))
         
         # 1. Convert to grayscale
-        gray_image = cv2.cvtColor(image_opencv, cv2.COLOR_BGR2GRAY)
-        gray_bgr = cv2.cvtColor(gray_image, cv2.COLOR_GRAY2BGR)
-        pipeline_images.append(gray_bgr)
-        step_descriptions.append("Conversión a escala de grises para simplificar el procesamiento")
+        checkpoint(5, "Convirtiendo a escala de grises...")
+
+        def compute_grayscale():
+            with inst.stage('grayscale') as stage:
+                gray = cv2.cvtColor(image_opencv, cv2.COLOR_BGR2GRAY)
+                gray_display = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+                stage.output(gray, gray_display)
+            return gray, gray_display
+
+        gray_image, gray_bgr = cached_stage('grayscale', (), compute_grayscale)
+        yield add_stage(gray_bgr, "Conversión a escala de grises para simplificar el procesamiento",
+                        lambda: GraySource(gray_image))
         
         # 2. Filtrado más suave para preservar detalles de coches
-        # Filtro bilateral más suave
-        bilateral_filtered = cv2.bilateralFilter(gray_image, 9, 50, 50)
-        
-        # Gaussian más suave para no perder detalles
-        gaussian_filtered = cv2.GaussianBlur(bilateral_filtered, (5, 5), 1.0)
-        
-        # Eliminar filtro mediano que puede fragmentar objetos
-        filtered_bgr = cv2.cvtColor(gaussian_filtered, cv2.COLOR_GRAY2BGR)
-        pipeline_images.append(filtered_bgr)
-        step_descriptions.append("Filtrado suave: bilateral + gaussiano preservando detalles de coches")
+        def compute_filtered():
+            # Filtro bilateral más suave
+            checkpoint(10, "Aplicando filtro bilateral...")
+            with inst.stage('bilateral') as stage:
+                bilateral_filtered = bilateral_filter_in_bands(gray_image, 9, 50, 50, cancel_token)
+                stage.output(bilateral_filtered)
+            
+            # Gaussian más suave para no perder detalles
+            checkpoint(30, "Aplicando filtro gaussiano...")
+            with inst.stage('gaussian') as stage:
+                gaussian = filter_in_bands(bilateral_filtered, lambda band: cv2.GaussianBlur(band, (5, 5), 1.0),
+                                           2, cancel_token)
+                
+                # Eliminar filtro mediano que puede fragmentar objetos
+                gaussian_display = cv2.cvtColor(gaussian, cv2.COLOR_GRAY2BGR)
+                stage.output(gaussian, gaussian_display)
+            return gaussian, gaussian_display
+
+        gaussian_filtered, filtered_bgr = cached_stage('filtered', (), compute_filtered)
+        yield add_stage(filtered_bgr, "Filtrado suave: bilateral + gaussiano preservando detalles de coches",
+                        lambda: GraySource(gaussian_filtered))
         
         # 3. Umbralización más permisiva
-        block_size = max(3, min(51, params['block_size']))
+        checkpoint(35, "Umbralización adaptativa...")
+        block_size = scaled_length(max(3, min(51, params['block_size'])), 3)
         if block_size % 2 == 0:
             block_size += 1
-            
-        # Usar umbralización menos agresiva
-        binary_image = cv2.adaptiveThreshold(
-            gaussian_filtered,
-            255,
-            cv2.ADAPTIVE_THRESH_MEAN_C,  # Cambiar de vuelta a MEAN_C
-            cv2.THRESH_BINARY,
-            block_size,
-            max(1, min(10, params['c_value']))  # C más bajo
-        )
-        
-        # 4. Corrección de polaridad
-        white_pixels = np.sum(binary_image == 255)
-        total_pixels = binary_image.shape[0] * binary_image.shape[1]
-        white_ratio = white_pixels / total_pixels if total_pixels > 0 else 0
-        
-        if white_ratio > 0.5:
-            binary_corrected = cv2.bitwise_not(binary_image)
-            polarity_desc = f"Umbralización adaptativa suave con inversión - Bloque:{block_size}, C:{params['c_value']} (ratio: {white_ratio:.2f})"
-        else:
-            binary_corrected = binary_image
-            polarity_desc = f"Umbralización adaptativa suave sin inversión - Bloque:{block_size}, C:{params['c_value']} (ratio: {white_ratio:.2f})"
-        
-        binary_bgr = cv2.cvtColor(binary_corrected, cv2.COLOR_GRAY2BGR)
-        pipeline_images.append(binary_bgr)
-        step_descriptions.append(polarity_desc)
+        c_value = max(1, min(10, params['c_value']))  # C más bajo
+        threshold_key = (block_size, c_value)
+
+        def compute_threshold():
+            with inst.stage('threshold') as stage:
+                # Usar umbralización menos agresiva
+                binary_image = filter_in_bands(
+                    gaussian_filtered,
+                    lambda band: cv2.adaptiveThreshold(
+                        band,
+                        255,
+                        cv2.ADAPTIVE_THRESH_MEAN_C,  # Cambiar de vuelta a MEAN_C
+                        cv2.THRESH_BINARY,
+                        block_size,
+                        c_value
+                    ),
+                    block_size // 2, cancel_token
+                )
+                
+                # 4. Corrección de polaridad
+                white_pixels = cv2.countNonZero(binary_image)
+                total_pixels = binary_image.shape[0] * binary_image.shape[1]
+                white_ratio = white_pixels / total_pixels if total_pixels > 0 else 0
+                
+                if white_ratio > 0.5:
+                    binary = cv2.bitwise_not(binary_image)
+                    desc = f"Umbralización adaptativa suave con inversión - Bloque:{block_size}, C:{params['c_value']} (ratio: {white_ratio:.2f})"
+                else:
+                    binary = binary_image
+                    desc = f"Umbralización adaptativa suave sin inversión - Bloque:{block_size}, C:{params['c_value']} (ratio: {white_ratio:.2f})"
+                binary_display = cv2.cvtColor(binary, cv2.COLOR_GRAY2BGR)
+                stage.output(binary, binary_display)
+            return binary, binary_display, desc
+
+        binary_corrected, binary_bgr, polarity_desc = cached_stage('threshold', threshold_key, compute_threshold)
+        yield add_stage(binary_bgr, polarity_desc, lambda: MaskSource(binary_corrected))
         
         # 5. Apertura muy suave para no fragmentar coches
-        kernel_size = max(1, min(5, params['open_kernel']))  # Limitar tamaño máximo
+        checkpoint(40, "Apertura morfológica...")
+        kernel_size = scaled_length(max(1, min(5, params['open_kernel'])))  # Limitar tamaño máximo
         iterations = max(1, min(2, params['open_iterations']))  # Máximo 2 iteraciones
-        
-        # Usar kernel elíptico más suave
-        kernel_opening = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
-        opened_image = cv2.morphologyEx(binary_corrected, cv2.MORPH_OPEN, kernel_opening, iterations=iterations)
-        
-        opened_bgr = cv2.cvtColor(opened_image, cv2.COLOR_GRAY2BGR)
-        pipeline_images.append(opened_bgr)
-        step_descriptions.append(f"Apertura morfológica suave - Kernel elíptico:{kernel_size}x{kernel_size}, Iter:{iterations}")
+        opening_key = threshold_key + (kernel_size, iterations)
+
+        def compute_opening():
+            with inst.stage('opening') as stage:
+                # Usar kernel elíptico más suave
+                kernel_opening = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
+                opened = morphology_in_bands(binary_corrected, cv2.MORPH_OPEN, kernel_opening, iterations, cancel_token)
+                opened_display = cv2.cvtColor(opened, cv2.COLOR_GRAY2BGR)
+                stage.output(opened, opened_display)
+            return opened, opened_display
+
+        opened_image, opened_bgr = cached_stage('opening', opening_key, compute_opening)
+        yield add_stage(opened_bgr,
+                        f"Apertura morfológica suave - Kernel elíptico:{kernel_size}x{kernel_size}, Iter:{iterations}",
+                        lambda: MaskSource(opened_image))
         
         # 6. Cierre más agresivo para unir partes de coches
-        close_w = max(3, min(25, params['close_kernel_w']))
-        close_h = max(2, min(12, params['close_kernel_h']))
-        
-        # Cierre horizontal más agresivo para unir partes de coches
-        kernel_horizontal = cv2.getStructuringElement(cv2.MORPH_RECT, (close_w, close_h))
-        closed_horizontal = cv2.morphologyEx(opened_image, cv2.MORPH_CLOSE, kernel_horizontal, iterations=2)
-        
-        # Cierre vertical adicional
-        kernel_vertical = cv2.getStructuringElement(cv2.MORPH_RECT, (4, 8))
-        cleaned_image = cv2.morphologyEx(closed_horizontal, cv2.MORPH_CLOSE, kernel_vertical, iterations=1)
-        
-        # Cierre diagonal para unir partes en ángulo
-        kernel_diagonal = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (7, 7))
-        cleaned_image = cv2.morphologyEx(cleaned_image, cv2.MORPH_CLOSE, kernel_diagonal, iterations=1)
-        
-        cleaned_bgr = cv2.cvtColor(cleaned_image, cv2.COLOR_GRAY2BGR)
-        pipeline_images.append(cleaned_bgr)
-        step_descriptions.append(f"Cierre morfológico agresivo - Horizontal:{close_w}x{close_h}, Vertical:4x8, Diagonal:7x7")
+        checkpoint(45, "Cierre morfológico...")
+        close_w = scaled_length(max(3, min(25, params['close_kernel_w'])))
+        close_h = scaled_length(max(2, min(12, params['close_kernel_h'])))
+        vertical_size = (scaled_length(4), scaled_length(8))
+        diagonal_size = scaled_length(7)
+        closing_key = opening_key + (close_w, close_h, vertical_size, diagonal_size)
+
+        def compute_closing():
+            with inst.stage('closing') as stage:
+                # Cierre horizontal más agresivo para unir partes de coches
+                kernel_horizontal = cv2.getStructuringElement(cv2.MORPH_RECT, (close_w, close_h))
+                closed_horizontal = morphology_in_bands(opened_image, cv2.MORPH_CLOSE, kernel_horizontal, 2, cancel_token)
+                
+                # Cierre vertical adicional
+                kernel_vertical = cv2.getStructuringElement(cv2.MORPH_RECT, vertical_size)
+                checkpoint(50, "Cierre morfológico vertical...")
+                cleaned = morphology_in_bands(closed_horizontal, cv2.MORPH_CLOSE, kernel_vertical, 1, cancel_token)
+                
+                # Cierre diagonal para unir partes en ángulo
+                kernel_diagonal = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (diagonal_size, diagonal_size))
+                checkpoint(53, "Cierre morfológico diagonal...")
+                cleaned = morphology_in_bands(cleaned, cv2.MORPH_CLOSE, kernel_diagonal, 1, cancel_token)
+                cleaned_display = cv2.cvtColor(cleaned, cv2.COLOR_GRAY2BGR)
+                stage.output(cleaned, cleaned_display)
+            return cleaned, cleaned_display
+
+        cleaned_image, cleaned_bgr = cached_stage('closing', closing_key, compute_closing)
+        yield add_stage(
+            cleaned_bgr,
+            f"Cierre morfológico agresivo - Horizontal:{close_w}x{close_h}, "
+            f"Vertical:{vertical_size[0]}x{vertical_size[1]}, Diagonal:{diagonal_size}x{diagonal_size}",
+            lambda: MaskSource(cleaned_image)
+        )
         
         # 7. Connected components labeling
-        num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(cleaned_image, connectivity=8)
-        
-        labels_display = visualize_labels(labels)
-        pipeline_images.append(labels_display)
-        step_descriptions.append(f"Etiquetado de componentes conexas: {num_labels-1} componentes encontrados")
+        def compute_labeling():
+            checkpoint(55, "Etiquetando componentes conexas...")
+            with inst.stage('labeling') as stage:
+                labeling = connected_components_in_bands(cleaned_image, cancel_token)
+                stage.output(*labeling[1:])
+            
+            if lazy_visualizations:
+                return tuple(labeling) + (None,)
+            checkpoint(65, "Coloreando etiquetas...")
+            with inst.stage('label_colors') as stage:
+                labels_colored = visualize_labels(labeling[1], cancel_token, max_label=labeling[0] - 1)
+                stage.output(labels_colored)
+            return tuple(labeling) + (labels_colored,)
+
+        labeling_key = closing_key + (lazy_visualizations,)
+        num_labels, labels, stats, centroids, labels_display = cached_stage('labeling', labeling_key, compute_labeling)
+        yield add_stage(labels_display, f"Etiquetado de componentes conexas: {num_labels-1} componentes encontrados",
+                        lambda: LabelsSource(stage_sources[5]))
         
         # 8. Filtrado geométrico más permisivo para coches
         min_area = max(100, params['min_area'])
@@ -223,120 +621,200 @@ def process_image_pipeline(image_opencv, custom_params=None):
         min_height = 15
         max_height = 250  # Más permisivo en altura
         extent_threshold = max(0.1, min(1.0, params['extent_threshold']))
-        
+        canopy_min_area = 25000
+        
+        # Lengths and areas above are expressed for the full-resolution frame
+        if s != 1.0:
+            min_area, max_area = int(min_area * s * s), int(max_area * s * s)
+            min_width, max_width = scaled_length(min_width), scaled_length(max_width)
+            min_height, max_height = scaled_length(min_height), scaled_length(max_height)
+            canopy_min_area = int(canopy_min_area * s * s)
+        
+        # Shape features of the components in the size range, the only ones
+        # whose shape the filter and the overlay look at. The filter only uses
+        # them with shape_features; otherwise the overlay measures them when
+        # it is drawn
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        candidates = np.flatnonzero((areas >= min_area) & (areas <= max_area)) + 1
+        features = None
+        if params['shape_features']:
+            checkpoint(68, "Midiendo la forma de los componentes...")
+            with inst.stage('shape_features') as stage:
+                features = component_features(labels, stats, candidates, cancel_token)
+                stage.output(features)
+        
+        # Optionally split the oversized components the closing welded together;
+        # their parts are appended to the component table and filtered like the rest
+        added_notes = []
+        if params['split_merged']:
+            checkpoint(69, "Separando componentes fusionados...")
+            with inst.stage('split_merged') as stage:
+                oversized = np.flatnonzero((areas > max_area) & (areas <= SPLIT_MAX_PARTS * max_area)) + 1
+                # The cars the filter can already see set the size of one car
+                part_area = float(np.median(areas[candidates - 1])) if len(candidates) else None
+                part_stats, part_centroids, _ = split_components(labels, stats, oversized, cancel_token,
+                                                                  min_part_area=min_area, part_area=part_area)
+                stage.output(part_stats, part_centroids)
+            if len(part_stats):
+                stats = np.concatenate([stats, part_stats])
+                centroids = np.concatenate([centroids, part_centroids])
+                added_notes.append(f"+{len(part_stats)} partes separadas")
+        
+        # Optionally regroup sub-threshold fragments into candidate cars, also
+        # appended to the component table
+        if params['merge_fragments']:
+            checkpoint(69, "Agrupando fragmentos de coches...")
+            with inst.stage('merge_fragments') as stage:
+                fragments = np.flatnonzero((areas < min_area) & (areas >= FRAGMENT_MIN_AREA_RATIO * min_area)) + 1
+                group_stats, group_centroids, _ = merge_fragments(
+                    stats, centroids, fragments, max_gap=scaled_length(FRAGMENT_MAX_GAP), cancel_token=cancel_token
+                )
+                stage.output(group_stats, group_centroids)
+            if len(group_stats):
+                stats = np.concatenate([stats, group_stats])
+                centroids = np.concatenate([centroids, group_centroids])
+                added_notes.append(f"+{len(group_stats)} grupos de fragmentos")
+        contour_compactness = feature_column(features, 'compactness', len(stats)) if features is not None else None
+        
+        checkpoint(70, f"Filtrando {len(stats)-1} componentes...")
         valid_components = []
         car_count = 0
         
-        for i in range(1, num_labels):
-            x, y, w, h, area = stats[i]
-            aspect_ratio = w / h if h > 0 else 0
-            extent = area / (w * h) if (w * h) > 0 else 0
-            
-            # Calculate additional geometric features
-            height_to_width_ratio = h / w if w > 0 else 0
-            perimeter = 2 * (w + h)
-            compactness = (4 * np.pi * area) / (perimeter * perimeter) if perimeter > 0 else 0
-            
-            # Filtrado más permisivo para coches
-            is_valid_car = True
-            rejection_reason = ""
-            
-            # Filtros básicos de tamaño más permisivos
-            if area < min_area:
-                is_valid_car = False
-                rejection_reason = "PEQUEÑO"
-            elif area > max_area:
-                is_valid_car = False
-                rejection_reason = "GRANDE"
-            
-            # Filtros dimensionales más permisivos
-            elif w < min_width or w > max_width:
-                is_valid_car = False
-                rejection_reason = "ANCHO_INVÁLIDO"
-            elif h < min_height or h > max_height:
-                is_valid_car = False
-                rejection_reason = "ALTO_INVÁLIDO"
+        with inst.stage('filtering'):
+            for i in range(1, len(stats)):
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+                x, y, w, h, area = stats[i]
+                aspect_ratio = w / h if h > 0 else 0
+                extent = area / (w * h) if (w * h) > 0 else 0
                 
-            # Filtros de forma más permisivos
-            elif aspect_ratio < min_aspect_ratio:
-                is_valid_car = False
-                rejection_reason = "MUY_ALTO"
-            elif aspect_ratio > max_aspect_ratio:
-                is_valid_car = False
-                rejection_reason = "MUY_ANCHO"
+                # Calculate additional geometric features
+                height_to_width_ratio = h / w if w > 0 else 0
+                perimeter = 2 * (w + h)
+                compactness = (4 * np.pi * area) / (perimeter * perimeter) if perimeter > 0 else 0
+                if contour_compactness is not None and not np.isnan(contour_compactness[i]):
+                    compactness = contour_compactness[i]
                 
-            # Detección de árboles más específica
-            elif height_to_width_ratio > 4.0:  # Más restrictivo para árboles
-                is_valid_car = False
-                rejection_reason = "ÁRBOL"
+                # Filtrado más permisivo para coches
+                is_valid_car = True
+                rejection_reason = ""
                 
-            # Detección de copas más específica
-            elif (0.7 <= aspect_ratio <= 1.4 and 
-                  area > 25000 and  # Área mínima más alta para copas
-                  compactness > 0.7):  # Compacidad más alta para copas
-                is_valid_car = False
-                rejection_reason = "COPA"
+                # Filtros básicos de tamaño más permisivos
+                if area < min_area:
+                    is_valid_car = False
+                    rejection_reason = "PEQUEÑO"
+                elif area > max_area:
+                    is_valid_car = False
+                    rejection_reason = "GRANDE"
                 
-            # Filtros de calidad más permisivos
-            elif extent < extent_threshold:
-                is_valid_car = False
-                rejection_reason = "IRREGULAR"
-            elif compactness < 0.05:  # Muy permisivo para compacidad
-                is_valid_car = False
-                rejection_reason = "DISPERSO"
+                # Filtros dimensionales más permisivos
+                elif w < min_width or w > max_width:
+                    is_valid_car = False
+                    rejection_reason = "ANCHO_INVÁLIDO"
+                elif h < min_height or h > max_height:
+                    is_valid_car = False
+                    rejection_reason = "ALTO_INVÁLIDO"
+                    
+                # Filtros de forma más permisivos
+                elif aspect_ratio < min_aspect_ratio:
+                    is_valid_car = False
+                    rejection_reason = "MUY_ALTO"
+                elif aspect_ratio > max_aspect_ratio:
+                    is_valid_car = False
+                    rejection_reason = "MUY_ANCHO"
+                    
+                # Detección de árboles más específica
+                elif height_to_width_ratio > 4.0:  # Más restrictivo para árboles
+                    is_valid_car = False
+                    rejection_reason = "ÁRBOL"
+                    
+                # Detección de copas más específica
+                elif (0.7 <= aspect_ratio <= 1.4 and 
+                      area > canopy_min_area and  # Área mínima más alta para copas
+                      compactness > 0.7):  # Compacidad más alta para copas
+                    is_valid_car = False
+                    rejection_reason = "COPA"
+                    
+                # Filtros de calidad más permisivos
+                elif extent < extent_threshold:
+                    is_valid_car = False
+                    rejection_reason = "IRREGULAR"
+                elif compactness < 0.05:  # Muy permisivo para compacidad
+                    is_valid_car = False
+                    rejection_reason = "DISPERSO"
+                    
+                # Objetos lineales muy largos
+                elif aspect_ratio > 10.0:  # Más permisivo
+                    is_valid_car = False
+                    rejection_reason = "LINEAL"
                 
-            # Objetos lineales muy largos
-            elif aspect_ratio > 10.0:  # Más permisivo
-                is_valid_car = False
-                rejection_reason = "LINEAL"
-            
-            if is_valid_car:
-                valid_components.append(i)
-                car_count += 1
+                if is_valid_car:
+                    valid_components.append(i)
+                    car_count += 1
         
         # Enhanced visualization
-        filtering_vis = draw_enhanced_component_stats(
-            image_opencv, stats, centroids, valid_components, min_area, max_area
-        )
-        pipeline_images.append(filtering_vis)
-        
+        if lazy_visualizations:
+            filtering_vis = None
+        else:
+            checkpoint(75, "Dibujando estadísticas de componentes...")
+            with inst.stage('stats_overlay') as stage:
+                if features is None:
+                    features = component_features(labels, stats, candidates, cancel_token)
+                filtering_vis = draw_enhanced_component_stats(
+                    image_opencv, stats, centroids, valid_components, min_area, max_area,
+                    cancel_token=cancel_token, features=features
+                )
+                stage.output(filtering_vis)
+        
+        added_note = f" ({', '.join(added_notes)})" if added_notes else ""
         param_summary = f"Área:[{min_area}-{max_area}], Aspecto:[{min_aspect_ratio:.1f}-{max_aspect_ratio:.1f}], Ancho:[{min_width}-{max_width}]"
-        step_descriptions.append(f"Filtrado geométrico permisivo: {len(valid_components)} coches de {num_labels-1} componentes - {param_summary}")
+        yield add_stage(
+            filtering_vis,
+            f"Filtrado geométrico permisivo: {len(valid_components)} coches de {num_labels-1} componentes{added_note} - {param_summary}",
+            lambda: ComponentStatsSource(stage_sources[0], stats, centroids, valid_components, min_area, max_area,
+                                         features, mask_source=stage_sources[5], candidates=candidates)
+        )
         
         # 9. Final result with enhanced visualization
-        result_image = image_opencv.copy()
-        for idx, component_label in enumerate(valid_components, 1):
-            x, y, w, h, area = stats[component_label]
-            
-            # Draw thick green rectangle for detected cars
-            cv2.rectangle(result_image, (x, y), (x + w, y + h), (0, 255, 0), 4)
-            
-            # Car label with background
-            label_text = f'Coche {idx}'
-            text_size = cv2.getTextSize(label_text, cv2.FONT_HERSHEY_SIMPLEX, 0.8, 2)[0]
-            
-            # Draw label background
-            cv2.rectangle(result_image, (x, y - text_size[1] - 12), 
-                         (x + text_size[0] + 8, y - 2), (0, 255, 0), -1)
-            
-            # Draw label text
-            cv2.putText(result_image, label_text, (x + 4, y - 6), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 0), 2)
-            
-            # Additional info
-            info_text = f'{w}x{h} A:{area}'
-            cv2.putText(result_image, info_text, (x, y + h + 18), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        checkpoint(90, "Dibujando resultado final...")
+        with inst.stage('final_overlay') as stage:
+            result_image = draw_detections(image_opencv, stats, valid_components, cancel_token)
+            stage.output(result_image)
         
-        pipeline_images.append(result_image)
         final_mode = "modo manual" if custom_params else "modo automático"
-        step_descriptions.append(f"Resultado final: {car_count} coches detectados en {final_mode}")
+        yield add_stage(result_image, f"Resultado final: {car_count} coches detectados en {final_mode}",
+                        lambda: DetectionsSource(stage_sources[0], stats, valid_components))
         
-        return pipeline_images, car_count, step_descriptions
+        checkpoint(100, "Pipeline completado")
+        detections = detections_from_stats(stats, centroids, valid_components)
+        return PipelineResult(pipeline_images, car_count, step_descriptions, inst.records, params, detections,
+                              stage_sources)
         
+    except ProcessingCancelled:
+        raise
     except Exception as e:
-        print(f"Error in image processing pipeline: {e}")
-        return [image_opencv], 0, [f"Error en procesamiento: {str(e)}"]
+        logger.exception("Error in image processing pipeline")
+        return PipelineResult([image_opencv], 0, [f"Error en procesamiento: {str(e)}"], inst.records, params,
+                              error=str(e))
+    finally:
+        inst.stop()
+
+def draw_detections(image, stats, valid_components, cancel_token=None, text=TEXT_AUTO):
+    """Draw the counted cars (boxes, numbered labels and sizes) on a copy of `image`."""
+    return draw_detection_overlay(image, stats, valid_components, text=text, cancel_token=cancel_token)
+
+def make_thumbnail(opencv_image, size=THUMBNAIL_SIZE):
+    """
+    Downscale an OpenCV image to fit `size` (width, height), keeping its aspect ratio.
+    INTER_AREA averages every source pixel, so thin structures survive the reduction
+    without the aliasing of a nearest or bilinear resize.
+    """
+    height, width = opencv_image.shape[:2]
+    scale = min(size[0] / width, size[1] / height)
+    if scale >= 1.0:
+        return opencv_image
+    target = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(opencv_image, target, interpolation=cv2.INTER_AREA)
 
 def convert_opencv_to_qimage(opencv_image):
     """
@@ -359,84 +837,17 @@ def convert_opencv_to_qimage(opencv_image):
     
     return q_image.copy()  # Important: create a copy for thread safety
 
-def draw_enhanced_component_stats(image, stats, centroids, filtered_indices, min_area, max_area):
-    """Draw enhanced component statistics showing why objects were filtered."""
-    result_image = image.copy()
-    
-    for i, (stats_row, centroid) in enumerate(zip(stats[1:], centroids[1:]), 1):
-        x, y, w, h, area = stats_row
-        cx, cy = int(centroid[0]), int(centroid[1])
-        aspect_ratio = w / h if h > 0 else 0
-        height_to_width_ratio = h / w if w > 0 else 0
-        extent = area / (w * h) if (w * h) > 0 else 0
-        perimeter = 2 * (w + h)
-        compactness = (4 * np.pi * area) / (perimeter * perimeter) if perimeter > 0 else 0
-        
-        # Calculate solidity for better classification
-        labels = np.zeros((image.shape[0], image.shape[1]), dtype=np.uint8)
-        labels[y:y+h, x:x+w] = 1  # Simplified for visualization
-        solidity = 0.7  # Default value for visualization
-        
-        # Enhanced color coding and labeling
-        if i in filtered_indices:
-            color = (0, 255, 0)  # Green for valid cars
-            thickness = 3
-            label = "COCHE"
-        else:
-            # More accurate rejection categorization
-            if area < min_area:
-                color = (100, 100, 255)  # Light blue for too small
-                label = "PEQUEÑO"
-            elif area > max_area:
-                color = (0, 0, 200)  # Dark blue for too large
-                label = "GRANDE"
-            elif height_to_width_ratio > 2.5:
-                color = (255, 100, 0)  # Orange for tree-like
-                label = "ÁRBOL"
-            elif solidity < 0.6 and area > 3000:
-                color = (255, 150, 0)  # Light orange for fragmented trees
-                label = "ÁRBOL_FRAG"
-            elif (0.8 <= aspect_ratio <= 1.25 and area > 15000 and compactness > 0.5):
-                color = (255, 200, 0)  # Yellow for crowns
-                label = "COPA"
-            elif aspect_ratio > 3.0:
-                color = (255, 0, 255)  # Magenta for very elongated
-                label = "ELONGADO"
-            elif extent < 0.35:
-                color = (128, 128, 128)  # Gray for irregular
-                label = "IRREGULAR"
-            elif compactness < 0.1:
-                color = (64, 64, 64)  # Dark gray for dispersed
-                label = "DISPERSO"
-            else:
-                color = (200, 200, 200)  # Light gray for other
-                label = "OTRO"
-            thickness = 1
-            
-        # Draw bounding rectangle
-        cv2.rectangle(result_image, (x, y), (x + w, y + h), color, thickness)
-        
-        # Draw centroid
-        cv2.circle(result_image, (cx, cy), 2, color, -1)
-        
-        # Add classification label
-        cv2.putText(result_image, label, (x, y - 35), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.45, color, 2)
-        
-        # Add metrics
-        metrics_text = f"A:{area} AR:{aspect_ratio:.1f}"
-        cv2.putText(result_image, metrics_text, (x, y - 20), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.35, color, 1)
-        
-        # Add size
-        size_text = f"{w}x{h}"
-        cv2.putText(result_image, size_text, (x, y - 8), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.35, color, 1)
-        
-        # Add additional debug info for rejected objects
-        if i not in filtered_indices:
-            debug_text = f"E:{extent:.2f} C:{compactness:.2f}"
-            cv2.putText(result_image, debug_text, (x, y + h + 12), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.3, color, 1)
-    
-    return result_image
+def draw_enhanced_component_stats(image, stats, centroids, filtered_indices, min_area, max_area,
+                                  cancel_token=None, text=TEXT_AUTO, features=None):
+    """
+    Draw enhanced component statistics showing why objects were filtered.
+    `features` (from component_features) supplies the measured solidity and
+    compactness of the components it covers.
+    """
+    solidity = compactness = None
+    if features is not None:
+        solidity = feature_column(features, 'solidity', len(stats))[1:]
+        compactness = feature_column(features, 'compactness', len(stats))[1:]
+    return draw_component_overlay(image, stats, centroids, filtered_indices, min_area, max_area,
+                                  solidity=solidity, compactness=compactness, text=text,
+                                  cancel_token=cancel_token)
@@ -0,0 +1,254 @@
+import logging
+import os
+import time
+import tracemalloc
+
+from app.utils.metrics import metrics
+
+STAGE_SECONDS = metrics.histogram(
+    'car_counter_stage_seconds', 'Wall time of each computed pipeline stage', ('stage',)
+)
+STAGE_RUNS = metrics.counter(
+    'car_counter_stage_runs_total', 'Pipeline stages run, split by whether the StageCache served them',
+    ('stage', 'cached')
+)
+
+# Shared by the job schedulers (GUI ProcessingService, HTTP service); `source`/`queue`/`pool` name the scheduler
+JOBS = metrics.counter('car_counter_jobs_total', 'Processing jobs by outcome', ('source', 'outcome'))
+JOB_SECONDS = metrics.histogram('car_counter_job_seconds', 'Wall time of processing jobs', ('source',))
+QUEUE_DEPTH = metrics.gauge('car_counter_queue_depth', 'Jobs waiting for a worker', ('queue',))
+WORKERS_BUSY = metrics.gauge('car_counter_workers_busy', 'Workers currently running a job', ('pool',))
+WORKER_BUSY_SECONDS = metrics.counter(
+    'car_counter_worker_busy_seconds_total', 'Accumulated busy time of the workers (utilization = rate / workers)',
+    ('pool',)
+)
+
+
+class StageMetrics:
+    """Measurements of one pipeline stage."""
+
+    __slots__ = ('name', 'index', 'wall_time', 'cpu_time', 'output_bytes', 'memory_peak', 'cached')
+
+    def __init__(self, name, wall_time=0.0, cpu_time=0.0, output_bytes=0, memory_peak=None, cached=False):
+        self.name = name
+        self.index = 0  # order of completion within the run
+        self.wall_time = wall_time  # seconds
+        self.cpu_time = cpu_time  # seconds of process CPU time (includes OpenCV worker threads)
+        self.output_bytes = output_bytes  # bytes of the arrays the stage produced
+        self.memory_peak = memory_peak  # bytes above the stage's start, None unless tracing memory
+        self.cached = cached  # True when the output came from a StageCache
+
+    def as_dict(self):
+        """Return the metrics as a plain, JSON-serializable dictionary."""
+        return {
+            'name': self.name,
+            'index': self.index,
+            'wall_ms': round(self.wall_time * 1000.0, 3),
+            'cpu_ms': round(self.cpu_time * 1000.0, 3),
+            'output_bytes': self.output_bytes,
+            'memory_peak_bytes': self.memory_peak,
+            'cached': self.cached,
+        }
+
+    def __repr__(self):
+        return (f"StageMetrics({self.name!r}, wall={self.wall_time * 1000.0:.1f}ms, "
+                f"cpu={self.cpu_time * 1000.0:.1f}ms, out={self.output_bytes}B)")
+
+
+class _StageRecorder:
+    """Context manager measuring one stage of an enabled PipelineInstrumentation."""
+
+    __slots__ = ('_owner', '_name', '_wall_start', '_cpu_start', '_memory_start', '_output_bytes')
+
+    def __init__(self, owner, name):
+        self._owner = owner
+        self._name = name
+        self._output_bytes = 0
+
+    def output(self, *arrays):
+        """Declare the arrays produced by the stage so their size is reported."""
+        for array in arrays:
+            self._output_bytes += getattr(array, 'nbytes', 0)
+
+    def __enter__(self):
+        if self._owner.trace_memory:
+            if hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+; older versions report the run's peak
+                tracemalloc.reset_peak()
+            self._memory_start = tracemalloc.get_traced_memory()[0]
+        self._cpu_start = time.process_time()
+        self._wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall_time = time.perf_counter() - self._wall_start
+        cpu_time = time.process_time() - self._cpu_start
+        memory_peak = None
+        if self._owner.trace_memory:
+            memory_peak = max(0, tracemalloc.get_traced_memory()[1] - self._memory_start)
+        if exc_type is None:
+            self._owner._add(StageMetrics(self._name, wall_time, cpu_time, self._output_bytes, memory_peak))
+        return False
+
+
+class _NullRecorder:
+    """Shared no-op stage recorder used when instrumentation is disabled."""
+
+    __slots__ = ()
+
+    def output(self, *arrays):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_RECORDER = _NullRecorder()
+
+
+class NullInstrumentation:
+    """Disabled instrumentation: every call is a constant-time no-op."""
+
+    enabled = False
+    records = ()
+
+    def stage(self, name):
+        return _NULL_RECORDER
+
+    def record_cached(self, name):
+        pass
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+NULL_INSTRUMENTATION = NullInstrumentation()
+
+
+class PipelineInstrumentation:
+    """
+    Collects per-stage wall time, CPU time, output size and (optionally) the
+    tracemalloc peak of a pipeline run.
+
+    Args:
+        hook: Optional callable(StageMetrics) invoked as each stage finishes
+        trace_memory: Measure each stage's allocation peak with tracemalloc.
+            Starts tracemalloc for the duration of the run if it is not
+            already tracing; this slows allocations noticeably.
+    """
+
+    enabled = True
+
+    def __init__(self, hook=None, trace_memory=False):
+        self.hook = hook
+        self.trace_memory = trace_memory
+        self.records = []
+        self._started_tracemalloc = False
+
+    def stage(self, name):
+        """Return a context manager that measures the stage `name`."""
+        return _StageRecorder(self, name)
+
+    def record_cached(self, name):
+        """Record that `name` was served from a cache and cost nothing."""
+        self._add(StageMetrics(name, cached=True))
+
+    def start(self):
+        """Prepare a run: clears previous records and starts memory tracing if asked."""
+        self.records = []
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def stop(self):
+        """Finish a run, stopping tracemalloc if this instance started it."""
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def total_wall_time(self):
+        """Sum of the wall time of all recorded stages, in seconds."""
+        return sum(record.wall_time for record in self.records)
+
+    def as_dicts(self):
+        """Return the recorded stages as a list of plain dictionaries."""
+        return [record.as_dict() for record in self.records]
+
+    def _add(self, metrics):
+        metrics.index = len(self.records)
+        self.records.append(metrics)
+        if self.hook is not None:
+            self.hook(metrics)
+
+
+def log_stage_metrics(metrics):
+    """Hook that reports each stage through the application logger."""
+    from app.utils.logger import logger
+    logger.log_processing_step(
+        metrics.name, metrics.index,
+        wall_ms=round(metrics.wall_time * 1000.0, 2),
+        cpu_ms=round(metrics.cpu_time * 1000.0, 2),
+        output_bytes=metrics.output_bytes,
+        memory_peak_bytes=metrics.memory_peak,
+        cached=metrics.cached
+    )
+
+
+def trace_stage_metrics(metrics):
+    """Hook that records each stage as a span of the timeline tracer."""
+    from app.utils.tracing import tracer
+    duration_ns = int(metrics.wall_time * 1e9)
+    tracer.complete(
+        metrics.name, time.perf_counter_ns() - duration_ns, duration_ns, 'pipeline',
+        cpu_ms=round(metrics.cpu_time * 1000.0, 2), output_bytes=metrics.output_bytes, cached=metrics.cached
+    )
+
+
+def record_stage_metrics(metrics):
+    """Hook that feeds each stage into the metrics registry."""
+    STAGE_RUNS.labels(stage=metrics.name, cached='true' if metrics.cached else 'false').inc()
+    if not metrics.cached:
+        STAGE_SECONDS.labels(stage=metrics.name).observe(metrics.wall_time)
+
+
+def _call_hooks(hooks):
+    def hook(metrics):
+        for each in hooks:
+            each(metrics)
+    return hook
+
+
+def instrumentation_from_environment():
+    """
+    Build the instrumentation requested through the environment.
+
+    CAR_COUNTER_STAGE_METRICS="1" logs per-stage timings through the
+    application logger, "memory" also traces allocation peaks; enabling it
+    lowers the logger to INFO so the stage records are written. When the
+    timeline tracer is enabled (CAR_COUNTER_TRACE) every stage also becomes a
+    span, and while the metrics registry is exported (HTTP /metrics or
+    CAR_COUNTER_METRICS_TEXTFILE) every stage feeds its histograms. Returns
+    None (instrumentation disabled) when none of these is active.
+    """
+    from app.utils.tracing import tracer
+
+    mode = os.environ.get('CAR_COUNTER_STAGE_METRICS', '').strip().lower()
+    log_metrics = mode not in ('', '0', 'false', 'no', 'off')
+    hooks = []
+    if log_metrics:
+        from app.utils.logger import logger
+        logger.ensure_level(logging.INFO)
+        hooks.append(log_stage_metrics)
+    if tracer.enabled:
+        hooks.append(trace_stage_metrics)
+    if metrics.enabled:
+        hooks.append(record_stage_metrics)
+    if not hooks:
+        return None
+    hook = hooks[0] if len(hooks) == 1 else _call_hooks(hooks)
+    return PipelineInstrumentation(hook=hook, trace_memory=(mode == 'memory'))
@@ -0,0 +1,270 @@
+"""
+Vectorized drawing of the pipeline visualizations.
+
+The label colouring maps every label to a uint8 hue index through a lookup
+table and colours the hue image with cv2.LUT, instead of building a float64
+full-frame temporary per band. The overlays compute the per-component
+metrics and categories as numpy arrays and draw every box of one colour
+with a single cv2.polylines call (pixel-identical to cv2.rectangle) and
+every centroid by stamping a precomputed disk, so only the text is drawn
+component by component.
+
+Text is the expensive and, with thousands of small components, unreadable
+part of an overlay. It is controlled by a `text` argument:
+
+    True     every component is labelled
+    False    no text
+    'auto'   level of detail: only components whose box is at least
+             MIN_TEXT_BOX_SIDE pixels on screen (box side x `scale`) are
+             labelled, at most MAX_TEXT_LABELS of them, largest first
+"""
+
+import cv2
+import numpy as np
+
+TEXT_AUTO = 'auto'
+# Shortest on-screen box side (pixels) that still gets text in 'auto' mode
+MIN_TEXT_BOX_SIDE = 12
+# Labelled components per overlay in 'auto' mode
+MAX_TEXT_LABELS = 1500
+# Components drawn between two cancellation checks in the text loops
+TEXT_CHECK_INTERVAL = 256
+
+# Hue-index -> BGR table: full saturation and value, index 0 is the black background
+_HUE_TO_BGR = cv2.cvtColor(
+    np.dstack([np.arange(256, dtype=np.uint8), np.full(256, 255, np.uint8), np.full(256, 255, np.uint8)]),
+    cv2.COLOR_HSV2BGR
+)
+_HUE_TO_BGR[0, 0] = 0
+
+# Categories of draw_component_overlay: (label, BGR colour, box thickness)
+COMPONENT_CATEGORIES = (
+    ("COCHE", (0, 255, 0), 3),
+    ("PEQUEÑO", (100, 100, 255), 1),
+    ("GRANDE", (0, 0, 200), 1),
+    ("ÁRBOL", (255, 100, 0), 1),
+    ("ÁRBOL_FRAG", (255, 150, 0), 1),
+    ("COPA", (255, 200, 0), 1),
+    ("ELONGADO", (255, 0, 255), 1),
+    ("IRREGULAR", (128, 128, 128), 1),
+    ("DISPERSO", (64, 64, 64), 1),
+    ("OTRO", (200, 200, 200), 1),
+)
+CATEGORY_CAR = 0
+
+# Solidity assumed by the overlay when the caller has no measured values
+DEFAULT_SOLIDITY = 0.7
+
+
+def label_hue_lut(max_label):
+    """uint8 hue index of every label 0..max_label; 0 (black) for the background."""
+    return (179 * np.arange(max_label + 1) / max(1, max_label)).astype(np.uint8)
+
+
+def colorize_labels(labels, hue_lut):
+    """BGR image of `labels` (or a band of it) coloured through `hue_lut`."""
+    hue = np.take(hue_lut, labels)
+    return cv2.LUT(cv2.merge([hue, hue, hue]), _HUE_TO_BGR)
+
+
+def box_corners(boxes):
+    """(N, 4, 2) int32 corners of (x, y, w, h) boxes, in cv2.rectangle's order."""
+    x0, y0 = boxes[:, 0], boxes[:, 1]
+    x1, y1 = x0 + boxes[:, 2], y0 + boxes[:, 3]
+    return np.stack([
+        np.stack([x0, y0], 1), np.stack([x1, y0], 1), np.stack([x1, y1], 1), np.stack([x0, y1], 1)
+    ], 1).astype(np.int32)
+
+
+def draw_boxes(image, boxes, color, thickness):
+    """Draw (x, y, w, h) `boxes` in one call; same pixels as one cv2.rectangle per box."""
+    if len(boxes):
+        cv2.polylines(image, box_corners(boxes), True, color, thickness)
+
+
+_DISK_OFFSETS = {}
+
+
+def _disk_offsets(radius):
+    offsets = _DISK_OFFSETS.get(radius)
+    if offsets is None:
+        side = 2 * radius + 3
+        stamp = np.zeros((side, side), np.uint8)
+        cv2.circle(stamp, (radius + 1, radius + 1), radius, 255, -1)
+        dy, dx = np.nonzero(stamp)
+        offsets = _DISK_OFFSETS[radius] = (dy - radius - 1, dx - radius - 1)
+    return offsets
+
+
+def draw_dots(image, points, radius, color):
+    """Filled circles of `radius` at integer (x, y) `points`, as cv2.circle draws them."""
+    if not len(points):
+        return
+    dy, dx = _disk_offsets(radius)
+    ys = (points[:, 1, None] + dy).ravel()
+    xs = (points[:, 0, None] + dx).ravel()
+    inside = (ys >= 0) & (ys < image.shape[0]) & (xs >= 0) & (xs < image.shape[1])
+    image[ys[inside], xs[inside]] = color
+
+
+def text_selection(boxes, text, scale=1.0):
+    """
+    Boolean mask of the `boxes` (x, y, w, h, area rows) that get text.
+
+    Args:
+        boxes: Component stats rows
+        text: True, False or 'auto' (see the module docstring)
+        scale: Display magnification the image is rendered for
+    """
+    count = len(boxes)
+    if text is True:
+        return np.ones(count, bool)
+    if not text or not count:
+        return np.zeros(count, bool)
+    on_screen = np.maximum(boxes[:, 2], boxes[:, 3]) * scale
+    selected = on_screen >= MIN_TEXT_BOX_SIDE
+    if np.count_nonzero(selected) > MAX_TEXT_LABELS:
+        candidates = np.flatnonzero(selected)
+        largest = candidates[np.argsort(-boxes[candidates, 4], kind='stable')[:MAX_TEXT_LABELS]]
+        selected = np.zeros(count, bool)
+        selected[largest] = True
+    return selected
+
+
+def component_metrics(stats):
+    """Aspect ratio, height/width ratio, extent and compactness arrays of stats rows."""
+    w = stats[:, 2].astype(np.float64)
+    h = stats[:, 3].astype(np.float64)
+    area = stats[:, 4].astype(np.float64)
+    box_area = w * h
+    perimeter = 2 * (w + h)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        aspect_ratio = np.where(h > 0, w / h, 0.0)
+        height_to_width = np.where(w > 0, h / w, 0.0)
+        extent = np.where(box_area > 0, area / box_area, 0.0)
+        compactness = np.where(perimeter > 0, 4 * np.pi * area / (perimeter * perimeter), 0.0)
+    return aspect_ratio, height_to_width, extent, compactness
+
+
+def measured_or(measured, fallback):
+    """`measured` where it holds a value, `fallback` where it is missing (None or NaN)."""
+    if measured is None:
+        return fallback
+    return np.where(np.isnan(measured), fallback, measured)
+
+
+def classify_components(stats, valid, min_area, max_area, solidity=None, compactness=None):
+    """
+    Category index (into COMPONENT_CATEGORIES) of every stats row.
+
+    Args:
+        stats: Component stats rows (background excluded)
+        valid: Boolean mask of the rows counted as cars
+        min_area, max_area: Area limits of the filter
+        solidity: Optional per-row measured solidity (NaN where unmeasured);
+            DEFAULT_SOLIDITY elsewhere
+        compactness: Optional per-row measured compactness (NaN where
+            unmeasured); the box-outline approximation elsewhere
+    """
+    area = stats[:, 4]
+    aspect_ratio, height_to_width, extent, box_compactness = component_metrics(stats)
+    compactness = measured_or(compactness, box_compactness)
+    solidity = measured_or(solidity, DEFAULT_SOLIDITY)
+    conditions = [
+        valid,
+        area < min_area,
+        area > max_area,
+        height_to_width > 2.5,
+        (solidity < 0.6) & (area > 3000),
+        (aspect_ratio >= 0.8) & (aspect_ratio <= 1.25) & (area > 15000) & (compactness > 0.5),
+        aspect_ratio > 3.0,
+        extent < 0.35,
+        compactness < 0.1,
+    ]
+    return np.select(conditions, np.arange(len(conditions)), default=len(conditions))
+
+
+def _check(cancel_token, position):
+    if cancel_token is not None and position % TEXT_CHECK_INTERVAL == 0:
+        cancel_token.raise_if_cancelled()
+
+
+def draw_component_overlay(image, stats, centroids, valid_components, min_area, max_area,
+                           solidity=None, compactness=None, text=TEXT_AUTO, scale=1.0, cancel_token=None):
+    """
+    Accepted and rejected components over a copy of `image`, colour-coded by
+    the reason they were rejected.
+
+    Args:
+        image: Original BGR image
+        stats, centroids: connectedComponentsWithStats output (row 0 is the background)
+        valid_components: Labels counted as cars
+        min_area, max_area: Area limits of the filter
+        solidity, compactness: Optional measured values aligned with stats[1:],
+            NaN where a component was not measured
+        text: True, False or 'auto'
+        scale: Display magnification used by the 'auto' text level of detail
+        cancel_token: Optional CancellationToken
+    """
+    result_image = image.copy()
+    rows = stats[1:]
+    if not len(rows):
+        return result_image
+    valid = np.zeros(len(stats), bool)
+    valid[list(valid_components)] = True
+    valid = valid[1:]
+    categories = classify_components(rows, valid, min_area, max_area, solidity, compactness)
+    points = centroids[1:].astype(np.int32)
+
+    # Rejected components first, so the counted cars stay on top
+    for category in list(range(1, len(COMPONENT_CATEGORIES))) + [CATEGORY_CAR]:
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        members = categories == category
+        if not members.any():
+            continue
+        _, color, thickness = COMPONENT_CATEGORIES[category]
+        draw_boxes(result_image, rows[members], color, thickness)
+        draw_dots(result_image, points[members], 2, color)
+
+    labelled = np.flatnonzero(text_selection(rows, text, scale))
+    if not len(labelled):
+        return result_image
+    aspect_ratio, _, extent, box_compactness = component_metrics(rows)
+    compactness = measured_or(compactness, box_compactness)
+    for position, row in enumerate(labelled):
+        _check(cancel_token, position)
+        x, y, w, h, area = (int(value) for value in rows[row])
+        label, color, _ = COMPONENT_CATEGORIES[categories[row]]
+        cv2.putText(result_image, label, (x, y - 35), cv2.FONT_HERSHEY_SIMPLEX, 0.45, color, 2)
+        cv2.putText(result_image, f"A:{area} AR:{aspect_ratio[row]:.1f}", (x, y - 20),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.35, color, 1)
+        cv2.putText(result_image, f"{w}x{h}", (x, y - 8), cv2.FONT_HERSHEY_SIMPLEX, 0.35, color, 1)
+        if not valid[row]:
+            cv2.putText(result_image, f"E:{extent[row]:.2f} C:{compactness[row]:.2f}", (x, y + h + 12),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.3, color, 1)
+    return result_image
+
+
+def draw_detection_overlay(image, stats, valid_components, text=TEXT_AUTO, scale=1.0, cancel_token=None):
+    """
+    The counted cars (boxes, numbered labels and sizes) over a copy of `image`.
+    Cars keep the number of their position in `valid_components` whichever of
+    them get text.
+    """
+    result_image = image.copy()
+    if not len(valid_components):
+        return result_image
+    rows = stats[np.asarray(valid_components, dtype=np.intp)]
+    draw_boxes(result_image, rows, (0, 255, 0), 4)
+
+    for position, index in enumerate(np.flatnonzero(text_selection(rows, text, scale))):
+        _check(cancel_token, position)
+        x, y, w, h, area = (int(value) for value in rows[index])
+        label_text = f'Coche {index + 1}'
+        text_size = cv2.getTextSize(label_text, cv2.FONT_HERSHEY_SIMPLEX, 0.8, 2)[0]
+        cv2.rectangle(result_image, (x, y - text_size[1] - 12), (x + text_size[0] + 8, y - 2), (0, 255, 0), -1)
+        cv2.putText(result_image, label_text, (x + 4, y - 6), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 0), 2)
+        cv2.putText(result_image, f'{w}x{h} A:{area}', (x, y + h + 18),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+    return result_image
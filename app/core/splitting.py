@@ -0,0 +1,250 @@
+"""
+Splitting of components that the morphological closing welded together.
+
+The closing stage joins the parts of a car, but it also bridges adjacent
+cars into one component that the geometric filter rejects as too large.
+split_components() works inside the bounding box of each such component
+only, so the cost is proportional to the area of the merged components
+rather than the frame:
+
+    cuts       every concavity of the outline deeper than SPLIT_NOTCH_DEPTH
+               (a convexity defect: the notch between two parked cars, the
+               inner corner of an L) is cut by the shortest straight segment
+               that leaves it roughly inwards and crosses the component,
+               up to SPLIT_MAX_CUT long
+    markers    the local maxima of the distance transform of the cut
+               component, above SPLIT_PEAK_RATIO of its maximum; a thin
+               bridge needs no cut, it already separates two maxima
+    watershed  cv2.watershed floods the component from the markers over its
+               distance relief; the cuts and the outside of the component
+               sit on a step the flood crosses last, so every part stops at
+               its cut and the flood cannot leak around the component
+    slabs      a region still holding several cars' area (`part_area` times
+               SPLIT_SLAB_RATIO each) is cut into that many equal-area slabs
+               across its major axis: cars parked door to door leave neither
+               a notch nor a second distance maximum
+
+The cuts and the markers are found on the filled silhouette of the
+component, so windows and roof lines do not stop a cut or scatter the
+maxima. Every region is returned as a new stats row. Regions smaller than
+`min_part_area` lose their marker and are flooded by their neighbours.
+
+    part_stats, part_centroids, parents = split_components(labels, stats, oversized, min_part_area=800, part_area=2300)
+"""
+
+import math
+
+import cv2
+import numpy as np
+
+# Concavities shallower than this fraction of the component's half width
+# (its distance-transform maximum) are outline noise, not a gap between cars
+SPLIT_NOTCH_DEPTH = 0.3
+# Longest cut, in half widths; a car parked side by side is cut along its
+# length, about four half widths
+SPLIT_MAX_CUT = 5.0
+# Cuts leave a notch at most this many degrees away from its inward normal
+SPLIT_CUT_SPREAD = 60
+# Distance maxima below this fraction of the component's maximum do not seed a part
+SPLIT_PEAK_RATIO = 0.5
+# Components larger than this many times max_area are left whole; they are
+# not a handful of touching cars
+SPLIT_MAX_PARTS = 6
+# A flooded part is cut into slabs only when it holds this many car areas per
+# slab; a row of cars parked door to door has no notch to cut, but a single
+# car that the closing grew a little must stay whole
+SPLIT_SLAB_RATIO = 1.3
+
+_CUT_ANGLES = np.radians(np.arange(-SPLIT_CUT_SPREAD, SPLIT_CUT_SPREAD + 1, 5))
+
+
+def _empty_parts():
+    return np.zeros((0, 5), np.int32), np.zeros((0, 2), np.float64), np.zeros(0, np.int32)
+
+
+def _notch_cuts(mask, half_width):
+    """((x0, y0), (x1, y1)) segments cutting the notches of `mask` (the crop of one component)."""
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+    if not contours:
+        return []
+    contour = max(contours, key=cv2.contourArea)
+    if len(contour) < 4:
+        return []
+    try:
+        defects = cv2.convexityDefects(contour, cv2.convexHull(contour, returnPoints=False))
+    except cv2.error:
+        # Self-intersecting hull indices on degenerate outlines
+        return []
+    if defects is None:
+        return []
+
+    points = contour.reshape(-1, 2).astype(np.float64)
+    height, width = mask.shape
+    min_depth = max(2.0, SPLIT_NOTCH_DEPTH * half_width)
+    max_length = SPLIT_MAX_CUT * half_width
+    steps = np.arange(1, int(max_length) + 2)
+    cuts = []
+    for start, end, far, depth in defects.reshape(-1, 4):
+        if depth / 256.0 < min_depth:
+            continue
+        notch = points[far]
+        chord = points[end] - points[start]
+        normal = np.array([chord[1], -chord[0]])
+        if normal @ (notch - (points[start] + points[end]) / 2) < 0:
+            normal = -normal
+        angles = math.atan2(normal[1], normal[0]) + _CUT_ANGLES
+        # Pixels along every candidate direction, (angles, steps, xy)
+        rays = np.rint(notch + steps[None, :, None] * np.stack([np.cos(angles), np.sin(angles)], 1)[:, None, :])
+        rays = rays.astype(np.intp)
+        in_frame = (rays[..., 0] >= 0) & (rays[..., 0] < width) & (rays[..., 1] >= 0) & (rays[..., 1] < height)
+        inside = np.zeros(in_frame.shape, bool)
+        inside[in_frame] = mask[rays[..., 1][in_frame], rays[..., 0][in_frame]] > 0
+
+        # The notch pixel is on the outline; a cut ends where its ray first
+        # leaves the component after entering it
+        entered = np.argmax(inside, axis=1)
+        outside = ~(inside | (steps[None, :] <= entered[:, None]))
+        lengths = np.where(inside.any(1) & outside.any(1), np.argmax(outside, axis=1), len(steps))
+        best = int(np.argmin(lengths))
+        if lengths[best] <= max_length:
+            end_point = rays[best, lengths[best]]
+            cuts.append(((int(round(notch[0])), int(round(notch[1]))), (int(end_point[0]), int(end_point[1]))))
+    return cuts
+
+
+def _flood(markers, relief, mask):
+    """Watershed from `markers` restricted to `mask`; boundary pixels join a neighbouring region."""
+    regions = markers.copy()
+    cv2.watershed(relief, regions)
+    regions[(regions < 0) | (mask == 0)] = 0
+    # Watershed lines and cut pixels are one or two pixels wide
+    for _ in range(3):
+        missing = (regions == 0) & (mask > 0)
+        if not missing.any():
+            break
+        grown = cv2.dilate(regions.astype(np.float32), np.ones((3, 3), np.uint8)).astype(np.int32)
+        regions[missing] = grown[missing]
+    return regions
+
+
+def _slabs(ys, xs, count):
+    """Index 0..count-1 of equal-area slabs across the major axis of the pixels (ys, xs)."""
+    coordinates = np.stack([xs, ys], 1).astype(np.float64)
+    coordinates -= coordinates.mean(0)
+    _, vectors = np.linalg.eigh(coordinates.T @ coordinates)
+    position = coordinates @ vectors[:, -1]
+    order = np.argsort(position, kind='stable')
+    slabs = np.empty(len(position), np.intp)
+    slabs[order] = np.arange(len(position)) * count // len(position)
+    return slabs
+
+
+def split_component(labels, stats, label, min_part_area=0, part_area=None):
+    """
+    Parts of component `label`, in frame coordinates.
+
+    Args:
+        labels, stats: connectedComponentsWithStats output
+        label: Component to split
+        min_part_area: Parts below this area are merged into a neighbour
+        part_area: Typical area of one car; a part holding two or more times
+            SPLIT_SLAB_RATIO of it is cut into that many equal-area slabs
+            across its major axis. None disables the slabs
+
+    Returns:
+        (stats rows (k, 5), centroids (k, 2)); empty when the component is
+        left whole
+    """
+    x, y, w, h, _ = (int(value) for value in stats[label])
+    # One pixel of margin so the crop border counts as background
+    pixels = np.zeros((h + 2, w + 2), np.uint8)
+    pixels[1:-1, 1:-1] = labels[y:y + h, x:x + w] == label
+    # Parts are found on the silhouette: windows and roof lines are holes
+    # that would stop the cuts and scatter the distance maxima
+    contours, _ = cv2.findContours(pixels, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    mask = np.zeros_like(pixels)
+    cv2.drawContours(mask, contours, -1, 1, cv2.FILLED)
+    half_width = float(cv2.distanceTransform(mask, cv2.DIST_L2, 5).max())
+    if half_width < 2:
+        return _empty_parts()[:2]
+
+    cut = mask.copy()
+    for start, end in _notch_cuts(mask, half_width):
+        cv2.line(cut, start, end, 0, 2)
+    distance = cv2.distanceTransform(cut, cv2.DIST_L2, 5)
+    # Maxima over a square window of one half width (square kernels dilate in linear time)
+    window = np.ones((int(half_width) | 1, int(half_width) | 1), np.uint8)
+    peaks = (distance >= cv2.dilate(distance, window)) & (distance >= SPLIT_PEAK_RATIO * half_width)
+    marker_count, markers = cv2.connectedComponents(peaks.view(np.uint8), connectivity=8)
+
+    if marker_count > 2:
+        # cv2.watershed orders the flood by the colour step between neighbours:
+        # ridges are dark and the cuts and the outside black, so the flood
+        # spreads through each part before it crosses a cut or the outline
+        gray = np.where(cut > 0, 255 - 200 * distance / max(float(distance.max()), 1.0), 0).astype(np.uint8)
+        relief = cv2.merge([gray, gray, gray])
+        regions = _flood(markers, relief, mask)
+        regions[pixels == 0] = 0
+        if min_part_area:
+            areas = np.bincount(regions.ravel(), minlength=marker_count)
+            small = np.flatnonzero(areas[1:] < min_part_area) + 1
+            if len(small):
+                markers[np.isin(markers, small)] = 0
+                regions = _flood(markers, relief, mask)
+                regions[pixels == 0] = 0
+    else:
+        regions = pixels.astype(np.int32)
+
+    inner = regions[1:-1, 1:-1]
+    parts = []
+    for part in np.unique(inner[inner > 0]):
+        ys, xs = np.nonzero(inner == part)
+        count = int(len(ys) / (part_area * SPLIT_SLAB_RATIO) + 0.5) if part_area else 1
+        if count >= 2 and len(ys) // count >= min_part_area:
+            slabs = _slabs(ys, xs, count)
+            parts.extend((ys[slabs == slab], xs[slabs == slab]) for slab in range(count))
+        else:
+            parts.append((ys, xs))
+    if len(parts) < 2:
+        return _empty_parts()[:2]
+
+    rows = []
+    centroids = []
+    for ys, xs in parts:
+        left, top = xs.min(), ys.min()
+        rows.append((x + left, y + top, xs.max() - left + 1, ys.max() - top + 1, len(ys)))
+        centroids.append((x + xs.mean(), y + ys.mean()))
+    return np.array(rows, np.int32), np.array(centroids, np.float64)
+
+
+def split_components(labels, stats, indices, cancel_token=None, min_part_area=0, part_area=None):
+    """
+    Split every component in `indices` that holds more than one part.
+
+    Args:
+        labels: Label image from connectedComponentsWithStats
+        stats: Its stats table
+        indices: Labels to try, usually the components above max_area
+        cancel_token: Optional CancellationToken, checked per component
+        min_part_area: Parts below this area are merged into a neighbour,
+            usually the filter's min_area
+        part_area: Typical area of one car, usually the median area of the
+            components in the filter's range; see split_component
+
+    Returns:
+        (part stats (k, 5), part centroids (k, 2), parent label of every part)
+    """
+    all_rows = []
+    all_centroids = []
+    parents = []
+    for label in indices:
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        rows, centroids = split_component(labels, stats, int(label), min_part_area, part_area)
+        if len(rows):
+            all_rows.append(rows)
+            all_centroids.append(centroids)
+            parents.extend([int(label)] * len(rows))
+    if not all_rows:
+        return _empty_parts()
+    return np.concatenate(all_rows), np.concatenate(all_centroids), np.array(parents, np.int32)
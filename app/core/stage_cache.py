@@ -0,0 +1,49 @@
+import threading
+
+
+class StageCache:
+    """
+    Single-slot memo of the upstream pipeline stages for one source image.
+
+    Each stage keeps only its most recent (key, value) pair, where the key is the
+    tuple of effective parameters that stage depends on. Moving a filtering
+    slider therefore reuses grayscale, filtering, threshold, morphology and
+    labeling, while moving a threshold slider recomputes only from there on.
+    Binding a different image object clears every slot.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._image = None
+        self._slots = {}
+        self.hits = 0
+        self.misses = 0
+
+    def bind(self, image):
+        """Attach the cache to `image`, dropping entries computed for another image."""
+        with self._lock:
+            if self._image is not image:
+                self._image = image
+                self._slots = {}
+
+    def lookup(self, stage, key):
+        """Return the cached value of `stage` for `key`, or None on a miss."""
+        with self._lock:
+            slot = self._slots.get(stage)
+            if slot is not None and slot[0] == key:
+                self.hits += 1
+                return slot[1]
+            self.misses += 1
+            return None
+
+    def store(self, stage, key, value):
+        """Remember `value` as the output of `stage` for `key`."""
+        with self._lock:
+            self._slots[stage] = (key, value)
+        return value
+
+    def clear(self):
+        """Drop every cached stage and release the bound image."""
+        with self._lock:
+            self._image = None
+            self._slots = {}
@@ -0,0 +1,170 @@
+"""
+Compact sources of the pipeline stage images.
+
+A displayed stage is a full-resolution BGR image, but most stages can be
+rebuilt from much less: the grayscale stages from one channel, the binary
+stages from a bit-packed mask, the label colouring from the final mask and
+the overlays from the original image plus the component table. For a
+20 MP frame the nine BGR stage images take about 540 MB; their sources
+take about 110 MB, most of it the original image that every overlay shares.
+
+Every source exposes `nbytes` and `render()`, which returns the BGR stage
+image. Rendering is deterministic, so an image can be dropped at any time
+and rendered again later.
+"""
+
+import cv2
+import numpy as np
+
+
+class StageSource:
+    """Base class: something that can render one stage image."""
+
+    @property
+    def nbytes(self):
+        raise NotImplementedError
+
+    def render(self, cancel_token=None):
+        """Return the stage image as a BGR array."""
+        raise NotImplementedError
+
+
+class ImageSource(StageSource):
+    """A BGR image kept as it is (the original frame)."""
+
+    def __init__(self, image):
+        self.image = image
+
+    @property
+    def shape(self):
+        return self.image.shape[:2]
+
+    @property
+    def nbytes(self):
+        return self.image.nbytes
+
+    def render(self, cancel_token=None):
+        return self.image.copy()
+
+
+class GraySource(StageSource):
+    """A single-channel image, expanded to BGR on render."""
+
+    def __init__(self, gray):
+        self.gray = gray
+
+    @property
+    def nbytes(self):
+        return self.gray.nbytes
+
+    def render(self, cancel_token=None):
+        return cv2.cvtColor(self.gray, cv2.COLOR_GRAY2BGR)
+
+
+class MaskSource(StageSource):
+    """A 0/255 mask stored with one bit per pixel."""
+
+    def __init__(self, mask):
+        self.shape = mask.shape[:2]
+        self._bits = np.packbits(mask > 0, axis=None)
+
+    @property
+    def nbytes(self):
+        return self._bits.nbytes
+
+    def mask(self):
+        """The 0/255 uint8 mask."""
+        count = self.shape[0] * self.shape[1]
+        return (np.unpackbits(self._bits, count=count).reshape(self.shape) * 255).astype(np.uint8)
+
+    def render(self, cancel_token=None):
+        return cv2.cvtColor(self.mask(), cv2.COLOR_GRAY2BGR)
+
+
+class LabelsSource(StageSource):
+    """
+    Colour-coded connected components, relabelled from the mask they came
+    from. connectedComponents is deterministic, so the labels (and colours)
+    match the ones the pipeline counted.
+    """
+
+    def __init__(self, mask_source):
+        self.mask_source = mask_source  # shared with the closing stage
+
+    @property
+    def nbytes(self):
+        return 0
+
+    def render(self, cancel_token=None):
+        from app.core.image_processor import visualize_labels
+        num_labels, labels = cv2.connectedComponents(self.mask_source.mask(), connectivity=8)
+        return visualize_labels(labels, cancel_token, max_label=num_labels - 1)
+
+
+class ComponentStatsSource(StageSource):
+    """
+    Accepted and rejected components drawn over the original image. Without
+    `features`, the first render relabels `mask_source` (like LabelsSource)
+    and measures the `candidates`, so a pipeline run only pays for the shape
+    features when the overlay is shown.
+    """
+
+    def __init__(self, original, stats, centroids, valid_components, min_area, max_area, features=None,
+                 mask_source=None, candidates=None):
+        self.original = original  # ImageSource shared with stage 0
+        self.stats = stats
+        self.centroids = centroids
+        self.valid_components = list(valid_components)
+        self.min_area = min_area
+        self.max_area = max_area
+        self.features = features  # component_features of the components in the size range
+        self.mask_source = mask_source  # shared with the closing stage
+        self.candidates = candidates  # labels the features are measured for
+
+    @property
+    def nbytes(self):
+        features_nbytes = self.features.nbytes if self.features is not None else 0
+        return self.stats.nbytes + self.centroids.nbytes + features_nbytes
+
+    def render(self, cancel_token=None):
+        from app.core.features import component_features
+        from app.core.image_processor import draw_enhanced_component_stats
+        if self.features is None and self.mask_source is not None and self.candidates is not None:
+            _, labels = cv2.connectedComponents(self.mask_source.mask(), connectivity=8)
+            self.features = component_features(labels, self.stats, self.candidates, cancel_token)
+        return draw_enhanced_component_stats(
+            self.original.image, self.stats, self.centroids, self.valid_components,
+            self.min_area, self.max_area, cancel_token=cancel_token, features=self.features
+        )
+
+
+class DetectionsSource(StageSource):
+    """The counted cars drawn over the original image."""
+
+    def __init__(self, original, stats, valid_components):
+        self.original = original  # ImageSource shared with stage 0
+        self.stats = stats
+        self.valid_components = list(valid_components)
+
+    @property
+    def nbytes(self):
+        return self.stats.nbytes
+
+    def render(self, cancel_token=None):
+        from app.core.image_processor import draw_detections
+        return draw_detections(self.original.image, self.stats, self.valid_components, cancel_token)
+
+
+def total_nbytes(sources):
+    """Memory held by `sources`, counting shared sources once."""
+    seen = set()
+    total = 0
+    pending = list(sources)
+    while pending:
+        source = pending.pop()
+        if source is None or id(source) in seen:
+            continue
+        seen.add(id(source))
+        total += source.nbytes
+        pending.extend(getattr(source, name, None) for name in ('original', 'mask_source'))
+    return total
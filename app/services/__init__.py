@@ -0,0 +1,3 @@
+"""
+Headless services of the Car Counter application (no Qt dependency).
+"""
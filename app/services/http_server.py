@@ -0,0 +1,415 @@
+"""
+Local HTTP counting service built on asyncio streams (standard library only).
+
+    python main.py serve --port 8765 --workers 4 --queue-size 16
+
+Endpoints:
+    POST /count    JSON {"path": "...", "params": {...}} or the raw image bytes
+                   (query string: params=<json>, detections=0 to omit the table)
+    GET  /health   status, worker count and queue depth
+    GET  /stats    per-endpoint latency histograms and request counters
+    GET  /metrics  the metrics registry in Prometheus text format
+
+Requests go through a bounded queue to a pool of pipeline worker threads
+(OpenCV releases the GIL, so the stages of different images overlap). When
+the queue is full the server answers 503 with Retry-After instead of
+queueing without limit. Identical requests in flight at the same time (same
+file or same upload bytes, same parameters) share one pipeline run, the way
+ProcessingService collapses repeated GUI submissions.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import cv2
+import numpy as np
+
+from app.core.detections import detections_to_list
+from app.core.image_processor import run_pipeline
+from app.core.instrumentation import (
+    JOB_SECONDS, JOBS, QUEUE_DEPTH, WORKER_BUSY_SECONDS, WORKERS_BUSY, instrumentation_from_environment
+)
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+from app.utils.tracing import tracer
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 256 * 1024 * 1024
+JSON_CONTENT_TYPE = 'application/json; charset=utf-8'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+HTTP_REQUESTS = metrics.counter('car_counter_http_requests_total', 'HTTP requests', ('endpoint', 'status'))
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    'car_counter_http_request_seconds', 'HTTP request latency, including the wait for a worker', ('endpoint',)
+)
+
+_QUEUE_DEPTH = QUEUE_DEPTH.labels(queue='http')
+_WORKERS_BUSY = WORKERS_BUSY.labels(pool='http')
+_WORKER_BUSY_SECONDS = WORKER_BUSY_SECONDS.labels(pool='http')
+_JOB_SECONDS = JOB_SECONDS.labels(source='http')
+
+
+class HttpError(Exception):
+    """Error answered to the client with `status` and a JSON message."""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = HTTPStatus(status)
+        self.message = message
+        self.headers = headers or {}
+
+
+class CountRequest:
+    """One image to count: a local path or uploaded bytes, with its parameters."""
+
+    def __init__(self, params=None, path=None, data=None, include_detections=True):
+        self.params = params
+        self.path = path
+        self.data = data
+        self.include_detections = include_detections
+
+    def key(self):
+        """Identity used to share one run between identical concurrent requests."""
+        if self.path is not None:
+            stat = os.stat(self.path)
+            source = ('path', os.path.abspath(self.path), stat.st_size, stat.st_mtime_ns)
+        else:
+            source = ('data', hashlib.sha1(self.data).hexdigest())
+        return source + (json.dumps(self.params, sort_keys=True) if self.params else None,)
+
+
+def count_image(request):
+    """Decode and process one CountRequest; runs on a worker thread."""
+    start = time.perf_counter()
+    with tracer.span('decode', 'io'):
+        if request.path is not None:
+            image = cv2.imread(request.path)
+        else:
+            image = cv2.imdecode(np.frombuffer(request.data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise HttpError(HTTPStatus.UNPROCESSABLE_ENTITY, "No se pudo decodificar la imagen")
+    decode_ms = (time.perf_counter() - start) * 1000.0
+
+    with tracer.span('run_pipeline', 'pipeline'):
+        result = run_pipeline(image, request.params, instrumentation=instrumentation_from_environment())
+    if result.error is not None:
+        # A count of 0 would read as an empty road
+        raise HttpError(HTTPStatus.INTERNAL_SERVER_ERROR, f"Error en el procesamiento: {result.error}")
+    height, width = image.shape[:2]
+    return {
+        'count': result.car_count,
+        'width': width,
+        'height': height,
+        'summary': result.descriptions[-1] if result.descriptions else None,
+        'detections': detections_to_list(result.detections),
+        'timing_ms': {
+            'decode': round(decode_ms, 3),
+            'pipeline': round((time.perf_counter() - start) * 1000.0 - decode_ms, 3),
+        },
+    }
+
+
+class CountingServer:
+    """
+    HTTP front end feeding a pool of pipeline workers.
+
+    Args:
+        host: Interface to bind; loopback by default
+        port: TCP port (0 picks a free one, see `port` after start())
+        workers: Number of pipeline worker threads
+        queue_size: Requests allowed to wait for a worker before answering 503
+        default_params: Parameters used when a request carries none (None = automatic)
+        root: If set, local paths must be inside this directory
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, queue_size=16,
+                 default_params=None, root=None):
+        self.host = host
+        self.port = port
+        self.workers = workers or max(1, min(4, os.cpu_count() or 1))
+        self.queue_size = queue_size
+        self.default_params = default_params
+        self.root = os.path.realpath(root) if root else None
+
+        self._queue = None
+        self._inflight = {}  # request key -> asyncio.Future
+        self._executor = None
+        self._worker_tasks = []
+        self._server = None
+        self._busy = 0
+
+    # Lifecycle --------------------------------------------------------
+
+    async def start(self):
+        metrics.enable()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='PipelineWorker')
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Counting server listening", host=self.host, port=self.port,
+                    workers=self.workers, queue_size=self.queue_size)
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    # Work queue -------------------------------------------------------
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            request, future = await self._queue.get()
+            _QUEUE_DEPTH.set(self._queue.qsize())
+            self._busy += 1
+            _WORKERS_BUSY.inc()
+            start = time.perf_counter()
+            try:
+                result = await loop.run_in_executor(self._executor, count_image, request)
+            except Exception as e:
+                JOBS.labels(source='http', outcome='failed').inc()
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                JOBS.labels(source='http', outcome='finished').inc()
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                elapsed = time.perf_counter() - start
+                self._busy -= 1
+                _WORKERS_BUSY.dec()
+                _WORKER_BUSY_SECONDS.inc(elapsed)
+                _JOB_SECONDS.observe(elapsed)
+                self._queue.task_done()
+
+    async def _submit(self, request):
+        """Queue a request (or join an identical one in flight) and wait for its result."""
+        try:
+            # Hashing an upload or stat-ing a path must not block the event loop
+            key = await asyncio.get_running_loop().run_in_executor(None, request.key)
+        except OSError:
+            raise HttpError(HTTPStatus.NOT_FOUND, f"No existe el archivo: {request.path}")
+
+        future = self._inflight.get(key)
+        if future is not None:
+            JOBS.labels(source='http', outcome='coalesced').inc()
+        else:
+            future = asyncio.get_running_loop().create_future()
+            try:
+                self._queue.put_nowait((request, future))
+            except asyncio.QueueFull:
+                JOBS.labels(source='http', outcome='rejected').inc()
+                raise HttpError(HTTPStatus.SERVICE_UNAVAILABLE, "Servidor saturado, reintente más tarde",
+                                headers={'Retry-After': '1'})
+            _QUEUE_DEPTH.set(self._queue.qsize())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: a client disconnecting must not cancel the run others may share
+        return await asyncio.shield(future)
+
+    # HTTP -------------------------------------------------------------
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await reader.readline()
+                except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+                    break
+                if not request_line:
+                    break
+                keep_alive = await self._handle_request(request_line, reader, writer)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _handle_request(self, request_line, reader, writer):
+        start = time.perf_counter()
+        method = path = None
+        keep_alive = False
+        headers = {}
+        try:
+            try:
+                method, target, version = request_line.decode('latin-1').split()
+            except ValueError:
+                raise HttpError(HTTPStatus.BAD_REQUEST, "Línea de petición inválida")
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            connection = headers.get('connection', '').lower()
+            wants_keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+
+            url = urlsplit(target)
+            path = url.path
+            body = await self._read_body(method, headers, reader)
+            # Only once the body is consumed is the stream at the next request;
+            # an error before that point closes the connection
+            keep_alive = wants_keep_alive
+            status, document, extra_headers = await self._dispatch(method, url, headers, body)
+        except HttpError as e:
+            status, document, extra_headers = e.status, {'error': e.message}, e.headers
+        except Exception as e:
+            logger.exception("Unhandled error in HTTP request", path=path)
+            status, document, extra_headers = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}, {}
+
+        if isinstance(document, str):
+            payload, content_type = document.encode('utf-8'), PROMETHEUS_CONTENT_TYPE
+        else:
+            payload, content_type = json.dumps(document, ensure_ascii=False).encode('utf-8'), JSON_CONTENT_TYPE
+        lines = [f"HTTP/1.1 {status.value} {status.phrase}",
+                 f"Content-Type: {content_type}",
+                 f"Content-Length: {len(payload)}",
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        lines.extend(f"{name}: {value}" for name, value in extra_headers.items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + payload)
+        await writer.drain()
+
+        elapsed = time.perf_counter() - start
+        endpoint = f"{method} {path}" if path in _ROUTES else 'other'
+        HTTP_REQUEST_SECONDS.labels(endpoint=endpoint).observe(elapsed)
+        HTTP_REQUESTS.labels(endpoint=endpoint, status=status.value).inc()
+        logger.debug("HTTP request", path=path, status=status.value, ms=round(elapsed * 1000.0, 3))
+        return keep_alive
+
+    async def _read_body(self, method, headers, reader):
+        if method != 'POST':
+            return b''
+        if 'content-length' not in headers:
+            raise HttpError(HTTPStatus.LENGTH_REQUIRED, "Falta Content-Length")
+        try:
+            length = int(headers['content-length'])
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Content-Length inválido")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Imagen demasiado grande")
+        return await reader.readexactly(length)
+
+    async def _dispatch(self, method, url, headers, body):
+        route = _ROUTES.get(url.path)
+        if route is None:
+            raise HttpError(HTTPStatus.NOT_FOUND, f"Ruta desconocida: {url.path}")
+        if method != route[0]:
+            raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED, f"Use {route[0]} en {url.path}",
+                            headers={'Allow': route[0]})
+        return await route[1](self, url, headers, body)
+
+    async def _count(self, url, headers, body):
+        request = self._parse_count_request(url, headers, body)
+        result = await self._submit(request)
+        if not request.include_detections:
+            result = {key: value for key, value in result.items() if key != 'detections'}
+        return HTTPStatus.OK, result, {}
+
+    def _parse_count_request(self, url, headers, body):
+        query = parse_qs(url.query)
+        include_detections = query.get('detections', ['1'])[0] not in ('0', 'false', 'no')
+        params = self.default_params
+        if 'params' in query:
+            params = self._parse_params(query['params'][0])
+
+        if headers.get('content-type', '').split(';')[0].strip() == 'application/json':
+            try:
+                document = json.loads(body.decode('utf-8'))
+            except (UnicodeDecodeError, ValueError):
+                raise HttpError(HTTPStatus.BAD_REQUEST, "JSON inválido")
+            if not isinstance(document, dict) or not document.get('path'):
+                raise HttpError(HTTPStatus.BAD_REQUEST, "Se esperaba {\"path\": ...}")
+            if 'params' in document:
+                params = document['params']
+            include_detections = bool(document.get('detections', include_detections))
+            return CountRequest(params, path=self._check_path(document['path']),
+                                include_detections=include_detections)
+
+        if not body:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Cuerpo vacío: envíe la imagen o un JSON con 'path'")
+        return CountRequest(params, data=body, include_detections=include_detections)
+
+    def _parse_params(self, text):
+        try:
+            params = json.loads(text)
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Parámetros JSON inválidos")
+        if params is not None and not isinstance(params, dict):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Los parámetros deben ser un objeto JSON")
+        return params
+
+    def _check_path(self, path):
+        if self.root is not None:
+            real_path = os.path.realpath(path)
+            if os.path.commonpath([self.root, real_path]) != self.root:
+                raise HttpError(HTTPStatus.FORBIDDEN, "Ruta fuera del directorio permitido")
+        return path
+
+    async def _health(self, url, headers, body):
+        return HTTPStatus.OK, {
+            'status': 'ok',
+            'workers': self.workers,
+            'busy_workers': self._busy,
+            'queue_depth': self._queue.qsize(),
+            'queue_size': self.queue_size,
+        }, {}
+
+    async def _stats(self, url, headers, body):
+        responses = {}
+        for (endpoint, status), series in HTTP_REQUESTS.series():
+            responses.setdefault(endpoint, {})[status] = int(series.value)
+        jobs = {outcome: int(series.value) for (source, outcome), series in JOBS.series() if source == 'http'}
+        return HTTPStatus.OK, {
+            'latency_seconds': {endpoint: series.as_dict() for (endpoint,), series in HTTP_REQUEST_SECONDS.series()},
+            'responses': responses,
+            'jobs': jobs,
+        }, {}
+
+    async def _metrics(self, url, headers, body):
+        return HTTPStatus.OK, metrics.render(), {}
+
+
+# path -> (method, handler)
+_ROUTES = {
+    '/count': ('POST', CountingServer._count),
+    '/health': ('GET', CountingServer._health),
+    '/stats': ('GET', CountingServer._stats),
+    '/metrics': ('GET', CountingServer._metrics),
+}
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, queue_size=16, default_params=None, root=None):
+    """Run a CountingServer until interrupted (Ctrl+C)."""
+    server = CountingServer(host, port, workers, queue_size, default_params, root)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,300 @@
+"""
+Asyncio ingestion of large image trees.
+
+Walking, reading and decoding overlap instead of running one file at a time:
+
+    directory walk (os.scandir, one thread)
+        -> readers   (io_concurrency file reads in flight)
+        -> decoders  (cv2.imdecode on a thread pool)
+        -> consumer  (e.g. count_images, a pool of pipeline workers)
+
+Every hand-off is a bounded asyncio.Queue, so at most about
+`io_concurrency + prefetch` encoded or decoded images are held in memory
+and a slow consumer throttles the reads instead of letting them pile up.
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from app.core.image_processor import run_pipeline
+from app.core.instrumentation import JOB_SECONDS, JOBS, instrumentation_from_environment
+from app.utils.logger import logger
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+
+# Paths handed from the walker thread to the event loop per round trip
+_WALK_BATCH = 256
+_DONE = object()
+
+
+def iter_image_files(root, recursive=True, extensions=IMAGE_EXTENSIONS):
+    """
+    Yield the image files under `root` using os.scandir.
+
+    Directories are walked iteratively (no recursion limit) and entries are
+    yielded in directory order, without sorting, so the first paths are
+    available immediately even for directories with millions of files.
+    Symbolic links to directories are not followed.
+    """
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        subdirectories = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if recursive:
+                                subdirectories.append(entry.path)
+                        elif entry.name.lower().endswith(extensions) and entry.is_file():
+                            yield entry.path
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.warning("Cannot scan directory", directory=directory, error=e)
+        # Reverse so subdirectories are visited in name order
+        pending.extend(sorted(subdirectories, reverse=True))
+
+
+class IngestedImage:
+    """One file read and decoded by an IngestionPipeline."""
+
+    __slots__ = ('path', 'image', 'size_bytes', 'read_time', 'decode_time', 'error')
+
+    def __init__(self, path, image=None, size_bytes=0, read_time=0.0, decode_time=0.0, error=None):
+        self.path = path
+        self.image = image  # BGR array, None when reading or decoding failed
+        self.size_bytes = size_bytes
+        self.read_time = read_time  # seconds
+        self.decode_time = decode_time  # seconds
+        self.error = error
+
+
+def _take(iterator, count):
+    batch = []
+    for path in iterator:
+        batch.append(path)
+        if len(batch) >= count:
+            break
+    return batch
+
+
+def _read_file(path):
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        data = f.read()
+    return data, time.perf_counter() - start
+
+
+def _decode(data, flags):
+    """Return (image, seconds, error); image is None and error set when the data is not an image."""
+    start = time.perf_counter()
+    if not data:
+        return None, 0.0, "Archivo vacío"
+    try:
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+    except cv2.error as e:
+        return None, time.perf_counter() - start, f"No se pudo decodificar la imagen: {e}"
+    error = None if image is not None else "No se pudo decodificar la imagen"
+    return image, time.perf_counter() - start, error
+
+
+class IngestionPipeline:
+    """
+    Streams decoded images from a directory tree or an iterable of paths.
+
+    Args:
+        source: Root directory, or an iterable of file paths
+        io_concurrency: File reads in flight at once
+        decode_workers: Threads decoding images (default: CPU count)
+        prefetch: Decoded images buffered ahead of the consumer
+        recursive: Descend into subdirectories when `source` is a directory
+        read_flags: cv2.imdecode flags
+    """
+
+    def __init__(self, source, io_concurrency=16, decode_workers=None, prefetch=32, recursive=True,
+                 read_flags=cv2.IMREAD_COLOR):
+        self.source = source
+        self.io_concurrency = max(1, io_concurrency)
+        self.decode_workers = decode_workers or os.cpu_count() or 1
+        self.prefetch = max(1, prefetch)
+        self.recursive = recursive
+        self.read_flags = read_flags
+
+    def _paths(self):
+        if isinstance(self.source, (str, os.PathLike)):
+            return iter_image_files(os.fspath(self.source), self.recursive)
+        return iter(self.source)
+
+    async def images(self):
+        """Async generator of IngestedImage in completion order (not walk order)."""
+        loop = asyncio.get_running_loop()
+        paths = asyncio.Queue(maxsize=self.io_concurrency * 2)
+        decoded = asyncio.Queue(maxsize=self.prefetch)
+        walk_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='IngestWalk')
+        io_pool = ThreadPoolExecutor(max_workers=self.io_concurrency, thread_name_prefix='IngestIO')
+        decode_pool = ThreadPoolExecutor(max_workers=self.decode_workers, thread_name_prefix='IngestDecode')
+
+        async def walk():
+            iterator = self._paths()
+            while True:
+                batch = await loop.run_in_executor(walk_pool, _take, iterator, _WALK_BATCH)
+                if not batch:
+                    break
+                for path in batch:
+                    await paths.put(path)
+            for _ in range(self.io_concurrency):
+                await paths.put(_DONE)
+
+        async def read_and_decode():
+            while True:
+                path = await paths.get()
+                if path is _DONE:
+                    return
+                try:
+                    data, read_time = await loop.run_in_executor(io_pool, _read_file, path)
+                except OSError as e:
+                    await decoded.put(IngestedImage(path, error=str(e)))
+                    continue
+                image, decode_time, error = await loop.run_in_executor(decode_pool, _decode, data,
+                                                                       self.read_flags)
+                await decoded.put(IngestedImage(path, image, len(data), read_time, decode_time, error))
+
+        async def supervise():
+            try:
+                await asyncio.gather(walk(), *(read_and_decode() for _ in range(self.io_concurrency)))
+            finally:
+                await decoded.put(_DONE)
+
+        supervisor = asyncio.create_task(supervise())
+        try:
+            while True:
+                item = await decoded.get()
+                if item is _DONE:
+                    break
+                yield item
+            await supervisor
+        finally:
+            supervisor.cancel()
+            for pool in (walk_pool, io_pool, decode_pool):
+                pool.shutdown(wait=False, cancel_futures=True)
+
+
+class CountedImage:
+    """Result of counting one ingested image."""
+
+    __slots__ = ('path', 'car_count', 'detections', 'params', 'size_bytes', 'read_time', 'decode_time',
+                 'process_time', 'error')
+
+    def __init__(self, ingested, car_count=0, detections=None, params=None, process_time=0.0, error=None):
+        self.path = ingested.path
+        self.car_count = car_count
+        self.detections = detections
+        self.params = params  # effective parameters of the run
+        self.size_bytes = ingested.size_bytes
+        self.read_time = ingested.read_time
+        self.decode_time = ingested.decode_time
+        self.process_time = process_time
+        self.error = error or ingested.error
+
+    def as_dict(self):
+        return {
+            'path': self.path,
+            'count': self.car_count,
+            'error': self.error,
+            'bytes': self.size_bytes,
+            'read_ms': round(self.read_time * 1000.0, 3),
+            'decode_ms': round(self.decode_time * 1000.0, 3),
+            'process_ms': round(self.process_time * 1000.0, 3),
+        }
+
+
+def _count(ingested, params):
+    start = time.perf_counter()
+    result = run_pipeline(ingested.image, params, instrumentation=instrumentation_from_environment())
+    elapsed = time.perf_counter() - start
+    error = f"Error en el procesamiento: {result.error}" if result.error is not None else None
+    return CountedImage(ingested, result.car_count, result.detections, result.params, elapsed, error)
+
+
+async def count_images(pipeline, params=None, workers=None):
+    """
+    Count every image an IngestionPipeline produces on a pool of pipeline threads.
+
+    Async generator of CountedImage in completion order. No more than
+    `workers` images are being counted at once; while they are busy, no new
+    image is taken from the pipeline, which in turn pauses its reads.
+    """
+    loop = asyncio.get_running_loop()
+    workers = workers or os.cpu_count() or 1
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='CountWorker')
+    pending = set()
+    sources = {}  # future -> IngestedImage
+    job_seconds = JOB_SECONDS.labels(source='batch')
+
+    def collect(done):
+        for future in done:
+            ingested = sources.pop(future)
+            try:
+                counted = future.result()
+            except Exception as e:
+                logger.error("Error counting image", path=ingested.path, error=e)
+                counted = CountedImage(ingested, error=str(e))
+            outcome = 'failed' if counted.error else 'finished'
+            JOBS.labels(source='batch', outcome=outcome).inc()
+            if not counted.error:
+                job_seconds.observe(counted.process_time)
+            yield counted
+
+    try:
+        async for ingested in pipeline.images():
+            if ingested.image is None:
+                JOBS.labels(source='batch', outcome='failed').inc()
+                yield CountedImage(ingested)
+                continue
+            future = loop.run_in_executor(pool, _count, ingested, params)
+            sources[future] = ingested
+            pending.add(future)
+            if len(pending) >= workers:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for counted in collect(done):
+                    yield counted
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for counted in collect(done):
+                yield counted
+    finally:
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def count_directory(source, params=None, on_result=None, workers=None, io_concurrency=16, decode_workers=None,
+                    prefetch=32, recursive=True):
+    """
+    Synchronous entry point: count every image under `source`.
+
+    `on_result(CountedImage)` is called as each image finishes; the images
+    themselves are not kept. Returns (images counted, images failed, seconds).
+    """
+    async def run():
+        pipeline = IngestionPipeline(source, io_concurrency, decode_workers, prefetch, recursive)
+        counted = failed = 0
+        async for result in count_images(pipeline, params, workers):
+            if result.error:
+                failed += 1
+            else:
+                counted += 1
+            if on_result is not None:
+                on_result(result)
+        return counted, failed
+
+    start = time.perf_counter()
+    counted, failed = asyncio.run(run())
+    return counted, failed, time.perf_counter() - start
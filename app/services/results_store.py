@@ -0,0 +1,290 @@
+"""
+SQLite store of historical counts.
+
+Every processed image becomes a row of `images` (timestamp, camera,
+parameter profile, count) and each detected car a row of `detections`.
+An image file is stored once per version and profile: adding the same
+(path, mtime, profile) again replaces the earlier row, its detections and
+its contribution to the rollup, so re-running a batch or re-processing an
+image in the GUI does not count its cars twice.
+Inserts are buffered and written in one transaction per batch, in WAL mode
+so readers never block the writer. An `hourly_counts` rollup, updated in the
+same transaction, answers per-hour queries by reading a few hundred rows
+however many detections are stored:
+
+    store = ResultsStore('results.sqlite')
+    store.add(path, car_count, detections, params, camera='norte')
+    store.flush()
+    store.hourly_counts(camera='norte', start=time.time() - 30 * 86400)
+
+A store object belongs to the thread that created it.
+"""
+
+import json
+import os
+import sqlite3
+import time
+
+from app.utils.profiling import parameters_hash
+
+RESULTS_DB_ENV = 'CAR_COUNTER_RESULTS_DB'
+DEFAULT_RESULTS_DB = os.path.join(os.path.expanduser("~"), ".car_counter_cache", "results.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cameras (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS profiles (
+    id INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL UNIQUE,
+    params TEXT
+);
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    camera_id INTEGER NOT NULL REFERENCES cameras(id),
+    profile_id INTEGER NOT NULL REFERENCES profiles(id),
+    path TEXT,
+    mtime REAL,
+    car_count INTEGER NOT NULL,
+    source TEXT,
+    processed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_ts ON images(ts);
+CREATE INDEX IF NOT EXISTS images_camera_ts ON images(camera_id, ts, car_count);
+CREATE INDEX IF NOT EXISTS images_profile_ts ON images(profile_id, ts, car_count);
+CREATE UNIQUE INDEX IF NOT EXISTS images_version ON images(path, mtime, profile_id);
+CREATE TABLE IF NOT EXISTS detections (
+    image_id INTEGER NOT NULL REFERENCES images(id),
+    x INTEGER, y INTEGER, w INTEGER, h INTEGER, area INTEGER,
+    cx REAL, cy REAL
+);
+CREATE INDEX IF NOT EXISTS detections_image ON detections(image_id);
+CREATE TABLE IF NOT EXISTS hourly_counts (
+    camera_id INTEGER NOT NULL,
+    profile_id INTEGER NOT NULL,
+    hour INTEGER NOT NULL,
+    images INTEGER NOT NULL,
+    cars INTEGER NOT NULL,
+    PRIMARY KEY (camera_id, hour, profile_id)
+) WITHOUT ROWID;
+"""
+
+_UPSERT_HOURLY = """
+INSERT INTO hourly_counts (camera_id, profile_id, hour, images, cars) VALUES (?, ?, ?, 1, ?)
+ON CONFLICT (camera_id, hour, profile_id) DO UPDATE SET images = images + 1, cars = cars + excluded.cars
+"""
+
+_RETRACT_HOURLY = """
+UPDATE hourly_counts SET images = images - 1, cars = cars - ? WHERE camera_id = ? AND hour = ? AND profile_id = ?
+"""
+
+
+def camera_from_path(path):
+    """Default camera name: the directory the image was dropped into."""
+    return os.path.basename(os.path.dirname(os.path.abspath(path))) or 'default'
+
+
+def results_db_from_environment(default=DEFAULT_RESULTS_DB):
+    """Path from CAR_COUNTER_RESULTS_DB ('0'/'off' disables, unset uses `default`)."""
+    value = os.environ.get(RESULTS_DB_ENV)
+    if value is None:
+        return default
+    value = value.strip()
+    if value.lower() in ('', '0', 'false', 'no', 'off'):
+        return None
+    return value
+
+
+class ResultsStore:
+    """
+    Buffered writer and query helper over the results database.
+
+    Args:
+        path: SQLite file, created with its directory if missing
+        batch_size: Buffered images that trigger an automatic flush
+    """
+
+    def __init__(self, path, batch_size=64):
+        self.path = path
+        self.batch_size = batch_size
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+        self._cameras = dict(self._connection.execute("SELECT name, id FROM cameras"))
+        self._profiles = dict(self._connection.execute("SELECT hash, id FROM profiles"))
+        self._pending = []
+
+    # Writing ----------------------------------------------------------
+
+    def add(self, path, car_count, detections=None, params=None, camera=None, timestamp=None, source=None):
+        """
+        Buffer one processed image.
+
+        Args:
+            path: Image path (also the default camera, see camera_from_path)
+            car_count: Number of cars counted
+            detections: Optional structured array (DETECTION_DTYPE) of the cars
+            params: Effective parameters of the run; None for automatic mode
+            camera: Camera name; defaults to the image's directory name
+            timestamp: Capture time in Unix seconds; defaults to the file's mtime, then now
+            source: Free-form origin of the result, e.g. 'gui', 'batch', 'watch'
+
+        A row already stored for the same path, file mtime and parameters is
+        replaced when the batch is written.
+        """
+        try:
+            mtime = os.path.getmtime(path)
+        except (OSError, TypeError):
+            mtime = None
+        if timestamp is None:
+            timestamp = mtime if mtime is not None else time.time()
+        if path:
+            path = os.path.abspath(path)
+        camera = camera or (camera_from_path(path) if path else 'default')
+        self._pending.append((path, mtime, int(car_count), detections, params, camera, float(timestamp), source))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered images in a single transaction."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        processed_at = time.time()
+        try:
+            self._write(pending, processed_at)
+        except sqlite3.Error:
+            # Ids cached during the failed transaction were rolled back with it
+            self._cameras = dict(self._connection.execute("SELECT name, id FROM cameras"))
+            self._profiles = dict(self._connection.execute("SELECT hash, id FROM profiles"))
+            raise
+
+    def _write(self, pending, processed_at):
+        with self._connection:
+            cursor = self._connection.cursor()
+            detection_rows = []
+            for path, mtime, car_count, detections, params, camera, timestamp, source in pending:
+                camera_id = self._camera_id(cursor, camera)
+                profile_id = self._profile_id(cursor, params)
+                if path is not None and mtime is not None:
+                    self._remove_version(cursor, path, mtime, profile_id)
+                cursor.execute(
+                    "INSERT INTO images (ts, camera_id, profile_id, path, mtime, car_count, source, processed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (timestamp, camera_id, profile_id, path, mtime, car_count, source, processed_at)
+                )
+                image_id = cursor.lastrowid
+                cursor.execute(_UPSERT_HOURLY, (camera_id, profile_id, int(timestamp // 3600) * 3600, car_count))
+                if detections is not None and len(detections):
+                    detection_rows.extend(
+                        (image_id, int(x), int(y), int(w), int(h), int(area), float(cx), float(cy))
+                        for x, y, w, h, area, cx, cy in detections.tolist()
+                    )
+            if detection_rows:
+                cursor.executemany(
+                    "INSERT INTO detections (image_id, x, y, w, h, area, cx, cy) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    detection_rows
+                )
+
+    def _remove_version(self, cursor, path, mtime, profile_id):
+        """Delete the stored row of this image version and take it out of the rollup."""
+        existing = cursor.execute(
+            "SELECT id, ts, camera_id, car_count FROM images WHERE path = ? AND mtime = ? AND profile_id = ?",
+            (path, mtime, profile_id)
+        ).fetchone()
+        if existing is None:
+            return
+        image_id, timestamp, camera_id, car_count = existing
+        # Detections first: their image id must not be reused by the next insert
+        cursor.execute("DELETE FROM detections WHERE image_id = ?", (image_id,))
+        cursor.execute("DELETE FROM images WHERE id = ?", (image_id,))
+        hour = int(timestamp // 3600) * 3600
+        cursor.execute(_RETRACT_HOURLY, (car_count, camera_id, hour, profile_id))
+        cursor.execute("DELETE FROM hourly_counts WHERE camera_id = ? AND hour = ? AND profile_id = ? AND images <= 0",
+                       (camera_id, hour, profile_id))
+
+    def _camera_id(self, cursor, name):
+        camera_id = self._cameras.get(name)
+        if camera_id is None:
+            cursor.execute("INSERT OR IGNORE INTO cameras (name) VALUES (?)", (name,))
+            camera_id = cursor.execute("SELECT id FROM cameras WHERE name = ?", (name,)).fetchone()[0]
+            self._cameras[name] = camera_id
+        return camera_id
+
+    def _profile_id(self, cursor, params):
+        key = parameters_hash(params)
+        profile_id = self._profiles.get(key)
+        if profile_id is None:
+            cursor.execute("INSERT OR IGNORE INTO profiles (hash, params) VALUES (?, ?)",
+                           (key, json.dumps(params, sort_keys=True) if params else None))
+            profile_id = cursor.execute("SELECT id FROM profiles WHERE hash = ?", (key,)).fetchone()[0]
+            self._profiles[key] = profile_id
+        return profile_id
+
+    def close(self):
+        self.flush()
+        self._connection.close()
+
+    # Queries ----------------------------------------------------------
+
+    def cameras(self):
+        return [name for (name,) in self._connection.execute("SELECT name FROM cameras ORDER BY name")]
+
+    def hourly_counts(self, camera=None, start=None, end=None, profile=None):
+        """
+        [(hour start in Unix seconds, images, cars)] from the rollup table.
+
+        Args:
+            camera: Camera name; None aggregates every camera
+            start, end: Unix-second bounds (inclusive start, exclusive end)
+            profile: Parameter profile hash (see parameters_hash); None for all
+        """
+        conditions, values = [], []
+        if camera is not None:
+            conditions.append("camera_id = (SELECT id FROM cameras WHERE name = ?)")
+            values.append(camera)
+        if start is not None:
+            conditions.append("hour >= ?")
+            values.append(int(start // 3600) * 3600)
+        if end is not None:
+            conditions.append("hour < ?")
+            values.append(end)
+        if profile is not None:
+            conditions.append("profile_id = (SELECT id FROM profiles WHERE hash = ?)")
+            values.append(profile)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self._connection.execute(
+            f"SELECT hour, SUM(images), SUM(cars) FROM hourly_counts {where} GROUP BY hour ORDER BY hour", values
+        ).fetchall()
+
+    def images(self, camera=None, start=None, end=None, limit=1000):
+        """Most recent image rows as dictionaries, newest first."""
+        conditions, values = [], []
+        if camera is not None:
+            conditions.append("i.camera_id = (SELECT id FROM cameras WHERE name = ?)")
+            values.append(camera)
+        if start is not None:
+            conditions.append("i.ts >= ?")
+            values.append(start)
+        if end is not None:
+            conditions.append("i.ts < ?")
+            values.append(end)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._connection.execute(
+            "SELECT i.id, i.ts, c.name, p.hash, i.path, i.car_count, i.source FROM images i "
+            "JOIN cameras c ON c.id = i.camera_id JOIN profiles p ON p.id = i.profile_id "
+            f"{where} ORDER BY i.ts DESC LIMIT ?", values + [limit]
+        ).fetchall()
+        keys = ('id', 'ts', 'camera', 'profile', 'path', 'count', 'source')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def detections(self, image_id):
+        """Detection rows of one image as (x, y, w, h, area, cx, cy) tuples."""
+        return self._connection.execute(
+            "SELECT x, y, w, h, area, cx, cy FROM detections WHERE image_id = ?", (image_id,)
+        ).fetchall()
@@ -0,0 +1,456 @@
+"""
+Watch-folder daemon: counts the images dropped into a directory.
+
+    python main.py watch /srv/camaras --index camaras.sqlite --output conteos.jsonl
+
+New files are detected with inotify (through ctypes, Linux) or, where that
+is unavailable or --poll is given, by periodically scanning the tree. A
+SQLite index keeps (path, mtime, size, SHA-1) of every file seen, so a
+restart skips files already processed and a file rewritten with identical
+content is not processed again. For every image the delay from its arrival
+(the moment the watcher or the scan reported it, not the file's mtime, which
+copies and cameras may set to any time) to its result is stored in the index
+and reported as a metric.
+"""
+
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import os
+import select
+import sqlite3
+import struct
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import cv2
+import numpy as np
+
+from app.core.image_processor import run_pipeline
+from app.core.instrumentation import JOB_SECONDS, JOBS, instrumentation_from_environment
+from app.services.ingestion import IMAGE_EXTENSIONS, iter_image_files
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+ARRIVAL_LATENCY = metrics.histogram(
+    'car_counter_watch_arrival_latency_seconds', 'Delay from a file arriving in the watched folder to its result'
+)
+
+# inotify constants from <sys/inotify.h>
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE_SELF
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    sha1 TEXT,
+    car_count INTEGER,
+    error TEXT,
+    processed_at REAL,
+    latency_ms REAL
+)
+"""
+
+
+def _is_image(path):
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+class RescanNeeded(Exception):
+    """Raised by a watcher that lost events (inotify queue overflow)."""
+
+
+class InotifyWatcher:
+    """
+    Reports image files that were closed after writing or moved into the tree.
+
+    Raises OSError when inotify is not available (non-Linux, or out of watches).
+    """
+
+    def __init__(self, root, recursive=True):
+        library = ctypes.util.find_library('c')
+        self._libc = ctypes.CDLL(library or 'libc.so.6', use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError("inotify no disponible")
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.root = root
+        self.recursive = recursive
+        self._directories = {}  # watch descriptor -> directory
+        self._add_tree(root)
+
+    def _add_watch(self, directory):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_add_watch({directory}): {os.strerror(errno)}")
+        self._directories[wd] = directory
+
+    def _add_tree(self, root):
+        self._add_watch(root)
+        if not self.recursive:
+            return
+        for directory, subdirectories, _ in os.walk(root):
+            for name in subdirectories:
+                self._add_watch(os.path.join(directory, name))
+
+    def poll(self, timeout):
+        """Wait up to `timeout` seconds and return the paths of new or rewritten images."""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            buffer = os.read(self._fd, 1 << 16)
+        except BlockingIOError:
+            return []
+        paths = []
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & _IN_Q_OVERFLOW:
+                raise RescanNeeded()
+            if mask & _IN_IGNORED:
+                self._directories.pop(wd, None)
+                continue
+            directory = self._directories.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & _IN_ISDIR:
+                if self.recursive and mask & (_IN_CREATE | _IN_MOVED_TO):
+                    # Files may land in the new directory before its watch exists
+                    try:
+                        self._add_tree(path)
+                    except OSError as e:
+                        logger.warning("Cannot watch new directory", directory=path, error=e)
+                        continue
+                    paths.extend(iter_image_files(path))
+            elif mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO) and _is_image(path):
+                paths.append(path)
+        return paths
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher:
+    """
+    Scans the tree every `interval` seconds. A new or changed file is
+    reported once its size and mtime were stable across two scans, so
+    files still being copied are not picked up half-written.
+    """
+
+    def __init__(self, root, recursive=True, interval=2.0):
+        self.root = root
+        self.recursive = recursive
+        self.interval = interval
+        self._known = self._snapshot()  # files present at start are left to the initial scan
+        self._changing = {}
+
+    def _snapshot(self):
+        snapshot = {}
+        for path in iter_image_files(self.root, self.recursive):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def poll(self, timeout):
+        time.sleep(max(timeout, self.interval))
+        current = self._snapshot()
+        paths = []
+        changing = {}
+        for path, identity in current.items():
+            if self._known.get(path) == identity:
+                continue
+            if self._changing.get(path) == identity:
+                self._known[path] = identity
+                paths.append(path)
+            else:
+                changing[path] = identity
+        self._changing = changing
+        for path in set(self._known) - set(current):
+            del self._known[path]
+        return paths
+
+    def close(self):
+        pass
+
+
+def make_watcher(root, recursive=True, polling=False, interval=2.0):
+    """inotify watcher when available (and not disabled), polling otherwise."""
+    if not polling:
+        try:
+            return InotifyWatcher(root, recursive)
+        except (OSError, AttributeError) as e:
+            logger.warning("inotify unavailable, polling instead", error=e)
+    return PollingWatcher(root, recursive, interval)
+
+
+class FileIndex:
+    """SQLite index of the files processed by the watch daemon (one thread only)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(_SCHEMA)
+        self._connection.commit()
+
+    def lookup(self, path):
+        """(mtime_ns, size, sha1) recorded for `path`, or None."""
+        return self._connection.execute(
+            "SELECT mtime_ns, size, sha1 FROM files WHERE path = ?", (path,)
+        ).fetchone()
+
+    def record(self, path, mtime_ns, size, sha1, car_count=None, error=None, processed_at=None,
+               latency_ms=None):
+        self._connection.execute(
+            "INSERT OR REPLACE INTO files (path, mtime_ns, size, sha1, car_count, error, processed_at, latency_ms) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, mtime_ns, size, sha1, car_count, error, processed_at, latency_ms)
+        )
+
+    def touch(self, path, mtime_ns, size):
+        """Update the stat identity of a file whose content did not change."""
+        self._connection.execute("UPDATE files SET mtime_ns = ?, size = ? WHERE path = ?", (mtime_ns, size, path))
+
+    def commit(self):
+        self._connection.commit()
+
+    def count(self):
+        return self._connection.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
+
+
+class WatchResult:
+    """Outcome of processing one file of the watched folder."""
+
+    __slots__ = ('path', 'mtime_ns', 'size', 'sha1', 'car_count', 'detections', 'params', 'error',
+                 'processed_at', 'latency', 'process_time', 'skipped')
+
+    def __init__(self, path, mtime_ns, size, sha1=None):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.sha1 = sha1
+        self.car_count = None
+        self.detections = None
+        self.params = None
+        self.error = None
+        self.processed_at = None
+        self.latency = None  # seconds from the file being observed to its result
+        self.process_time = 0.0
+        self.skipped = False  # same content as the indexed version
+
+    def as_dict(self):
+        return {
+            'path': self.path,
+            'count': self.car_count,
+            'error': self.error,
+            'sha1': self.sha1,
+            'processed_at': self.processed_at,
+            'latency_ms': round(self.latency * 1000.0, 3) if self.latency is not None else None,
+            'process_ms': round(self.process_time * 1000.0, 3),
+        }
+
+
+def _process_file(path, mtime_ns, size, indexed_sha1, params, observed_at):
+    """
+    Hash, decode and count one file; runs on a worker thread. Decoding and
+    pipeline failures are returned in `error`, so the index records them and
+    the file is not retried until it changes.
+    """
+    result = WatchResult(path, mtime_ns, size)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        result.error = str(e)
+        return result
+    result.sha1 = hashlib.sha1(data).hexdigest()
+    if result.sha1 == indexed_sha1:
+        result.skipped = True
+        return result
+
+    start = time.perf_counter()
+    try:
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR) if data else None
+    except cv2.error as e:
+        image = None
+        result.error = f"No se pudo decodificar la imagen: {e}"
+    if image is None:
+        result.error = result.error or "No se pudo decodificar la imagen"
+    else:
+        try:
+            pipeline_result = run_pipeline(image, params, instrumentation=instrumentation_from_environment())
+        except Exception as e:
+            logger.exception("Pipeline failed on watched file", path=path)
+            result.error = f"Error en el procesamiento: {e}"
+        else:
+            if pipeline_result.error is not None:
+                result.error = f"Error en el procesamiento: {pipeline_result.error}"
+            result.car_count = pipeline_result.car_count
+            result.detections = pipeline_result.detections
+            result.params = pipeline_result.params
+    result.process_time = time.perf_counter() - start
+    result.processed_at = time.time()
+    result.latency = max(0.0, result.processed_at - observed_at)
+    return result
+
+
+class WatchDaemon:
+    """
+    Processes the images already in `root` that the index does not know, then
+    every image that arrives until stop() is called.
+
+    Args:
+        root: Directory to watch
+        index_path: SQLite file of the incremental index
+        params: Pipeline parameters (None for automatic mode)
+        on_result: Optional callable(WatchResult) for every processed file
+        workers: Pipeline threads
+        recursive: Also watch subdirectories
+        polling: Force the polling watcher
+        interval: Scan interval of the polling watcher, in seconds
+    """
+
+    def __init__(self, root, index_path, params=None, on_result=None, workers=None, recursive=True,
+                 polling=False, interval=2.0):
+        self.root = os.path.abspath(root)
+        self.index_path = index_path
+        self.params = params
+        self.on_result = on_result
+        self.workers = workers or os.cpu_count() or 1
+        self.recursive = recursive
+        self.polling = polling
+        self.interval = interval
+        self._stop = threading.Event()
+        self._index = None
+        self._pool = None
+        self._pending = {}  # future -> path
+        self._queued_paths = set()
+        self._changed_while_queued = {}  # path -> time the newer version was observed
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        """Block until stop() (or Ctrl+C) processing files as they arrive."""
+        self._index = FileIndex(self.index_path)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='WatchWorker')
+        watcher = make_watcher(self.root, self.recursive, self.polling, self.interval)
+        logger.info("Watching folder", root=self.root, watcher=type(watcher).__name__,
+                    indexed_files=self._index.count())
+        try:
+            self._submit_all(iter_image_files(self.root, self.recursive))
+            while not self._stop.is_set():
+                try:
+                    paths = watcher.poll(0.5)
+                    observed_at = time.time()
+                except RescanNeeded:
+                    logger.warning("Watcher lost events, rescanning", root=self.root)
+                    paths = iter_image_files(self.root, self.recursive)
+                    observed_at = None
+                self._submit_all(paths, observed_at)
+                self._collect(block=False)
+        finally:
+            watcher.close()
+            self._collect(block=True, drain=True)
+            self._pool.shutdown(wait=True)
+            self._index.close()
+
+    def _submit_all(self, paths, observed_at=None):
+        """Submit `paths` observed at `observed_at`; None stamps each path as a scan yields it."""
+        for path in paths:
+            if self._stop.is_set():
+                return
+            self._submit(path, observed_at if observed_at is not None else time.time())
+            # Backpressure: keep the pool a few files ahead, not the whole backlog
+            while len(self._pending) >= self.workers * 4:
+                self._collect(block=True)
+
+    def _submit(self, path, observed_at):
+        if path in self._queued_paths:
+            self._changed_while_queued.setdefault(path, observed_at)
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        indexed = self._index.lookup(path)
+        if indexed is not None and indexed[0] == stat.st_mtime_ns and indexed[1] == stat.st_size:
+            return
+        indexed_sha1 = indexed[2] if indexed is not None else None
+        future = self._pool.submit(_process_file, path, stat.st_mtime_ns, stat.st_size, indexed_sha1, self.params,
+                                   observed_at)
+        self._pending[future] = path
+        self._queued_paths.add(path)
+
+    def _collect(self, block, drain=False):
+        while self._pending:
+            done, _ = wait(list(self._pending), timeout=None if block else 0, return_when=FIRST_COMPLETED)
+            if not done:
+                return
+            for future in done:
+                path = self._pending.pop(future)
+                self._queued_paths.discard(path)
+                try:
+                    self._handle(future.result())
+                except Exception:
+                    logger.exception("Error processing watched file", path=path)
+                if path in self._changed_while_queued:
+                    self._submit(path, self._changed_while_queued.pop(path))
+            self._index.commit()
+            if not drain:
+                return
+
+    def _handle(self, result):
+        if result.skipped:
+            self._index.touch(result.path, result.mtime_ns, result.size)
+            return
+        self._index.record(result.path, result.mtime_ns, result.size, result.sha1, result.car_count,
+                           result.error, result.processed_at,
+                           result.latency * 1000.0 if result.latency is not None else None)
+        if result.error:
+            JOBS.labels(source='watch', outcome='failed').inc()
+            logger.warning("Could not process watched file", path=result.path, error=result.error)
+        else:
+            JOBS.labels(source='watch', outcome='finished').inc()
+            JOB_SECONDS.labels(source='watch').observe(result.process_time)
+            ARRIVAL_LATENCY.observe(result.latency)
+        if self.on_result is not None:
+            self.on_result(result)
+
+
+def write_result_line(stream, result):
+    """Append one WatchResult to a JSON Lines stream."""
+    stream.write(json.dumps(result.as_dict(), ensure_ascii=False) + "\n")
+    stream.flush()
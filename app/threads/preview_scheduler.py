@@ -0,0 +1,169 @@
+from PyQt5.QtCore import QObject, QThread, QTimer, pyqtSignal, pyqtSlot
+import cv2
+
+from app.core.image_processor import process_image_pipeline, convert_opencv_to_qimage, make_thumbnail
+from app.core.stage_cache import StageCache
+from app.core.instrumentation import instrumentation_from_environment
+from app.utils.logger import logger
+from app.utils.tracing import tracer
+
+
+class PreviewWorker(QObject):
+    """
+    Runs the pipeline on a downscaled proxy of the current image.
+    Lives in the scheduler's thread for the whole session, so the proxy and the
+    StageCache of upstream stages survive between slider moves.
+    """
+
+    preview_ready = pyqtSignal(int, list, int, list)  # generation, QImages, count, descriptions
+    preview_failed = pyqtSignal(int, str)  # generation, error message
+    thumbnail_ready = pyqtSignal(int, object)  # generation, QImage thumbnail of the loaded image
+
+    def __init__(self, max_side=800):
+        super().__init__()
+        self.max_side = max_side
+        self._proxy = None
+        self._scale = 1.0
+        self._stage_cache = StageCache()
+
+    @pyqtSlot(str, int)
+    def load_image(self, image_path, generation):
+        """Load `image_path` and build its proxy for subsequent previews."""
+        tracer.name_thread("PreviewThread")
+        self._proxy = None
+        self._stage_cache.clear()
+        with tracer.span('preview_load', 'preview', generation=generation):
+            image = cv2.imread(image_path)
+        if image is None:
+            # run() reports the missing proxy for this generation
+            return
+
+        height, width = image.shape[:2]
+        self._scale = min(1.0, self.max_side / max(height, width))
+        if self._scale < 1.0:
+            proxy_size = (max(1, round(width * self._scale)), max(1, round(height * self._scale)))
+            self._proxy = cv2.resize(image, proxy_size, interpolation=cv2.INTER_AREA)
+        else:
+            self._proxy = image
+        # The proxy is already a reduced level, so the thumbnail costs almost nothing
+        self.thumbnail_ready.emit(generation, convert_opencv_to_qimage(make_thumbnail(self._proxy)))
+
+    @pyqtSlot(object, int)
+    def run(self, params, generation):
+        """Process the proxy with `params` and emit the converted stage images."""
+        if self._proxy is None:
+            self.preview_failed.emit(generation, "No hay imagen para la vista previa")
+            return
+        try:
+            with tracer.span('preview', 'preview', generation=generation):
+                images, count, descriptions = process_image_pipeline(
+                    self._proxy, params,
+                    stage_cache=self._stage_cache,
+                    geometry_scale=self._scale,
+                    instrumentation=instrumentation_from_environment()
+                )
+                with tracer.span('convert_opencv_to_qimage', 'conversion', images=len(images)):
+                    q_images = [convert_opencv_to_qimage(image) for image in images]
+            self.preview_ready.emit(generation, q_images, count, descriptions)
+        except Exception as e:
+            self.preview_failed.emit(generation, f"Error en vista previa: {str(e)}")
+
+
+class LivePreviewScheduler(QObject):
+    """
+    Latest-wins scheduler for live previews driven by parameter sliders.
+
+    Bursts of requests are coalesced: at most one preview runs at a time and
+    only the most recent parameters are kept while it runs. When no request
+    arrives for `idle_ms`, `idle` is emitted with the last parameters so the
+    caller can schedule the full-resolution run.
+    """
+
+    preview_ready = pyqtSignal(list, int, list)  # QImages of the proxy, count, descriptions
+    idle = pyqtSignal(dict)  # parameters of the last request once sliders settle
+    thumbnail_ready = pyqtSignal(object)  # QImage thumbnail of the image given to set_image
+
+    _load_requested = pyqtSignal(str, int)
+    _run_requested = pyqtSignal(object, int)
+
+    def __init__(self, coalesce_ms=15, idle_ms=800, max_side=800, parent=None):
+        super().__init__(parent)
+        self._generation = 0
+        self._pending_params = None
+        self._last_params = None
+        self._in_flight = False
+
+        self._coalesce_timer = QTimer(self)
+        self._coalesce_timer.setSingleShot(True)
+        self._coalesce_timer.setInterval(coalesce_ms)
+        self._coalesce_timer.timeout.connect(self._dispatch)
+
+        self._idle_timer = QTimer(self)
+        self._idle_timer.setSingleShot(True)
+        self._idle_timer.setInterval(idle_ms)
+        self._idle_timer.timeout.connect(self._on_idle)
+
+        self._thread = QThread()
+        self._worker = PreviewWorker(max_side)
+        self._worker.moveToThread(self._thread)
+        self._load_requested.connect(self._worker.load_image)
+        self._run_requested.connect(self._worker.run)
+        self._worker.preview_ready.connect(self._on_preview_ready)
+        self._worker.preview_failed.connect(self._on_preview_failed)
+        self._worker.thumbnail_ready.connect(self._on_thumbnail_ready)
+        self._thread.start()
+
+    def set_image(self, image_path):
+        """Switch previews to a new image, discarding results for the old one."""
+        self._generation += 1
+        self._pending_params = None
+        self._last_params = None
+        self._idle_timer.stop()
+        self._load_requested.emit(image_path, self._generation)
+
+    def request(self, params):
+        """Ask for a preview with `params`; supersedes any request not yet started."""
+        self._pending_params = dict(params)
+        self._last_params = self._pending_params
+        self._idle_timer.start()
+        if not self._in_flight and not self._coalesce_timer.isActive():
+            self._coalesce_timer.start()
+
+    def cancel_idle(self):
+        """Forget the pending idle notification, e.g. after a manual full run."""
+        self._idle_timer.stop()
+
+    def shutdown(self):
+        """Stop timers and the preview thread."""
+        self._coalesce_timer.stop()
+        self._idle_timer.stop()
+        self._thread.quit()
+        self._thread.wait(3000)
+
+    def _dispatch(self):
+        if self._in_flight or self._pending_params is None:
+            return
+        params = self._pending_params
+        self._pending_params = None
+        self._in_flight = True
+        self._run_requested.emit(params, self._generation)
+
+    def _on_preview_ready(self, generation, q_images, count, descriptions):
+        self._in_flight = False
+        if generation == self._generation:
+            self.preview_ready.emit(q_images, count, descriptions)
+        self._dispatch()
+
+    def _on_preview_failed(self, generation, message):
+        self._in_flight = False
+        if generation == self._generation:
+            logger.warning("Preview failed", message=message)
+        self._dispatch()
+
+    def _on_thumbnail_ready(self, generation, thumbnail):
+        if generation == self._generation:
+            self.thumbnail_ready.emit(thumbnail)
+
+    def _on_idle(self):
+        if self._last_params is not None:
+            self.idle.emit(dict(self._last_params))
@@ -0,0 +1,255 @@
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from app.core.cancellation import CancellationToken
+from app.core.instrumentation import JOB_SECONDS, JOBS, QUEUE_DEPTH, WORKER_BUSY_SECONDS, WORKERS_BUSY
+from app.threads.processing_thread import ImageProcessingWorker, ProcessingThread
+from app.utils.logger import logger
+from app.utils.tracing import tracer
+
+PRIORITY_INTERACTIVE = 0  # Requests triggered by the user in the GUI
+PRIORITY_BACKGROUND = 10  # Batch or speculative work
+
+_QUEUE_DEPTH = QUEUE_DEPTH.labels(queue='gui')
+_WORKERS_BUSY = WORKERS_BUSY.labels(pool='gui')
+_WORKER_BUSY_SECONDS = WORKER_BUSY_SECONDS.labels(pool='gui')
+_JOB_SECONDS = JOB_SECONDS.labels(source='gui')
+
+
+def make_job_key(image_path, params):
+    """
+    Build the deduplication key of a job: the image file identity
+    (path, size and modification time) plus the canonical parameter set.
+    """
+    try:
+        file_stat = os.stat(image_path)
+        file_identity = (os.path.abspath(image_path), file_stat.st_size, file_stat.st_mtime_ns)
+    except OSError:
+        file_identity = (os.path.abspath(image_path), None, None)
+    params_identity = json.dumps(params, sort_keys=True) if params else None
+    return file_identity + (params_identity,)
+
+
+class ProcessingJob:
+    """A request to process one image with one parameter set."""
+
+    def __init__(self, job_id, image_path, params, priority, key, record=True):
+        self.job_id = job_id
+        self.image_path = image_path
+        self.params = params
+        self.priority = priority
+        self.key = key
+        self.record = record  # store the result in the results database
+        self.cancel_token = CancellationToken()
+
+
+class ProcessingService(QObject):
+    """
+    Long-lived processing service with a priority job queue.
+
+    Jobs run one at a time on a single ProcessingThread that lives as long as
+    the service. Submitting a job identical to one already queued or running
+    (same image file and parameters) returns the existing job id, so rapid
+    repeat clicks collapse into one run. Every job carries its own
+    CancellationToken. All signals carry the job id and are delivered to the
+    GUI thread through queued connections.
+
+    With `results_db`, every successful run submitted with `record=True` is
+    also stored in a ResultsStore, written from the processing thread.
+    """
+
+    job_started = pyqtSignal(int)
+    job_progress = pyqtSignal(int, int, str)  # job id, percentage, message
+    job_step_completed = pyqtSignal(int, int, str)  # job id, step index, description
+    job_stage_ready = pyqtSignal(int, int, object, object)  # job id, step index, thumbnail, preview QImages
+    # job id, QImages (None where not rendered), count, descriptions, thumbnails, StageSources
+    job_finished = pyqtSignal(int, list, int, list, list, list)
+    job_failed = pyqtSignal(int, str)  # job id, error message (also used for cancellation)
+
+    def __init__(self, parent=None, results_db=None):
+        super().__init__(parent)
+        self._results_db = results_db
+        self._results_store = None  # opened on the processing thread, which owns it
+        self._condition = threading.Condition()
+        self._queue = []  # heap of (priority, sequence, job)
+        self._jobs_by_key = {}  # key -> queued or running job
+        self._running_job = None
+        self._shutting_down = False
+        self._job_ids = itertools.count(1)
+        self._sequence = itertools.count()
+
+        self._thread = ProcessingThread(self)
+        self._thread.start()
+
+    def submit(self, image_path, params=None, priority=PRIORITY_INTERACTIVE, supersede=False, record=True):
+        """
+        Queue a job and return its id.
+
+        Args:
+            image_path: Path of the image to process
+            params: Optional custom parameters (None for automatic mode)
+            priority: Lower values run first; equal priorities run in FIFO order
+            supersede: Cancel every other queued or running job for the same
+                image, e.g. when the user changed parameters mid-run
+            record: Store the result in the results database; False for
+                speculative runs such as the live-preview refresh
+        """
+        key = make_job_key(image_path, params)
+        with self._condition:
+            existing = self._jobs_by_key.get(key)
+            if existing is not None and not existing.cancel_token.is_cancelled():
+                existing.record = existing.record or record
+                return existing.job_id
+
+            if supersede:
+                for job in list(self._jobs_by_key.values()):
+                    if job.key[0] == key[0]:
+                        self._cancel_locked(job)
+
+            job = ProcessingJob(next(self._job_ids), image_path, params, priority, key, record)
+            self._jobs_by_key[key] = job
+            heapq.heappush(self._queue, (priority, next(self._sequence), job))
+            _QUEUE_DEPTH.set(len(self._queue))
+            self._condition.notify()
+            return job.job_id
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job. Unknown or finished ids are ignored."""
+        with self._condition:
+            for job in list(self._jobs_by_key.values()):
+                if job.job_id == job_id:
+                    self._cancel_locked(job)
+
+    def cancel_all(self):
+        """Cancel every queued job and the running one."""
+        with self._condition:
+            for job in list(self._jobs_by_key.values()):
+                self._cancel_locked(job)
+
+    def is_active(self, job_id):
+        """Check whether `job_id` is still queued or running."""
+        with self._condition:
+            if self._running_job is not None and self._running_job.job_id == job_id:
+                return True
+            return any(job.job_id == job_id for job in self._jobs_by_key.values())
+
+    def is_busy(self):
+        """Check whether a job is running or waiting in the queue."""
+        with self._condition:
+            return self._running_job is not None or bool(self._jobs_by_key)
+
+    def pending_count(self):
+        """Number of jobs waiting in the queue (excluding the running one)."""
+        with self._condition:
+            return sum(1 for _, _, job in self._queue if not job.cancel_token.is_cancelled())
+
+    def shutdown(self, timeout_ms=3000):
+        """Cancel outstanding jobs and stop the processing thread."""
+        with self._condition:
+            self._shutting_down = True
+            for job in list(self._jobs_by_key.values()):
+                self._cancel_locked(job)
+            self._condition.notify_all()
+        if not self._thread.wait(timeout_ms):
+            logger.warning("El hilo de procesamiento no terminó correctamente.")
+            return False
+        return True
+
+    def take_next_job(self):
+        """Block until a job is available; returns None once the service shuts down."""
+        with self._condition:
+            while True:
+                if self._shutting_down:
+                    return None
+                while self._queue:
+                    _, _, job = heapq.heappop(self._queue)
+                    _QUEUE_DEPTH.set(len(self._queue))
+                    if job.cancel_token.is_cancelled():
+                        self._forget_locked(job)
+                        JOBS.labels(source='gui', outcome='cancelled').inc()
+                        self.job_failed.emit(job.job_id, "Proceso cancelado antes de iniciar.")
+                        continue
+                    self._running_job = job
+                    return job
+                self._condition.wait()
+
+    def execute_job(self, job):
+        """Run `job` on the calling (processing) thread and forward its signals."""
+        job_id = job.job_id
+        result_callback = (lambda result: self._record_result(job, result)) if self._results_db else None
+        worker = ImageProcessingWorker(job.image_path, job.params, cancel_token=job.cancel_token,
+                                       result_callback=result_callback)
+        worker.progress.connect(lambda percentage, message: self.job_progress.emit(job_id, percentage, message))
+        worker.step_completed.connect(lambda index, description: self.job_step_completed.emit(job_id, index, description))
+        worker.stage_ready.connect(
+            lambda index, thumbnail, preview: self.job_stage_ready.emit(job_id, index, thumbnail, preview)
+        )
+        worker.finished.connect(
+            lambda images, count, descriptions, thumbnails, sources:
+                self._emit_finished(job_id, images, count, descriptions, thumbnails, sources)
+        )
+        worker.error.connect(lambda message: self.job_failed.emit(job_id, message))
+        # Signals between objects of this thread are delivered synchronously
+        completed = []
+        worker.finished.connect(lambda *_: completed.append(True))
+        start = time.perf_counter()
+        _WORKERS_BUSY.inc()
+        try:
+            self.job_started.emit(job_id)
+            with tracer.span('job', 'service', job_id=job_id, priority=job.priority):
+                worker.process()
+        finally:
+            elapsed = time.perf_counter() - start
+            _WORKERS_BUSY.dec()
+            _WORKER_BUSY_SECONDS.inc(elapsed)
+            _JOB_SECONDS.observe(elapsed)
+            if completed:
+                outcome = 'finished'
+            else:
+                outcome = 'cancelled' if job.cancel_token.is_cancelled() else 'failed'
+            JOBS.labels(source='gui', outcome=outcome).inc()
+
+            # The worker has no parent and this thread runs no event loop, so it
+            # is released by Python when it goes out of scope
+            with self._condition:
+                self._running_job = None
+                self._forget_locked(job)
+
+    def _record_result(self, job, result):
+        if not job.record:
+            return
+        if self._results_store is None:
+            from app.services.results_store import ResultsStore
+            try:
+                self._results_store = ResultsStore(self._results_db, batch_size=1)
+            except Exception as e:
+                logger.error("Could not open results database", path=self._results_db, error=e)
+                self._results_db = None
+                return
+        self._results_store.add(job.image_path, result.car_count, result.detections, job.params, source='gui')
+
+    def close_results_store(self):
+        """Flush and close the results database; called by the processing thread as it exits."""
+        if self._results_store is not None:
+            self._results_store.close()
+            self._results_store = None
+
+    def _emit_finished(self, job_id, images, count, descriptions, thumbnails, sources):
+        # Arrow in the timeline from the worker to the GUI slot receiving the result
+        tracer.flow_start('job_finished', job_id)
+        self.job_finished.emit(job_id, images, count, descriptions, thumbnails, sources)
+
+    def _cancel_locked(self, job):
+        job.cancel_token.cancel()
+        # Drop it from the dedup index now so an identical resubmission starts fresh
+        self._forget_locked(job)
+
+    def _forget_locked(self, job):
+        if self._jobs_by_key.get(job.key) is job:
+            del self._jobs_by_key[job.key]
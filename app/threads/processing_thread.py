@@ -2,25 +2,43 @@ from PyQt5.QtCore import QObject, QThread, pyqtSignal
 from PyQt5.QtGui import QImage
 import cv2
 import time
-from app.core.image_processor import process_image_pipeline, convert_opencv_to_qimage
+from app.core.image_processor import iter_pipeline, convert_opencv_to_qimage, make_thumbnail
+from app.core.cancellation import CancellationToken, ProcessingCancelled
+from app.core.stage_sources import ImageSource
+from app.core.instrumentation import instrumentation_from_environment
+from app.utils.logger import logger
+from app.utils.profiling import profile_run
+from app.utils.tracing import tracer
+
+# Bounding box of the stage previews streamed while the pipeline runs; large
+# enough for the main view, small enough to convert in a few milliseconds
+STAGE_PREVIEW_SIZE = (1280, 1280)
 
 class ImageProcessingWorker(QObject):
     # Update signals to include progress and step information
-    finished = pyqtSignal(list, int, list)  # list of QImage, int for count, list of descriptions
+    # QImages (None for stages left to the GUI), count, descriptions, timeline thumbnail QImages, StageSources
+    finished = pyqtSignal(list, int, list, list, list)
     error = pyqtSignal(str)
     progress = pyqtSignal(int, str)  # progress percentage, current step description
     step_completed = pyqtSignal(int, str)  # step index, step description
+    # Emitted as each stage is computed: step index, thumbnail QImage, preview QImage
+    # (both null for visualizations the GUI renders on demand)
+    stage_ready = pyqtSignal(int, object, object)
 
-    def __init__(self, image_path: str, custom_params=None):
+    def __init__(self, image_path: str, custom_params=None, cancel_token=None, result_callback=None):
         super().__init__()
         self.image_path = image_path
         self.custom_params = custom_params
+        # Optional callable(PipelineResult) run on the worker thread after a successful pipeline run
+        self.result_callback = result_callback
         self._is_running = True  # Flag to allow stopping the process
+        # Checked inside the pipeline stages; may be shared with a ProcessingJob
+        self._cancel_token = cancel_token if cancel_token is not None else CancellationToken()
 
     def process(self):
         """Main processing method that runs in the worker thread."""
         try:
-            if not self._is_running:
+            if not self._is_running or self._cancel_token.is_cancelled():
                 self.error.emit("Proceso cancelado antes de iniciar.")
                 return
 
@@ -33,7 +51,8 @@ class ImageProcessingWorker(QObject):
             self.progress.emit(0, f"Cargando imagen en modo {mode_text}...")
             
             # Load image using OpenCV
-            cv_img = cv2.imread(self.image_path)
+            with tracer.span('imread', 'io', path=self.image_path):
+                cv_img = cv2.imread(self.image_path)
             if cv_img is None:
                 self.error.emit(f"No se pudo cargar la imagen: {self.image_path}")
                 return
@@ -44,75 +63,127 @@ class ImageProcessingWorker(QObject):
 
             self.progress.emit(10, f"Iniciando procesamiento en modo {mode_text}...")
             
-            # Import here to avoid circular imports
-            from app.core.image_processor import process_image_pipeline, convert_opencv_to_qimage
+            # Run the pipeline stage by stage; each stage is forwarded to the GUI
+            # as soon as it is computed. Pipeline progress (0-100) is mapped onto
+            # the 10-80 range of the bar.
+            thumbnail_q_images = []
+            try:
+                with tracer.span('process_image_pipeline', 'pipeline'), \
+                        profile_run(self.image_path, self.custom_params):
+                    stages = iter_pipeline(
+                        cv_img, self.custom_params,
+                        cancel_token=self._cancel_token,
+                        progress_callback=self._on_pipeline_progress,
+                        instrumentation=instrumentation_from_environment(),
+                        lazy_visualizations=True
+                    )
+                    try:
+                        while True:
+                            try:
+                                stage = next(stages)
+                            except StopIteration as done:
+                                result = done.value
+                                break
+                            thumbnail_q_images.append(self._forward_stage(stage))
+                    finally:
+                        stages.close()
+            except ProcessingCancelled:
+                self.error.emit("Proceso cancelado durante el procesamiento.")
+                return
+            pipeline_cv_images, car_count, step_descriptions = result.as_tuple()
 
-            # Call the image processing pipeline with custom parameters
-            pipeline_cv_images, car_count, step_descriptions = process_image_pipeline(
-                cv_img, self.custom_params
-            )
+            if self.result_callback is not None:
+                try:
+                    self.result_callback(result)
+                except Exception as e:
+                    logger.error("Error in result callback", image_path=self.image_path, error=e)
             
             if not self._is_running:
                 self.error.emit("Proceso cancelado antes de finalizar.")
                 return
 
             self.progress.emit(80, "Convirtiendo imágenes...")
-            
-            # Convert each OpenCV image to QImage
-            pipeline_q_images = []
-            total_images = len(pipeline_cv_images)
-            
-            for i, img_cv in enumerate(pipeline_cv_images):
-                if not self._is_running:
-                    self.error.emit("Proceso cancelado durante conversión de imágenes.")
-                    return
-                
-                try:
-                    q_image = convert_opencv_to_qimage(img_cv)
-                    pipeline_q_images.append(q_image)
-                except Exception as e:
-                    print(f"Warning: Error converting image {i}: {e}")
-                    # Create a placeholder QImage if conversion fails
-                    from PyQt5.QtGui import QImage
-                    placeholder = QImage(100, 100, QImage.Format_RGB888)
-                    placeholder.fill(0)
-                    pipeline_q_images.append(placeholder)
-                
-                # Emit step completion
-                if i < len(step_descriptions):
-                    self.step_completed.emit(i, step_descriptions[i])
-                
-                # Update progress
-                conversion_progress = 80 + int((i + 1) / total_images * 20)
-                self.progress.emit(conversion_progress, f"Convirtiendo imagen {i+1}/{total_images}")
+
+            # A failed pipeline returns a result unrelated to the stages streamed so far
+            if len(thumbnail_q_images) != len(pipeline_cv_images):
+                thumbnail_q_images = [self._thumbnail(image) for image in pipeline_cv_images]
+
+            # Only the final stage, which is displayed first, is converted in full
+            # resolution; the GUI renders the others from their compact sources on demand
+            stage_sources = result.stage_sources or [ImageSource(image) for image in pipeline_cv_images]
+            pipeline_q_images = [None] * len(pipeline_cv_images)
+            try:
+                with tracer.span('convert_opencv_to_qimage', 'conversion', index=len(pipeline_cv_images) - 1):
+                    pipeline_q_images[-1] = convert_opencv_to_qimage(pipeline_cv_images[-1])
+            except Exception as e:
+                logger.warning("Error converting image", index=len(pipeline_cv_images) - 1, error=e)
+
+            # The full-resolution stage images are not needed past this point
+            result.images = pipeline_cv_images = None
             
             self.progress.emit(100, f"Procesamiento completado en modo {mode_text}")
             
             # Emit the final results
-            self.finished.emit(pipeline_q_images, car_count, step_descriptions)
+            self.finished.emit(pipeline_q_images, car_count, step_descriptions, thumbnail_q_images, stage_sources)
 
         except Exception as e:
             error_msg = f"Error en el procesamiento: {str(e)}"
-            print(f"Processing error details: {e}")  # Debug info
+            logger.exception("Processing error", image_path=self.image_path)
             self.error.emit(error_msg)
         finally:
             self._is_running = False  # Ensure flag is reset
 
+    def _thumbnail(self, image, size=None):
+        """QImage of `image` reduced to the timeline thumbnail (or `size`); null on failure."""
+        if image is None:
+            return QImage()
+        try:
+            reduced = make_thumbnail(image) if size is None else make_thumbnail(image, size)
+            return convert_opencv_to_qimage(reduced)
+        except Exception as e:
+            logger.warning("Error converting image", error=e)
+            return QImage()
+
+    def _forward_stage(self, stage):
+        """Send a freshly computed stage to the GUI; returns its thumbnail."""
+        with tracer.span('forward_stage', 'conversion', index=stage.index):
+            thumbnail = self._thumbnail(stage.image)
+            preview = self._thumbnail(stage.image, STAGE_PREVIEW_SIZE)
+        self.step_completed.emit(stage.index, stage.description)
+        self.stage_ready.emit(stage.index, thumbnail, preview)
+        return thumbnail
+
+    def _on_pipeline_progress(self, percentage, message):
+        """Forward pipeline stage progress to the progress signal."""
+        self.progress.emit(10 + int(percentage * 0.7), message)
+
     def stop(self):
         """Requests the worker to stop processing."""
         self._is_running = False
+        self._cancel_token.cancel()
 
 
 class ProcessingThread(QThread):
     """
-    A simple QThread subclass.
-    In the current implementation, MainWindow uses QThread directly and
-    moves the ImageProcessingWorker to it. This ProcessingThread class
-    is provided to fulfill the requirement but might not be strictly
-    necessary if the direct QThread usage pattern is preferred.
+    Long-lived thread that executes the jobs of a ProcessingService.
+    It blocks on the service's job queue and runs each job in turn, so no
+    thread is created or destroyed per processing request.
     """
-    def __init__(self, parent=None):
+    def __init__(self, service, parent=None):
         super().__init__(parent)
+        self._service = service
+        
+    def run(self):
+        """Take jobs from the service until it shuts down."""
+        tracer.name_thread("ProcessingThread")
+        try:
+            while True:
+                job = self._service.take_next_job()
+                if job is None:
+                    break
+                self._service.execute_job(job)
+        finally:
+            self._service.close_results_store()
         
     def __del__(self):
         """Ensure thread is properly terminated on destruction."""
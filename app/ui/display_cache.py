@@ -0,0 +1,140 @@
+"""
+Display-size scaling of large pixmaps for the main image view.
+
+Rescaling a 20 MP pixmap with SmoothTransformation on every step change and
+every resize event makes window resizing stutter. A DisplayCache keeps, per
+pixmap, a mipmap pyramid built lazily by successive halvings, plus the last
+few scaled results keyed by target size:
+
+    cache = DisplayCache()
+    label.setPixmap(cache.scaled(pixmap, label.size(), smooth=False))  # while resizing
+    label.setPixmap(cache.scaled(pixmap, label.size()))                 # once resizing stops
+
+Scaling starts from the smallest level that is still at least as large as
+the target, so the work is proportional to the display size instead of the
+source size.
+"""
+
+from collections import OrderedDict
+
+from PyQt5.QtCore import QSize, Qt
+
+from app.utils.logger import logger
+
+
+class DisplayPyramid:
+    """
+    Mipmap pyramid of one pixmap: level 0 is the pixmap itself and every
+    further level halves both dimensions. Levels are built on first use.
+
+    Args:
+        pixmap: Full-resolution QPixmap
+        max_scaled: Scaled results kept, keyed by (target size, smooth)
+    """
+
+    # Levels stop once the longer side would drop below this
+    MIN_LEVEL_SIDE = 64
+
+    def __init__(self, pixmap, max_scaled=4):
+        self._levels = [pixmap]
+        self._scaled = OrderedDict()
+        self._max_scaled = max_scaled
+
+    @property
+    def depth(self):
+        """Number of levels built so far."""
+        return len(self._levels)
+
+    def level(self, index):
+        """
+        Level `index` (0 is full resolution), building the missing levels from the
+        previous one; each halving is cheap and the smooth filter averages 2x2
+        blocks. Indices past the smallest level return the smallest level.
+        """
+        while len(self._levels) <= index:
+            last = self._levels[-1]
+            if max(last.width(), last.height()) // 2 < self.MIN_LEVEL_SIDE:
+                break
+            self._levels.append(last.scaled(
+                max(1, last.width() // 2), max(1, last.height() // 2),
+                Qt.IgnoreAspectRatio, Qt.SmoothTransformation
+            ))
+        return self._levels[min(index, len(self._levels) - 1)]
+
+    def level_for(self, target):
+        """Smallest level whose size is not below `target` (a QSize) in either dimension."""
+        index = 0
+        level = self._levels[0]
+        while True:
+            candidate = self.level(index + 1)
+            if candidate is level:
+                return level
+            if candidate.width() < target.width() and candidate.height() < target.height():
+                return level
+            level = candidate
+            index += 1
+
+    def scaled(self, target, smooth=True):
+        """The pixmap scaled to fit `target` keeping its aspect ratio."""
+        key = (target.width(), target.height(), smooth)
+        result = self._scaled.get(key)
+        if result is not None:
+            self._scaled.move_to_end(key)
+            return result
+        source = self.level_for(target)
+        result = source.scaled(target, Qt.KeepAspectRatio,
+                               Qt.SmoothTransformation if smooth else Qt.FastTransformation)
+        self._scaled[key] = result
+        if len(self._scaled) > self._max_scaled:
+            self._scaled.popitem(last=False)
+        return result
+
+
+class DisplayCache:
+    """
+    LRU of DisplayPyramids keyed by QPixmap.cacheKey(), so callers can keep
+    passing plain pixmaps around while repeated scalings are served from
+    the cache.
+
+    Args:
+        max_pixmaps: Pyramids kept (the pipeline has nine stages plus the original)
+    """
+
+    def __init__(self, max_pixmaps=12):
+        self._pyramids = OrderedDict()
+        self._max_pixmaps = max_pixmaps
+
+    def pyramid(self, pixmap):
+        key = pixmap.cacheKey()
+        pyramid = self._pyramids.get(key)
+        if pyramid is None:
+            pyramid = self._pyramids[key] = DisplayPyramid(pixmap)
+            if len(self._pyramids) > self._max_pixmaps:
+                self._pyramids.popitem(last=False)
+        else:
+            self._pyramids.move_to_end(key)
+        return pyramid
+
+    def scaled(self, pixmap, target, smooth=True):
+        """
+        `pixmap` scaled to fit `target` (QSize), from the nearest pyramid level.
+
+        Args:
+            pixmap: Source QPixmap; null pixmaps are returned unchanged
+            target: Size to fit, keeping the aspect ratio
+            smooth: Bilinear filtering; pass False for interactive resizes
+        """
+        if pixmap is None or pixmap.isNull() or target.isEmpty():
+            return pixmap
+        try:
+            return self.pyramid(pixmap).scaled(QSize(target), smooth)
+        except Exception as e:
+            logger.error("Error scaling pixmap for display", error=e)
+            return pixmap.scaled(target, Qt.KeepAspectRatio, Qt.FastTransformation)
+
+    def discard(self, pixmap):
+        """Drop the pyramid of `pixmap`, e.g. when its owner releases it."""
+        self._pyramids.pop(pixmap.cacheKey(), None)
+
+    def clear(self):
+        self._pyramids.clear()
@@ -69,7 +69,7 @@ class AnimatedProgressBar(QProgressBar):
             
         except Exception as e:
             try:
-                logger.error(f"Error animating progress bar: {e}")
+                logger.error("Error animating progress bar", error=e)
             except Exception:
                 print(f"Error animating progress bar: {e}")
             # Fallback to direct value setting
@@ -190,7 +190,7 @@ class CelebrationWidget(QWidget):
             logger.log_ui_action("show_celebration", "CelebrationWidget", car_count=car_count)
             
         except Exception as e:
-            logger.error(f"Error showing celebration: {e}")
+            logger.error("Error showing celebration", error=e)
             # Fallback: simple show without animation
             self.show()
             QTimer.singleShot(3000, self.hide)
@@ -200,7 +200,7 @@ class CelebrationWidget(QWidget):
         try:
             QTimer.singleShot(500, self.hide_celebration)  # Small delay before hiding
         except Exception as e:
-            logger.error(f"Error in animation finished handler: {e}")
+            logger.error("Error in animation finished handler", error=e)
             self.hide()
         
     def hide_celebration(self):
@@ -221,7 +221,7 @@ class CelebrationWidget(QWidget):
             logger.log_ui_action("hide_celebration", "CelebrationWidget")
             
         except Exception as e:
-            logger.error(f"Error hiding celebration: {e}")
+            logger.error("Error hiding celebration", error=e)
             self.hide()
     
     def _complete_hide(self):
@@ -333,7 +333,7 @@ class StepDescriptionWidget(QFrame):
             )
             
         except Exception as e:
-            logger.error(f"Error updating step description: {e}")
+            logger.error("Error updating step description", error=e)
             # Fallback: direct update without animation
             self._update_content_direct(step_index, title, description)
         
@@ -354,7 +354,7 @@ class StepDescriptionWidget(QFrame):
             fade_in.start()
             
         except Exception as e:
-            logger.error(f"Error in content update animation: {e}")
+            logger.error("Error in content update animation", error=e)
             self._update_content_direct(step_index, title, description)
     
     def _update_content_direct(self, step_index: int, title: str, description: str):
@@ -466,13 +466,13 @@ class ErrorFallbackWidget(QLabel):
             
             # Log error display
             try:
-                logger.info(f"Error displayed: {error_type} - {message[:50]}")
+                logger.info("Error displayed", error_type=error_type, message=message[:50])
             except Exception:
                 print(f"Error displayed: {error_type} - {message[:50]}")
             
         except Exception as e:
             try:
-                logger.error(f"Error showing error widget: {e}")
+                logger.error("Error showing error widget", error=e)
             except Exception:
                 print(f"Error showing error widget: {e}")
             # Minimal fallback
@@ -488,7 +488,7 @@ class ErrorFallbackWidget(QLabel):
             self._flash_timer.start(300)  # Flash every 300ms
             
         except Exception as e:
-            logger.error(f"Error starting flash animation: {e}")
+            logger.error("Error starting flash animation", error=e)
         
     def _flash_step(self):
         """Execute one step of the flash animation."""
@@ -502,7 +502,7 @@ class ErrorFallbackWidget(QLabel):
                 self.show()  # Ensure it's visible after flashing
                 
         except Exception as e:
-            logger.error(f"Error in flash step: {e}")
+            logger.error("Error in flash step", error=e)
             if self._flash_timer:
                 self._flash_timer.stop()
             self.show()
@@ -515,7 +515,7 @@ class ErrorFallbackWidget(QLabel):
                 self.error_dismissed.emit(self._current_error_type)
                 
         except Exception as e:
-            logger.error(f"Error in auto-hide: {e}")
+            logger.error("Error in auto-hide", error=e)
             self.hide()
     
     def dismiss_error(self):
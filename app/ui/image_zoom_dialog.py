@@ -1,29 +1,129 @@
+import math
+from collections import OrderedDict
+
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, 
-                             QFrame, QScrollArea, QSplitter, QWidget)
-from PyQt5.QtCore import Qt, QPropertyAnimation, QEasingCurve, QTimer, pyqtProperty
-from PyQt5.QtGui import QPixmap, QPainter, QColor, QFont
+                             QFrame, QSplitter, QWidget, QGraphicsView, QGraphicsScene,
+                             QGraphicsItem, QStyleOptionGraphicsItem)
+from PyQt5.QtCore import Qt, QPropertyAnimation, QEasingCurve, QTimer, QRectF, pyqtProperty
+from PyQt5.QtGui import QPixmap, QPainter, QColor, QFont, QTransform
+from app.ui.display_cache import DisplayPyramid
+from app.utils.logger import logger
+
+# Side of the square tiles cut from each pyramid level, in level pixels
+TILE_SIDE = 256
+# Tiles kept across all levels (256 x 256 x 4 bytes each, about 64 MB in total)
+TILE_CACHE_TILES = 256
+
+
+class TiledPixmapItem(QGraphicsItem):
+    """
+    Scene item drawing a large pixmap from cached tiles.
+
+    Scene coordinates are full-resolution pixels. At each paint the item
+    picks the pyramid level matching the view's level of detail and draws
+    only the tiles of that level that intersect the exposed rectangle, so
+    the cost of a frame depends on the viewport size, not on the image size
+    or zoom. Tiles are kept in an LRU shared by all levels.
+    """
+
+    def __init__(self, pixmap):
+        super().__init__()
+        self._pyramid = DisplayPyramid(pixmap)
+        self._width = pixmap.width()
+        self._height = pixmap.height()
+        self._tiles = OrderedDict()  # (level, column, row) -> QPixmap
+        self._smooth = True
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+
+    def boundingRect(self):
+        return QRectF(0, 0, self._width, self._height)
+
+    def set_smooth(self, smooth):
+        """Bilinear filtering of the tiles; off while zooming or panning."""
+        if smooth != self._smooth:
+            self._smooth = smooth
+            self.update()
+
+    def _tile(self, level_index, level, column, row):
+        key = (level_index, column, row)
+        tile = self._tiles.get(key)
+        if tile is None:
+            tile = level.copy(column * TILE_SIDE, row * TILE_SIDE, TILE_SIDE, TILE_SIDE)
+            self._tiles[key] = tile
+            if len(self._tiles) > TILE_CACHE_TILES:
+                self._tiles.popitem(last=False)
+        else:
+            self._tiles.move_to_end(key)
+        return tile
+
+    def paint(self, painter, option, widget=None):
+        lod = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        # Finest level whose resolution still covers the screen (level k is 2**-k)
+        level_index = max(0, int(math.floor(-math.log2(lod)))) if lod > 0 else 0
+        level = self._pyramid.level(level_index)
+        level_index = min(level_index, self._pyramid.depth - 1)
+        scale_x = self._width / level.width()
+        scale_y = self._height / level.height()
+
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        if exposed.isEmpty():
+            return
+        first_column = max(0, int(exposed.left() / scale_x) // TILE_SIDE)
+        last_column = min((level.width() - 1) // TILE_SIDE, int(exposed.right() / scale_x) // TILE_SIDE)
+        first_row = max(0, int(exposed.top() / scale_y) // TILE_SIDE)
+        last_row = min((level.height() - 1) // TILE_SIDE, int(exposed.bottom() / scale_y) // TILE_SIDE)
+
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, self._smooth)
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                tile = self._tile(level_index, level, column, row)
+                target = QRectF(column * TILE_SIDE * scale_x, row * TILE_SIDE * scale_y,
+                                tile.width() * scale_x, tile.height() * scale_y)
+                painter.drawPixmap(target, tile, QRectF(tile.rect()))
+
 
-class ZoomableImageLabel(QLabel):
-    """Enhanced image label with zoom and pan capabilities."""
+class ZoomableImageView(QGraphicsView):
+    """
+    Image view with animated zoom and drag-to-pan on a tiled scene.
+
+    `scale_factor` is relative to the fit-to-window scale (1.0 shows the
+    whole image). While the wheel turns, an animation runs or the image is
+    dragged, tiles are drawn without filtering; a smooth pass follows once
+    the view has been still for a moment.
+    """
+
+    # Zoom limit in screen pixels per image pixel, whatever the fit scale
+    MAX_PIXEL_ZOOM = 8.0
     
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.setAlignment(Qt.AlignCenter)
         self.setMinimumSize(400, 300)
         self.setStyleSheet("""
-            QLabel {
+            QGraphicsView {
                 background-color: #2c3e50;
                 border: 2px solid #34495e;
                 border-radius: 8px;
             }
         """)
+        self.setScene(QGraphicsScene(self))
+        self.setDragMode(QGraphicsView.ScrollHandDrag)
+        self.setTransformationAnchor(QGraphicsView.AnchorViewCenter)
+        self.setResizeAnchor(QGraphicsView.AnchorViewCenter)
+        self.setViewportUpdateMode(QGraphicsView.SmartViewportUpdate)
+        self.setOptimizationFlag(QGraphicsView.DontSavePainterState)
         
         # Initialize zoom properties
         self._scale_factor = 1.0
         self.max_scale = 5.0
         self.min_scale = 0.1
-        self._original_pixmap = None
+        self._item = None
         self._opacity = 1.0
+
+        # Smooth pass once zooming or panning stops
+        self._refine_timer = QTimer(self)
+        self._refine_timer.setSingleShot(True)
+        self._refine_timer.setInterval(120)
+        self._refine_timer.timeout.connect(self._refine)
         
         # Animation setup
         self._setup_animations()
@@ -34,19 +134,18 @@ class ZoomableImageLabel(QLabel):
             self._scale_animation = QPropertyAnimation(self, b"scale_factor")
             self._scale_animation.setDuration(300)
             self._scale_animation.setEasingCurve(QEasingCurve.OutCubic)
-            self._scale_animation.valueChanged.connect(self._update_display)
             
             self._fade_animation = QPropertyAnimation(self, b"opacity")
             self._fade_animation.setDuration(200)
             self._fade_animation.setEasingCurve(QEasingCurve.InOutCubic)
         except Exception as e:
-            print(f"Warning: Could not setup animations: {e}")
+            logger.warning("Could not setup animations", error=e)
     
     def get_scale_factor(self):
         return self._scale_factor
         
     def set_scale_factor(self, value):
-        self._scale_factor = max(self.min_scale, min(self.max_scale, value))
+        self._scale_factor = max(self.min_scale, min(self._max_relative_scale(), value))
         self._update_display()
         
     scale_factor = pyqtProperty(float, get_scale_factor, set_scale_factor)
@@ -57,7 +156,7 @@ class ZoomableImageLabel(QLabel):
     def set_opacity(self, value):
         self._opacity = value
         self.setStyleSheet(f"""
-            QLabel {{
+            QGraphicsView {{
                 background-color: rgba(44, 62, 80, {int(value * 255)});
                 border: 2px solid rgba(52, 73, 94, {int(value * 255)});
                 border-radius: 8px;
@@ -70,7 +169,10 @@ class ZoomableImageLabel(QLabel):
         """Set the image with fade-in animation."""
         try:
             if pixmap and not pixmap.isNull():
-                self._original_pixmap = pixmap
+                self.scene().clear()
+                self._item = TiledPixmapItem(pixmap)
+                self.scene().addItem(self._item)
+                self.scene().setSceneRect(self._item.boundingRect())
                 self._scale_factor = 1.0
                 self._update_display()
                 
@@ -80,29 +182,51 @@ class ZoomableImageLabel(QLabel):
                     self._fade_animation.setEndValue(1.0)
                     self._fade_animation.start()
         except Exception as e:
-            print(f"Error setting image: {e}")
+            logger.error("Error setting image", error=e)
+
+    def _fit_scale(self):
+        """View scale at which the whole image fits the viewport."""
+        if self._item is None:
+            return 1.0
+        rect = self._item.boundingRect()
+        viewport = self.viewport().rect()
+        if rect.isEmpty() or viewport.isEmpty():
+            return 1.0
+        return min(viewport.width() / rect.width(), viewport.height() / rect.height())
+
+    def _max_relative_scale(self):
+        return max(self.max_scale, self.MAX_PIXEL_ZOOM / self._fit_scale())
             
     def _update_display(self):
-        """Update the displayed image with current scale."""
+        """Apply the current scale as a view transform; no pixels are rescaled here."""
         try:
-            if self._original_pixmap:
-                scaled_size = self._original_pixmap.size() * self._scale_factor
-                scaled_pixmap = self._original_pixmap.scaled(
-                    scaled_size, 
-                    Qt.KeepAspectRatio, 
-                    Qt.SmoothTransformation
-                )
-                self.setPixmap(scaled_pixmap)
+            if self._item is not None:
+                scale = self._fit_scale() * self._scale_factor
+                self._interacting()
+                self.setTransform(QTransform.fromScale(scale, scale))
         except Exception as e:
-            print(f"Error updating display: {e}")
+            logger.error("Error updating display", error=e)
+
+    def _interacting(self):
+        """Draw unfiltered until the view stays still for the refine interval."""
+        if self._item is not None:
+            self._item.set_smooth(False)
+            self._refine_timer.start()
+
+    def _refine(self):
+        if self._item is not None:
+            if self._scale_animation.state() == QPropertyAnimation.Running:
+                self._refine_timer.start()
+                return
+            self._item.set_smooth(True)
     
     def zoom_in(self):
         """Animate zoom in."""
         try:
-            target_scale = min(self._scale_factor * 1.5, self.max_scale)
+            target_scale = min(self._scale_factor * 1.5, self._max_relative_scale())
             self._animate_to_scale(target_scale)
         except Exception as e:
-            print(f"Error zooming in: {e}")
+            logger.error("Error zooming in", error=e)
         
     def zoom_out(self):
         """Animate zoom out."""
@@ -110,14 +234,14 @@ class ZoomableImageLabel(QLabel):
             target_scale = max(self._scale_factor / 1.5, self.min_scale)
             self._animate_to_scale(target_scale)
         except Exception as e:
-            print(f"Error zooming out: {e}")
+            logger.error("Error zooming out", error=e)
         
     def fit_to_window(self):
         """Animate to fit image in window."""
         try:
             self._animate_to_scale(1.0)
         except Exception as e:
-            print(f"Error fitting to window: {e}")
+            logger.error("Error fitting to window", error=e)
         
     def _animate_to_scale(self, target_scale):
         """Animate to target scale factor."""
@@ -130,21 +254,33 @@ class ZoomableImageLabel(QLabel):
                 # Fallback: direct scale setting
                 self.set_scale_factor(target_scale)
         except Exception as e:
-            print(f"Error animating scale: {e}")
+            logger.error("Error animating scale", error=e)
             # Fallback: direct scale setting
             self.set_scale_factor(target_scale)
     
     def wheelEvent(self, event):
-        """Handle mouse wheel for zooming."""
+        """Handle mouse wheel for zooming around the cursor."""
         try:
-            # Get scroll direction
             angle_delta = event.angleDelta().y()
-            if angle_delta > 0:
-                self.zoom_in()
-            else:
-                self.zoom_out()
+            if angle_delta == 0:
+                return
+            # Immediate zoom: animating every wheel notch would lag behind the wheel
+            self._scale_animation.stop()
+            self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+            factor = 1.25 if angle_delta > 0 else 1 / 1.25
+            self.set_scale_factor(self._scale_factor * factor)
+            self.setTransformationAnchor(QGraphicsView.AnchorViewCenter)
         except Exception as e:
-            print(f"Error in wheel event: {e}")
+            logger.error("Error in wheel event", error=e)
+
+    def scrollContentsBy(self, dx, dy):
+        super().scrollContentsBy(dx, dy)
+        self._interacting()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        # Keep the relative zoom; the fit scale depends on the viewport size
+        self._update_display()
 
 class ImageComparisonWidget(QWidget):
     """Widget for comparing two images side by side with synchronized zoom."""
@@ -199,7 +335,7 @@ class ImageComparisonWidget(QWidget):
             "🖼️ Imagen Original", 
             "La imagen tal como se cargó inicialmente"
         )
-        self.original_image = ZoomableImageLabel()
+        self.original_image = ZoomableImageView()
         original_container.layout().addWidget(self.original_image)
         
         # Current step image section
@@ -207,7 +343,7 @@ class ImageComparisonWidget(QWidget):
             "🔄 Paso Actual", 
             "Resultado del procesamiento en el paso seleccionado"
         )
-        self.current_image = ZoomableImageLabel()
+        self.current_image = ZoomableImageView()
         current_container.layout().addWidget(self.current_image)
         
         self.splitter.addWidget(original_container)
@@ -329,7 +465,7 @@ class ImageComparisonWidget(QWidget):
         controls_layout.addStretch()
         
         # Info label
-        info_label = QLabel("💡 Tip: Use la rueda del mouse para zoom")
+        info_label = QLabel("💡 Tip: Use la rueda del mouse para zoom y arrastre para desplazar")
         info_label.setStyleSheet("color: #6c757d; font-style: italic;")
         controls_layout.addWidget(info_label)
         
@@ -387,7 +523,7 @@ class ImageComparisonWidget(QWidget):
                 QTimer.singleShot(150, lambda: self.current_image.set_image(current_pixmap))
                 
         except Exception as e:
-            print(f"Error setting images in comparison widget: {e}")
+            logger.error("Error setting images in comparison widget", error=e)
     
     def _zoom_both_in(self):
         """Zoom both images in."""
@@ -508,7 +644,7 @@ class ImageZoomDialog(QDialog):
             )
             
         except Exception as e:
-            print(f"Error loading images in zoom dialog: {e}")
+            logger.error("Error loading images in zoom dialog", error=e)
     
     def showEvent(self, event):
         """Handle show event with entrance animation."""
@@ -535,7 +671,7 @@ class ImageZoomDialog(QDialog):
             self._opacity_animation.start()
             
         except Exception as e:
-            print(f"Error in show event animation: {e}")
+            logger.error("Error in show event animation", error=e)
             # Fallback: just show normally
             self.setWindowOpacity(1.0)
     
@@ -555,7 +691,7 @@ class ImageZoomDialog(QDialog):
                 super().keyPressEvent(event)
                 
         except Exception as e:
-            print(f"Error in key press event: {e}")
+            logger.error("Error in key press event", error=e)
             super().keyPressEvent(event)
     
     def closeEvent(self, event):
@@ -580,5 +716,5 @@ class ImageZoomDialog(QDialog):
             
             event.ignore() # Tell the event loop to not close the dialog immediately
         except Exception as e:
-            print(f"Error in close event animation: {e}")
+            logger.error("Error in close event animation", error=e)
             event.accept() # Fallback to immediate close without animation
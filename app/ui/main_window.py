@@ -3,14 +3,20 @@ import os
 from PyQt5.QtWidgets import (QMainWindow, QApplication, QLabel, QPushButton, QVBoxLayout, QHBoxLayout, QWidget,
                              QAction, QFileDialog, QMessageBox, QSizePolicy, QProgressBar, QFrame)
 from PyQt5.QtGui import QPixmap, QImage
-from PyQt5.QtCore import Qt, QThread, QPropertyAnimation, QEasingCurve, QTimer, pyqtProperty, pyqtSignal
+from PyQt5.QtCore import Qt, QPropertyAnimation, QEasingCurve, QTimer, pyqtProperty, pyqtSignal
 
-from app.threads.processing_thread import ImageProcessingWorker
+from app.threads.processing_service import ProcessingService
+from app.services.results_store import results_db_from_environment
+from app.threads.preview_scheduler import LivePreviewScheduler
 from app.ui.timeline_widget import TimelineWidget
+from app.ui.display_cache import DisplayCache
+from app.ui.stage_store import StageStore
 from app.ui.enhanced_widgets import (AnimatedProgressBar, CelebrationWidget, 
                                    StepDescriptionWidget, ErrorFallbackWidget)
 from app.ui.parameter_panel import ParameterPanel
 from app.ui.image_zoom_dialog import ImageZoomDialog
+from app.utils.logger import logger
+from app.utils.tracing import tracer, traced
 
 class FadeLabel(QLabel):
     """Label with fade-in animation capability and click detection."""
@@ -68,6 +74,7 @@ class FadeLabel(QLabel):
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
+        tracer.name_thread("GUI")
         self.setWindowTitle("Sistema de Conteo de Coches - Procesamiento Digital de Imágenes")
         self.setGeometry(100, 100, 1600, 1000)  # Increased width for parameter panel
         self.setMinimumSize(1400, 800)
@@ -79,15 +86,35 @@ class MainWindow(QMainWindow):
         self.step_descriptions = []
         self.current_parameters = None  # Store current manual parameters
 
+        # Pyramids and scaled copies of the displayed pixmaps
+        self.display_cache = DisplayCache()
+        # While the window is being resized the image is scaled without
+        # filtering; a smooth pass runs once no resize event arrives for a while
+        self._resize_settle_timer = QTimer(self)
+        self._resize_settle_timer.setSingleShot(True)
+        self._resize_settle_timer.setInterval(150)
+        self._resize_settle_timer.timeout.connect(self._refresh_displayed_image)
+
         # Load and apply stylesheet with fallback
         self.load_stylesheet_with_fallback()
         
         # Setup UI
         self.setup_ui()
         
-        # Threading related attributes
-        self.processing_thread = None
-        self.worker = None
+        # Long-lived processing service; jobs are tracked by id
+        self.processing_service = ProcessingService(parent=self, results_db=results_db_from_environment())
+        self.processing_service.job_finished.connect(self._on_job_finished)
+        self.processing_service.job_failed.connect(self._on_job_failed)
+        self.processing_service.job_progress.connect(self._on_job_progress)
+        self.processing_service.job_step_completed.connect(self._on_job_step_completed)
+        self.processing_service.job_stage_ready.connect(self._on_job_stage_ready)
+        self.current_job_id = None
+        
+        # Live preview on a downscaled proxy while sliders move
+        self.preview_scheduler = LivePreviewScheduler(parent=self)
+        self.preview_scheduler.preview_ready.connect(self.on_preview_ready)
+        self.preview_scheduler.idle.connect(self.on_preview_idle)
+        self.preview_scheduler.thumbnail_ready.connect(self.on_original_thumbnail_ready)
 
     def load_stylesheet_with_fallback(self):
         """Load stylesheet with fallback error handling."""
@@ -96,10 +123,10 @@ class MainWindow(QMainWindow):
             with open(style_path, "r", encoding="utf-8") as f:
                 self.setStyleSheet(f.read())
         except FileNotFoundError:
-            print("Stylesheet not found, using fallback styling.")
+            logger.warning("Stylesheet not found, using fallback styling.")
             self.apply_fallback_styling()
         except Exception as e:
-            print(f"Error loading stylesheet: {e}, using fallback.")
+            logger.error("Error loading stylesheet, using fallback.", error=e)
             self.apply_fallback_styling()
             
     def apply_fallback_styling(self):
@@ -146,6 +173,7 @@ class MainWindow(QMainWindow):
         # Right side: Parameter panel
         self.parameter_panel = ParameterPanel()
         self.parameter_panel.parametersChanged.connect(self.on_parameters_changed)
+        self.parameter_panel.parametersPreviewed.connect(self.on_parameters_previewed)
         main_layout.addWidget(self.parameter_panel, 1)  # 1/4 of the width
         
         # Setup menu
@@ -366,24 +394,27 @@ class MainWindow(QMainWindow):
             self.status_label.setText(f"✅ Imagen cargada: {filename}")
             
             # Set first step in timeline
+            # The step 0 thumbnail arrives from the preview thread (on_original_thumbnail_ready)
             self.timeline.set_step_active(0)
-            self.timeline.set_step_thumbnail(0, pixmap.scaled(120, 80, Qt.KeepAspectRatio))
             self.update_navigation_buttons()
             
             # Reset current parameters for new image
             self.current_parameters = None
             
+            # Build the live preview proxy in the background
+            self.preview_scheduler.set_image(file_path)
+            if self.parameter_panel.is_live_preview_enabled():
+                self.preview_scheduler.request(self.parameter_panel.get_current_parameters())
+            
         except Exception as e:
             self.show_error_animation(f"Error al cargar la imagen: {str(e)}")
 
+    @traced(category='gui')
     def display_image_with_animation(self, pixmap):
         """Display image with fade-in animation."""
         if pixmap and not pixmap.isNull():
-            scaled_pixmap = pixmap.scaled(
-                self.image_label.size(), 
-                Qt.KeepAspectRatio, 
-                Qt.SmoothTransformation
-            )
+            with tracer.span('pixmap_scale', 'gui', width=pixmap.width(), height=pixmap.height()):
+                scaled_pixmap = self.display_cache.scaled(pixmap, self.image_label.size())
             self.image_label.setPixmap(scaled_pixmap)
             self.image_label.fade_in(500)  # 500ms fade-in
             
@@ -401,9 +432,21 @@ class MainWindow(QMainWindow):
         # Reset after animation
         QTimer.singleShot(1000, lambda: self.image_label.setStyleSheet(original_style))
 
+    def _on_stage_first_render(self, step_index, thumbnail):
+        """Fill in the timeline thumbnail of a stage rendered on demand."""
+        if (step_index < self.timeline.get_total_steps() and not thumbnail.isNull()
+                and not self.timeline.has_step_thumbnail(step_index)):
+            self.timeline.set_step_thumbnail(step_index, QPixmap.fromImage(thumbnail))
+
+    def _release_stage_images(self):
+        """Drop the rendered stage pixmaps and the display pyramids built from them."""
+        if isinstance(self.pipeline_step_images, StageStore):
+            self.pipeline_step_images.release()
+
     def reset_pipeline(self):
         """Reset the processing pipeline state."""
         self.current_pipeline_step_index = 0
+        self._release_stage_images()
         self.pipeline_step_images = []
         self.timeline.reset()
         self.prev_button.setEnabled(False)
@@ -414,11 +457,17 @@ class MainWindow(QMainWindow):
         self.image_label.set_clickable(False)
 
     def start_image_processing(self):
-        """Start the image processing pipeline."""
+        """Start the image processing pipeline (explicit run, recorded in the results database)."""
+        self._start_processing(record=True)
+
+    def _start_processing(self, record):
         if not self.image_path:
             QMessageBox.warning(self, "⚠️ Advertencia", "Por favor, cargue una imagen primero.")
             return
 
+        # A manual run supersedes the full run scheduled by live preview
+        self.preview_scheduler.cancel_idle()
+        
         # Update UI for processing state
         self.process_button.setEnabled(False)
         self.cancel_button.setEnabled(True)
@@ -439,28 +488,11 @@ class MainWindow(QMainWindow):
         # Set timeline to first processing step
         self.timeline.set_step_active(1)
 
-        # Clean up previous thread
-        self._cleanup_worker()
-
-        # Start worker thread with current parameters
-        self.worker = ImageProcessingWorker(self.image_path, self.current_parameters)
-        self.processing_thread = QThread()
-        
-        self.worker.moveToThread(self.processing_thread)
-        
-        # Connect signals
-        self.processing_thread.started.connect(self.worker.process)
-        self.worker.finished.connect(self.on_processing_finished)
-        self.worker.error.connect(self.on_processing_error)
-        self.worker.progress.connect(self.on_progress_update)
-        self.worker.step_completed.connect(self.on_step_completed)
-        
-        # Cleanup connections
-        self.worker.finished.connect(self.processing_thread.quit)
-        self.worker.error.connect(self.processing_thread.quit)
-        self.processing_thread.finished.connect(self._cleanup_worker_thread_finished)
-
-        self.processing_thread.start()
+        # Queue the job; an identical queued/running job is reused and any
+        # stale job for this image (older parameters) is cancelled
+        self.current_job_id = self.processing_service.submit(
+            self.image_path, self.current_parameters, supersede=True, record=record
+        )
 
     def on_parameters_changed(self, params):
         """Handle parameter changes from the parameter panel."""
@@ -472,6 +504,38 @@ class MainWindow(QMainWindow):
             mode_indicator = "🔧 MANUAL" if self.parameter_panel.is_manual_mode() else "🤖 AUTO"
             self.status_label.setText(f"{mode_indicator} Parámetros actualizados - Listo para procesar")
 
+    def on_parameters_previewed(self, params):
+        """Queue a proxy preview for the latest slider values."""
+        if self.image_path:
+            self.preview_scheduler.request(params)
+
+    @traced(category='gui')
+    def on_preview_ready(self, preview_q_images, count, descriptions):
+        """Show the proxy result for the step currently on screen."""
+        if not preview_q_images or not self.parameter_panel.is_live_preview_enabled():
+            return
+        step_index = min(self.current_pipeline_step_index, len(preview_q_images) - 1)
+        preview_pixmap = QPixmap.fromImage(preview_q_images[step_index])
+        if not preview_pixmap.isNull():
+            # No fade-in here: previews arrive continuously while dragging
+            self.image_label.setPixmap(preview_pixmap.scaled(
+                self.image_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation
+            ))
+        self.count_label.setText(f"Coches Contados: {count} (vista previa)")
+
+    def on_original_thumbnail_ready(self, thumbnail):
+        """Install the timeline thumbnail of the loaded image, made from the preview proxy."""
+        if not thumbnail.isNull():
+            self.timeline.set_step_thumbnail(0, QPixmap.fromImage(thumbnail))
+
+    def on_preview_idle(self, params):
+        """Sliders settled: run the full-resolution pipeline with the final values."""
+        if not self.image_path or not self.parameter_panel.is_live_preview_enabled():
+            return
+        # Supersedes a run still going with older parameters; not recorded,
+        # slider exploration is not a count the user asked for
+        self._start_processing(record=False)
+
     def load_cached_parameters(self):
         """Load cached parameters on startup."""
         try:
@@ -487,7 +551,7 @@ class MainWindow(QMainWindow):
                 if reply == QMessageBox.Yes:
                     self.parameter_panel.set_parameters(cached_params)
         except Exception as e:
-            print(f"Warning: Could not load cached parameters: {e}")
+            logger.warning("Could not load cached parameters", error=e)
 
     def show_about(self):
         """Show about dialog."""
@@ -498,51 +562,33 @@ class MainWindow(QMainWindow):
                          "© 2024 - Proyecto de Visión por Computadora")
 
     def closeEvent(self, event):
-        thread_running = False
-        try:
-            if self.processing_thread is not None and hasattr(self.processing_thread, 'isRunning'): # Check attribute
-                thread_running = self.processing_thread.isRunning()
-        except RuntimeError: # Catches "wrapped C/C++ object of type QThread has been deleted"
-            thread_running = False
-            self.processing_thread = None # Ensure it's None if deleted
-
-        if thread_running:
+        if self.processing_service.is_busy():
             reply = QMessageBox.question(self, 'Salir',
                                            "El procesamiento está en curso. ¿Está seguro de que desea salir?",
                                            QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
-            if reply == QMessageBox.Yes:
-                if self.worker:
-                    self.worker.stop() # Request worker to stop
-                
-                # Gracefully quit and wait for the thread
-                if self.processing_thread:
-                    self.processing_thread.quit()
-                    if not self.processing_thread.wait(3000): # Wait up to 3 seconds
-                        # If wait times out, thread might be stuck.
-                        # Consider more forceful termination if necessary, but usually not recommended.
-                        print("Advertencia: El hilo de procesamiento no terminó correctamente.")
-                
-                self._cleanup_worker_thread_finished() # Ensure cleanup
-                event.accept()
-            else:
+            if reply != QMessageBox.Yes:
                 event.ignore()
-        else:
-            # Ensure cleanup even if thread was not perceived as running but objects exist
-            self._cleanup_worker_thread_finished()
-            event.accept()
+                return
+
+        # Cancels outstanding jobs and waits up to 3 seconds for the thread
+        self.processing_service.shutdown()
+        self.preview_scheduler.shutdown()
+        event.accept()
 
     def cancel_processing(self):
         """Cancel the current processing operation."""
-        if self.worker:
-            self.worker.stop()
+        if self.current_job_id is not None and self.processing_service.is_active(self.current_job_id):
+            self.processing_service.cancel(self.current_job_id)
             self.status_label.setText("🛑 Cancelando procesamiento...")
             self.cancel_button.setEnabled(False)
 
+    @traced(category='gui')
     def on_progress_update(self, percentage, message):
         """Handle progress updates from worker."""
         self.progress_bar.animate_to_value(percentage)
         self.status_label.setText(f"🔄 {message}")
 
+    @traced(category='gui')
     def on_step_completed(self, step_index, description):
         """Handle step completion updates."""
         step_titles = [
@@ -558,7 +604,8 @@ class MainWindow(QMainWindow):
             if step_index < self.timeline.get_total_steps():
                 self.timeline.set_step_active(step_index)
 
-    def on_processing_finished(self, pipeline_q_images_list, count, descriptions):
+    @traced(category='gui')
+    def on_processing_finished(self, pipeline_q_images_list, count, descriptions, thumbnails=None, stage_sources=None):
         """Handle successful processing completion."""
         try:
             self.progress_bar.setVisible(False)
@@ -568,18 +615,31 @@ class MainWindow(QMainWindow):
                 # Store descriptions
                 self.step_descriptions = descriptions
                 
-                # Convert QImages to QPixmaps and store them
-                self.pipeline_step_images = []
-                for q_img in pipeline_q_images_list:
-                    if q_img and not q_img.isNull():
-                        self.pipeline_step_images.append(QPixmap.fromImage(q_img))
-                    else:
-                        self.pipeline_step_images.append(self.original_pixmap if self.original_pixmap else QPixmap())
-
-                # Update timeline thumbnails for all steps
-                for i, q_pixmap in enumerate(self.pipeline_step_images):
-                    if i < self.timeline.get_total_steps():
-                        self.timeline.set_step_thumbnail(i, q_pixmap.scaled(120, 80, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+                if stage_sources:
+                    # Stages are rendered from their compact sources on demand,
+                    # keeping the rendered pixmaps within the memory budget
+                    self._release_stage_images()
+                    self.pipeline_step_images = StageStore(
+                        stage_sources,
+                        prerendered=dict(enumerate(pipeline_q_images_list)),
+                        on_evict=self.display_cache.discard,
+                        on_first_render=self._on_stage_first_render
+                    )
+                else:
+                    # Convert QImages to QPixmaps and store them
+                    self.pipeline_step_images = []
+                    with tracer.span('pixmap_from_image', 'gui', images=len(pipeline_q_images_list)):
+                        for q_img in pipeline_q_images_list:
+                            if q_img and not q_img.isNull():
+                                self.pipeline_step_images.append(QPixmap.fromImage(q_img))
+                            else:
+                                self.pipeline_step_images.append(self.original_pixmap if self.original_pixmap else QPixmap())
+
+                # Install the thumbnails the worker already downscaled
+                with tracer.span('thumbnail_install', 'gui'):
+                    for i, thumbnail in enumerate(thumbnails or []):
+                        if i < self.timeline.get_total_steps() and not thumbnail.isNull():
+                            self.timeline.set_step_thumbnail(i, QPixmap.fromImage(thumbnail))
                 
                 # Set to the FINAL step (last image in the pipeline)
                 if self.pipeline_step_images:
@@ -684,35 +744,57 @@ class MainWindow(QMainWindow):
         if hasattr(self, 'celebration'):
             self.celebration.resize(self.size())
             
-        # Update image display
+        # Quick unfiltered scale from the nearest pyramid level; the smooth
+        # pass waits until resizing stops
+        self._refresh_displayed_image(smooth=False)
+        self._resize_settle_timer.start()
+
+    def _displayed_pixmap(self):
         if self.pipeline_step_images and 0 <= self.current_pipeline_step_index < len(self.pipeline_step_images):
-            current_pixmap_to_display = self.pipeline_step_images[self.current_pipeline_step_index]
-            if current_pixmap_to_display and not current_pixmap_to_display.isNull():
-                 self.display_image_with_animation(current_pixmap_to_display)
-        elif self.original_pixmap:
-            self.display_image_with_animation(self.original_pixmap)
-
-    def _cleanup_worker(self):
-        """Clean up worker resources. Called after thread signals it's done with the worker."""
-        if self.worker:
-            # Disconnect all signals to prevent issues if not already done by moveToThread(None)
-            try:
-                self.worker.finished.disconnect()
-            except TypeError: pass # Already disconnected or never connected
-            try:
-                self.worker.error.disconnect()
-            except TypeError: pass # Already disconnected or never connected
-            
-            self.worker.deleteLater()
-            self.worker = None
-            
-    def _cleanup_worker_thread_finished(self):
-        """Slot connected to QThread.finished. Cleans up worker and then the thread itself."""
-        self._cleanup_worker() # Clean up the worker first
-        if self.processing_thread:
-            # The thread is already finished, so we just schedule it for deletion
-            self.processing_thread.deleteLater()
-            self.processing_thread = None
+            return self.pipeline_step_images[self.current_pipeline_step_index]
+        return self.original_pixmap
+
+    def _refresh_displayed_image(self, smooth=True):
+        """Rescale the current image to the label size without the fade-in animation."""
+        pixmap = self._displayed_pixmap()
+        if pixmap is None or pixmap.isNull():
+            return
+        with tracer.span('pixmap_rescale', 'gui', smooth=smooth):
+            self.image_label.setPixmap(self.display_cache.scaled(pixmap, self.image_label.size(), smooth))
+
+    def _on_job_progress(self, job_id, percentage, message):
+        if job_id == self.current_job_id:
+            self.on_progress_update(percentage, message)
+
+    def _on_job_step_completed(self, job_id, step_index, description):
+        if job_id == self.current_job_id:
+            self.on_step_completed(step_index, description)
+
+    @traced(category='gui')
+    def _on_job_stage_ready(self, job_id, step_index, thumbnail, preview):
+        """Show each stage as the worker computes it, before the run finishes."""
+        if job_id != self.current_job_id:
+            return
+        if not thumbnail.isNull() and step_index < self.timeline.get_total_steps():
+            self.timeline.set_step_thumbnail(step_index, QPixmap.fromImage(thumbnail))
+        if not preview.isNull():
+            # Previews are display-sized, so a direct smooth scale is cheap
+            self.image_label.setPixmap(QPixmap.fromImage(preview).scaled(
+                self.image_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation
+            ))
+
+    @traced(category='gui')
+    def _on_job_finished(self, job_id, pipeline_q_images_list, count, descriptions, thumbnails, stage_sources):
+        tracer.flow_end('job_finished', job_id)
+        # Results of superseded jobs are dropped
+        if job_id == self.current_job_id:
+            self.current_job_id = None
+            self.on_processing_finished(pipeline_q_images_list, count, descriptions, thumbnails, stage_sources)
+
+    def _on_job_failed(self, job_id, error_message):
+        if job_id == self.current_job_id:
+            self.current_job_id = None
+            self.on_processing_error(error_message)
 
     def previous_step(self):
         """Navigate to previous pipeline step."""
@@ -808,14 +890,14 @@ class MainWindow(QMainWindow):
                 f"Error al abrir vista ampliada: {str(e)}", 
                 "general"
             )
-            print(f"Error opening image zoom: {e}")
+            logger.error("Error opening image zoom", error=e)
 
     def navigate_to_step(self, step_index):
         """Navigate to a specific pipeline step from timeline click."""
         try:
             # Validate step index
             if not (0 <= step_index < len(self.pipeline_step_images)):
-                print(f"Invalid step index: {step_index}")
+                logger.warning("Invalid step index", step_index=step_index)
                 return
             
             # Update current step index
@@ -825,7 +907,7 @@ class MainWindow(QMainWindow):
             self.update_step_display()
             
         except Exception as e:
-            print(f"Error navigating to step {step_index}: {e}")
+            logger.error("Error navigating to step", step_index=step_index, error=e)
             self.error_widget.show_error(
                 f"Error al navegar al paso {step_index + 1}", 
                 "general"
@@ -4,6 +4,7 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QSlider,
 from PyQt5.QtCore import Qt, pyqtSignal
 import json
 import os
+from app.utils.logger import logger
 
 class ParameterSlider(QFrame):
     """Custom slider widget with label and value display."""
@@ -54,6 +55,7 @@ class ParameterPanel(QFrame):
     """Panel for manual parameter adjustment."""
     
     parametersChanged = pyqtSignal(dict)
+    parametersPreviewed = pyqtSignal(dict)  # Emitted on every slider move in live preview mode
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -120,6 +122,15 @@ class ParameterPanel(QFrame):
         self.apply_button.clicked.connect(self.apply_parameters)
         main_layout.addWidget(self.apply_button)
         
+        # Live preview toggle: reprocess a proxy image while sliders move
+        self.live_preview_checkbox = QCheckBox("Vista previa en vivo")
+        self.live_preview_checkbox.setToolTip(
+            "Actualiza una vista previa reducida al mover los controles y procesa "
+            "la imagen completa cuando se detienen"
+        )
+        self.live_preview_checkbox.toggled.connect(self.on_live_preview_toggled)
+        main_layout.addWidget(self.live_preview_checkbox)
+        
         # Set initial state
         self.set_enabled(False)
         
@@ -242,6 +253,7 @@ class ParameterPanel(QFrame):
         self.reset_button.setEnabled(enabled)
         self.save_button.setEnabled(enabled)
         self.apply_button.setEnabled(enabled)
+        self.live_preview_checkbox.setEnabled(enabled)
         
     def on_parameter_changed(self):
         """Handle parameter value changes."""
@@ -250,6 +262,14 @@ class ParameterPanel(QFrame):
             self.apply_button.setEnabled(True)
             self.apply_button.setText("✨ Aplicar Cambios*")
             
+            if self.is_live_preview_enabled():
+                self.parametersPreviewed.emit(self.get_current_parameters())
+            
+    def on_live_preview_toggled(self, enabled):
+        """Start a preview right away when live preview is switched on."""
+        if enabled and self.manual_mode:
+            self.parametersPreviewed.emit(self.get_current_parameters())
+            
     def apply_parameters(self):
         """Apply current parameters."""
         if self.manual_mode:
@@ -258,7 +278,7 @@ class ParameterPanel(QFrame):
                 self.parametersChanged.emit(params)
                 self.apply_button.setText("✨ Aplicar Cambios")
             except Exception as e:
-                print(f"Error applying parameters: {e}")
+                logger.error("Error applying parameters", error=e)
 
     def get_current_parameters(self):
         """Get current parameter values."""
@@ -391,7 +411,7 @@ class ParameterPanel(QFrame):
                 json.dump(params, f, indent=2)
                 
         except Exception as e:
-            print(f"Warning: Could not save to cache: {e}")
+            logger.warning("Could not save to cache", error=e)
             
     def load_from_cache(self):
         """Load parameters from cache file."""
@@ -402,9 +422,13 @@ class ParameterPanel(QFrame):
                     params = json.load(f)
                 return params
         except Exception as e:
-            print(f"Warning: Could not load from cache: {e}")
+            logger.warning("Could not load from cache", error=e)
         return None
         
     def is_manual_mode(self):
         """Check if manual mode is enabled."""
         return self.manual_mode
+        
+    def is_live_preview_enabled(self):
+        """Check if live preview is enabled (only effective in manual mode)."""
+        return self.manual_mode and self.live_preview_checkbox.isChecked()
@@ -0,0 +1,140 @@
+"""
+Memory-bounded store of the pipeline stage pixmaps shown by the main window.
+
+Keeping nine full-resolution QPixmaps per run costs about 9 x 80 MB for a
+20 MP frame. A StageStore instead keeps the compact StageSources of the run
+(see app.core.stage_sources) and holds rendered pixmaps in an LRU limited
+to a memory budget. A stage evicted from the LRU is rendered again from its
+source the next time it is displayed.
+
+The store behaves as a read-only sequence of QPixmaps, so it can stand in
+for a plain list:
+
+    store = StageStore(result.stage_sources, prerendered={8: final_qimage})
+    pixmap = store[8]
+"""
+
+import os
+from collections import OrderedDict
+
+from PyQt5.QtGui import QPixmap
+
+from app.core.image_processor import convert_opencv_to_qimage, make_thumbnail
+from app.core.stage_sources import total_nbytes
+from app.utils.logger import logger
+from app.utils.tracing import tracer
+
+STAGE_MEMORY_ENV = 'CAR_COUNTER_STAGE_MEMORY_MB'
+DEFAULT_STAGE_MEMORY_MB = 384
+
+
+def stage_memory_budget_from_environment(default_mb=DEFAULT_STAGE_MEMORY_MB):
+    """Rendered-pixmap budget in bytes, from CAR_COUNTER_STAGE_MEMORY_MB."""
+    try:
+        megabytes = float(os.environ.get(STAGE_MEMORY_ENV, default_mb))
+    except ValueError:
+        megabytes = default_mb
+    return int(max(0.0, megabytes) * 1024 * 1024)
+
+
+def pixmap_nbytes(pixmap):
+    return pixmap.width() * pixmap.height() * max(1, pixmap.depth()) // 8
+
+
+class StageStore:
+    """
+    Sequence of stage pixmaps rendered on demand within a memory budget.
+
+    Args:
+        sources: One StageSource per stage
+        prerendered: Optional {stage index: QImage} already rendered by the
+            worker, installed in the LRU as the first entries
+        budget_bytes: Maximum memory of the rendered pixmaps; the most recent
+            pixmap is always kept, even when it alone exceeds the budget
+        on_evict: Optional callable(QPixmap) told about every evicted pixmap,
+            e.g. to drop display caches built from it
+        on_first_render: Optional callable(index, thumbnail QImage) called the
+            first time a stage that was not prerendered is rendered, e.g. to
+            fill in timeline thumbnails of stages the pipeline left as recipes
+    """
+
+    def __init__(self, sources, prerendered=None, budget_bytes=None, on_evict=None, on_first_render=None):
+        self._sources = list(sources)
+        self.budget_bytes = stage_memory_budget_from_environment() if budget_bytes is None else budget_bytes
+        self._on_evict = on_evict
+        self._on_first_render = on_first_render
+        self._rendered_once = set(index for index, q_image in (prerendered or {}).items() if q_image is not None)
+        self._pixmaps = OrderedDict()  # stage index -> QPixmap, least recently used first
+        self._used_bytes = 0
+        for index, q_image in (prerendered or {}).items():
+            if q_image is not None and not q_image.isNull():
+                self._insert(index, QPixmap.fromImage(q_image))
+
+    def __len__(self):
+        return len(self._sources)
+
+    def __bool__(self):
+        return bool(self._sources)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self._sources)
+        if not 0 <= index < len(self._sources):
+            raise IndexError(index)
+        pixmap = self._pixmaps.get(index)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(index)
+            return pixmap
+        return self._insert(index, self._render(index))
+
+    def __iter__(self):
+        for index in range(len(self._sources)):
+            yield self[index]
+
+    def is_rendered(self, index):
+        return index in self._pixmaps
+
+    @property
+    def used_bytes(self):
+        """Memory of the rendered pixmaps currently held."""
+        return self._used_bytes
+
+    @property
+    def source_bytes(self):
+        """Memory of the compact sources, which stay for the store's lifetime."""
+        return total_nbytes(self._sources)
+
+    def release(self):
+        """Evict every rendered pixmap; the sources stay and can render them again."""
+        while self._pixmaps:
+            _, evicted = self._pixmaps.popitem(last=False)
+            if self._on_evict is not None:
+                self._on_evict(evicted)
+        self._used_bytes = 0
+
+    def _render(self, index):
+        with tracer.span('stage_render', 'gui', stage=index):
+            try:
+                image = self._sources[index].render()
+                q_image = convert_opencv_to_qimage(image)
+            except Exception as e:
+                logger.error("Error rendering stage", stage=index, error=e)
+                return QPixmap()
+        if index not in self._rendered_once:
+            self._rendered_once.add(index)
+            if self._on_first_render is not None:
+                self._on_first_render(index, convert_opencv_to_qimage(make_thumbnail(image)))
+        return QPixmap.fromImage(q_image)
+
+    def _insert(self, index, pixmap):
+        previous = self._pixmaps.pop(index, None)
+        if previous is not None:
+            self._used_bytes -= pixmap_nbytes(previous)
+        self._pixmaps[index] = pixmap
+        self._used_bytes += pixmap_nbytes(pixmap)
+        while self._used_bytes > self.budget_bytes and len(self._pixmaps) > 1:
+            _, evicted = self._pixmaps.popitem(last=False)
+            self._used_bytes -= pixmap_nbytes(evicted)
+            if self._on_evict is not None:
+                self._on_evict(evicted)
+        return pixmap
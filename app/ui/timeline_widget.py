@@ -114,7 +114,7 @@ class TimelineStep(QLabel):
             )
             
         except Exception as e:
-            logger.error(f"Error setting timeline step state: {e}")
+            logger.error("Error setting timeline step state", error=e)
     
     def set_thumbnail(self, pixmap: QPixmap):
         """
@@ -125,12 +125,16 @@ class TimelineStep(QLabel):
         """
         try:
             if pixmap and not pixmap.isNull():
-                # Scale pixmap to fit the step
-                scaled_pixmap = pixmap.scaled(
-                    80, 50, 
-                    Qt.KeepAspectRatio, 
-                    Qt.SmoothTransformation
-                )
+                # Thumbnails made by the workers already fit; only larger
+                # pixmaps are scaled here, on the GUI thread
+                if pixmap.width() > 80 or pixmap.height() > 50:
+                    scaled_pixmap = pixmap.scaled(
+                        80, 50,
+                        Qt.KeepAspectRatio,
+                        Qt.SmoothTransformation
+                    )
+                else:
+                    scaled_pixmap = pixmap
                 self._thumbnail_pixmap = scaled_pixmap
                 self.setPixmap(scaled_pixmap)
                 self.setText(self.title)  # Show only title when thumbnail is present
@@ -138,11 +142,12 @@ class TimelineStep(QLabel):
                 logger.debug(
                     "Thumbnail set for timeline step",
                     step_index=self.step_index,
-                    pixmap_size=f"{pixmap.width()}x{pixmap.height()}"
+                    pixmap_width=pixmap.width(),
+                    pixmap_height=pixmap.height()
                 )
             
         except Exception as e:
-            logger.error(f"Error setting thumbnail: {e}")
+            logger.error("Error setting thumbnail", error=e)
     
     def _start_glow_animation(self):
         """Start the glow animation for active state."""
@@ -152,7 +157,7 @@ class TimelineStep(QLabel):
             self._glow_animation.start()
             
         except Exception as e:
-            logger.error(f"Error starting glow animation: {e}")
+            logger.error("Error starting glow animation", error=e)
     
     def _stop_glow_animation(self):
         """Stop the glow animation."""
@@ -162,7 +167,7 @@ class TimelineStep(QLabel):
             self.update()
             
         except Exception as e:
-            logger.error(f"Error stopping glow animation: {e}")
+            logger.error("Error stopping glow animation", error=e)
     
     def mousePressEvent(self, event):
         """Handle mouse press with scale animation."""
@@ -184,7 +189,7 @@ class TimelineStep(QLabel):
                 )
                 
         except Exception as e:
-            logger.error(f"Error handling mouse press: {e}")
+            logger.error("Error handling mouse press", error=e)
     
     def mouseReleaseEvent(self, event):
         """Handle mouse release with scale animation."""
@@ -195,7 +200,7 @@ class TimelineStep(QLabel):
             self._scale_animation.start()
             
         except Exception as e:
-            logger.error(f"Error handling mouse release: {e}")
+            logger.error("Error handling mouse release", error=e)
     
     def enterEvent(self, event):
         """Handle mouse enter with subtle scale animation."""
@@ -206,7 +211,7 @@ class TimelineStep(QLabel):
                 self._scale_animation.start()
                 
         except Exception as e:
-            logger.error(f"Error handling mouse enter: {e}")
+            logger.error("Error handling mouse enter", error=e)
     
     def leaveEvent(self, event):
         """Handle mouse leave with scale animation."""
@@ -217,7 +222,7 @@ class TimelineStep(QLabel):
                 self._scale_animation.start()
                 
         except Exception as e:
-            logger.error(f"Error handling mouse leave: {e}")
+            logger.error("Error handling mouse leave", error=e)
     
     def clear_thumbnail(self):
         """Clear the thumbnail and restore text display."""
@@ -227,7 +232,7 @@ class TimelineStep(QLabel):
             self.setText(f"{self.title}\n{self.description}")
             
         except Exception as e:
-            logger.error(f"Error clearing thumbnail: {e}")
+            logger.error("Error clearing thumbnail", error=e)
 
 class TimelineWidget(QFrame):
     """
@@ -295,7 +300,7 @@ class TimelineWidget(QFrame):
                 steps_layout.addWidget(step)
                 
             except Exception as e:
-                logger.error(f"Error creating timeline step {index}: {e}")
+                logger.error("Error creating timeline step", index=index, error=e)
                 # Create a fallback step
                 fallback_step = QLabel(f"Step {index + 1}")
                 steps_layout.addWidget(fallback_step)
@@ -338,10 +343,10 @@ class TimelineWidget(QFrame):
                 
                 self.step_selected.emit(step_index)
             else:
-                logger.warning(f"Invalid step index clicked: {step_index}")
+                logger.warning("Invalid step index clicked", step_index=step_index)
                 
         except Exception as e:
-            logger.error(f"Error handling step click: {e}")
+            logger.error("Error handling step click", error=e)
             
     def set_step_active(self, step_index: int):
         """
@@ -352,7 +357,7 @@ class TimelineWidget(QFrame):
         """
         try:
             if not (0 <= step_index < len(self.steps)):
-                logger.warning(f"Invalid step index for activation: {step_index}")
+                logger.warning("Invalid step index for activation", step_index=step_index)
                 return
             
             old_step = self.current_step
@@ -377,7 +382,7 @@ class TimelineWidget(QFrame):
             )
             
         except Exception as e:
-            logger.error(f"Error setting active step: {e}")
+            logger.error("Error setting active step", error=e)
             
     def set_step_thumbnail(self, step_index: int, pixmap: QPixmap):
         """
@@ -385,7 +390,8 @@ class TimelineWidget(QFrame):
         
         Args:
             step_index: Index of the step
-            pixmap: QPixmap to set as thumbnail
+            pixmap: QPixmap to set as thumbnail, ideally already reduced to
+                THUMBNAIL_SIZE by the worker (see make_thumbnail)
         """
         try:
             if 0 <= step_index < len(self.steps):
@@ -399,13 +405,19 @@ class TimelineWidget(QFrame):
                         has_pixmap=pixmap is not None and not pixmap.isNull()
                     )
                 else:
-                    logger.warning(f"Step {step_index} does not support thumbnails")
+                    logger.warning("Step does not support thumbnails", step_index=step_index)
             else:
-                logger.warning(f"Invalid step index for thumbnail: {step_index}")
+                logger.warning("Invalid step index for thumbnail", step_index=step_index)
                 
         except Exception as e:
-            logger.error(f"Error setting step thumbnail: {e}")
+            logger.error("Error setting step thumbnail", error=e)
             
+    def has_step_thumbnail(self, step_index: int) -> bool:
+        """Check whether a step already shows a thumbnail."""
+        if 0 <= step_index < len(self.steps):
+            return getattr(self.steps[step_index], '_thumbnail_pixmap', None) is not None
+        return False
+
     def get_current_step(self) -> int:
         """Get the current active step index."""
         return self.current_step
@@ -434,7 +446,7 @@ class TimelineWidget(QFrame):
             logger.debug("Timeline reset to initial state")
             
         except Exception as e:
-            logger.error(f"Error resetting timeline: {e}")
+            logger.error("Error resetting timeline", error=e)
     
     def highlight_step_briefly(self, step_index: int, duration: int = 1000):
         """
@@ -457,10 +469,10 @@ class TimelineWidget(QFrame):
                     )
                     step._scale_animation.start()
                     
-                    logger.debug(f"Step {step_index} highlighted briefly")
+                    logger.debug("Step highlighted briefly", step_index=step_index)
                     
         except Exception as e:
-            logger.error(f"Error highlighting step: {e}")
+            logger.error("Error highlighting step", error=e)
     
     def _restore_step_scale(self, step):
         """Restore step to normal scale after highlight."""
@@ -471,4 +483,4 @@ class TimelineWidget(QFrame):
                 step._scale_animation.start()
                 
         except Exception as e:
-            logger.error(f"Error restoring step scale: {e}")
+            logger.error("Error restoring step scale", error=e)
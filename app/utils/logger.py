@@ -1,68 +1,235 @@
+import atexit
+import json
 import logging
+import logging.handlers
 import os
+import queue
 import sys
-from datetime import datetime
-from typing import Optional
+import threading
+from datetime import datetime, timezone
+
+# Environment switches:
+#   CAR_COUNTER_LOG_LEVEL  minimum level logged (DEBUG, INFO, WARNING, ...); default WARNING
+#   CAR_COUNTER_LOG_JSON   path of a JSON Lines file receiving every record ("-" for stdout)
+LOG_LEVEL_ENV = 'CAR_COUNTER_LOG_LEVEL'
+LOG_JSON_ENV = 'CAR_COUNTER_LOG_JSON'
+
+# LogRecord attribute carrying the keyword arguments of a call
+_FIELDS_ATTRIBUTE = 'fields'
+
+
+class TextFormatter(logging.Formatter):
+    """`LEVEL: message | key=value | ...`, formatted on the listener thread."""
+
+    def __init__(self):
+        super().__init__('%(levelname)s: %(message)s')
+
+    def formatMessage(self, record):
+        text = super().formatMessage(record)
+        fields = getattr(record, _FIELDS_ATTRIBUTE, None)
+        if fields:
+            text += " | " + " | ".join(f"{key}={value}" for key, value in fields.items())
+        return text
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record with the structured fields as top-level keys."""
+
+    def format(self, record):
+        document = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'msg': record.getMessage(),
+        }
+        fields = getattr(record, _FIELDS_ATTRIBUTE, None)
+        if fields:
+            for key, value in fields.items():
+                document.setdefault(key, value)
+        if record.exc_info:
+            document['exc'] = self.formatException(record.exc_info)
+        return json.dumps(document, ensure_ascii=False, default=str)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that enqueues the record untouched.
+
+    The stock handler formats the message in the calling thread; here all
+    formatting (message, fields, tracebacks) happens on the listener thread.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """
+    StreamHandler writing to whatever sys.stdout is at emit time.
+
+    Binding the stream at creation breaks when sys.stdout is replaced and
+    closed before exit (pytest's capture, redirect_stdout), as the atexit
+    shutdown then flushes a closed file.
+    """
 
-# Create a simple fallback logger that works in all cases
-class SimpleLogger:
-    """Simple logger implementation that always works."""
-    
     def __init__(self):
-        self.logger = logging.getLogger("CarCounter")
-        if not self.logger.handlers:
-            # Setup simple console handler
-            handler = logging.StreamHandler(sys.stdout)
-            handler.setLevel(logging.WARNING)
-            formatter = logging.Formatter('%(levelname)s: %(message)s')
-            handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
-            self.logger.setLevel(logging.DEBUG)
-    
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+def _parse_level(value, default):
+    if not value:
+        return default
+    value = value.strip().upper()
+    if value.isdigit():
+        return int(value)
+    level = logging.getLevelName(value)
+    return level if isinstance(level, int) else default
+
+
+class StructuredLogger:
+    """
+    Application logger with lazy formatting and non-blocking output.
+
+    Calls below the configured level return after a single integer
+    comparison, before any formatting. Enabled records are put on an
+    unbounded queue and written by a background QueueListener, so logging
+    never blocks the caller on I/O. Keyword arguments are kept as structured
+    fields: appended as `key=value` on the console and emitted as keys of the
+    JSON Lines output.
+
+    Pass constant messages and put variable data in keyword arguments, e.g.
+    `logger.debug("Thumbnail set", step_index=i)`; an f-string message is
+    built by the caller even when the level is disabled.
+    """
+
+    def __init__(self, name="CarCounter", level=None, json_path=None):
+        self._logger = logging.getLogger(name)
+        self._logger.propagate = False
+        self._lock = threading.Lock()
+        self._listener = None
+        self._queue = queue.SimpleQueue()
+
+        self._level = _parse_level(os.environ.get(LOG_LEVEL_ENV), logging.WARNING) if level is None else level
+        json_path = os.environ.get(LOG_JSON_ENV) if json_path is None else json_path
+
+        handlers = []
+        console = _StdoutHandler()
+        console.setFormatter(TextFormatter())
+        handlers.append(console)
+        if json_path:
+            if json_path == '-':
+                json_handler = _StdoutHandler()
+            else:
+                json_handler = logging.FileHandler(json_path, encoding='utf-8')
+            json_handler.setFormatter(JsonLinesFormatter())
+            handlers.append(json_handler)
+            if json_path == '-':
+                handlers.remove(console)
+        self._handlers = handlers
+
+        for handler in list(self._logger.handlers):
+            self._logger.removeHandler(handler)
+        self._logger.addHandler(_DeferredQueueHandler(self._queue))
+        self._logger.setLevel(self._level)
+
+    # Level management -------------------------------------------------
+
+    @property
+    def level(self):
+        return self._level
+
+    def set_level(self, level):
+        """Change the minimum level; accepts an int or a level name."""
+        if isinstance(level, str):
+            level = _parse_level(level, self._level)
+        self._level = level
+        self._logger.setLevel(level)
+
+    def ensure_level(self, level):
+        """Lower the minimum level to `level` if it is currently higher."""
+        if level < self._level:
+            self.set_level(level)
+
+    def is_enabled_for(self, level):
+        """Check whether a record at `level` would be written (cheap)."""
+        return level >= self._level
+
+    # Output -----------------------------------------------------------
+
+    def _start_listener(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = logging.handlers.QueueListener(
+                    self._queue, *self._handlers, respect_handler_level=False
+                )
+                self._listener.start()
+                atexit.register(self.shutdown)
+
+    def shutdown(self):
+        """Flush pending records and stop the background listener."""
+        with self._lock:
+            listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.stop()
+            for handler in self._handlers:
+                stream = getattr(handler, 'stream', None)
+                if stream is not None and not getattr(stream, 'closed', False):
+                    handler.flush()
+
+    def _log(self, level, message, fields, exc_info=False):
+        if level < self._level:
+            return
+        if self._listener is None:
+            self._start_listener()
+        extra = {_FIELDS_ATTRIBUTE: fields} if fields else None
+        self._logger.log(level, message, exc_info=exc_info, extra=extra)
+
     def debug(self, message, **kwargs):
         """Log debug information."""
-        if kwargs:
-            context = " | ".join([f"{k}={v}" for k, v in kwargs.items()])
-            full_message = f"{message} | {context}"
-        else:
-            full_message = message
-        self.logger.debug(full_message)
-    
+        if logging.DEBUG >= self._level:
+            self._log(logging.DEBUG, message, kwargs)
+
     def info(self, message, **kwargs):
         """Log informational messages."""
-        if kwargs:
-            context = " | ".join([f"{k}={v}" for k, v in kwargs.items()])
-            full_message = f"{message} | {context}"
-        else:
-            full_message = message
-        self.logger.info(full_message)
-    
+        if logging.INFO >= self._level:
+            self._log(logging.INFO, message, kwargs)
+
     def warning(self, message, **kwargs):
         """Log warning messages."""
-        if kwargs:
-            context = " | ".join([f"{k}={v}" for k, v in kwargs.items()])
-            full_message = f"{message} | {context}"
-        else:
-            full_message = message
-        self.logger.warning(full_message)
-    
+        self._log(logging.WARNING, message, kwargs)
+
     def error(self, message, **kwargs):
         """Log error messages."""
-        if kwargs:
-            context = " | ".join([f"{k}={v}" for k, v in kwargs.items()])
-            full_message = f"{message} | {context}"
-        else:
-            full_message = message
-        self.logger.error(full_message)
-    
+        self._log(logging.ERROR, message, kwargs)
+
+    def exception(self, message, **kwargs):
+        """Log an error together with the traceback of the exception being handled."""
+        self._log(logging.ERROR, message, kwargs, exc_info=True)
+
     def log_ui_action(self, action, component, **kwargs):
         """Log UI actions."""
-        self.debug(f"UI Action: {action} - Component: {component}", **kwargs)
-    
+        if logging.DEBUG >= self._level:
+            self._log(logging.DEBUG, "UI Action", {'action': action, 'component': component, **kwargs})
+
     def log_processing_step(self, step_name, step_index, success=True, **kwargs):
         """Log processing steps."""
-        status = "SUCCESS" if success else "FAILED"
-        self.info(f"Step [{step_index}] {step_name}: {status}", **kwargs)
+        if logging.INFO >= self._level:
+            status = "SUCCESS" if success else "FAILED"
+            fields = {'step': step_name, 'step_index': step_index, 'status': status, **kwargs}
+            self._log(logging.INFO, "Processing step", fields)
+
+
+# Kept for code that refers to the previous implementation by name
+SimpleLogger = StructuredLogger
 
 # Create global logger instance
-logger = SimpleLogger()
+logger = StructuredLogger()
@@ -0,0 +1,347 @@
+"""
+Process-wide metrics registry with Prometheus text exposition.
+
+Counters, gauges and fixed-bucket histograms, optionally with labels:
+
+    JOBS = metrics.counter('car_counter_jobs_total', 'Processed jobs', ('source', 'outcome'))
+    JOBS.labels(source='gui', outcome='finished').inc()
+
+Every update takes one uncontended per-series lock (about a microsecond),
+so it is cheap enough to call once per pipeline stage. Hot paths keep the
+series returned by `labels()` instead of looking it up on every update.
+
+The registry is exposed by the HTTP service at /metrics and, when
+CAR_COUNTER_METRICS_TEXTFILE names a .prom file, written periodically (and
+at exit) for node_exporter's textfile collector. Per-stage pipeline
+metrics are only collected while an exporter is active (`metrics.enabled`).
+"""
+
+import atexit
+import bisect
+import math
+import os
+import threading
+
+METRICS_TEXTFILE_ENV = 'CAR_COUNTER_METRICS_TEXTFILE'
+METRICS_INTERVAL_ENV = 'CAR_COUNTER_METRICS_INTERVAL'
+
+# Default histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _CounterValue:
+    __slots__ = ('_lock', '_value')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0.0
+
+    def inc(self, amount=1.0):
+        """Add `amount` (must not be negative)."""
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def samples(self, name):
+        yield name, '', self._value
+
+
+class _GaugeValue:
+    __slots__ = ('_lock', '_value')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0.0
+
+    def set(self, value):
+        self._value = float(value)
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1.0):
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def samples(self, name):
+        yield name, '', self._value
+
+
+class _HistogramValue:
+    __slots__ = ('_lock', '_bounds', '_counts', '_sum', '_count')
+
+    def __init__(self, bounds):
+        self._lock = threading.Lock()
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def sum(self):
+        return self._sum
+
+    def cumulative_counts(self):
+        """(upper bound, observations <= bound) pairs, ending with +Inf."""
+        with self._lock:
+            counts = list(self._counts)
+        cumulative = 0
+        result = []
+        for bound, count in zip(self._bounds + (math.inf,), counts):
+            cumulative += count
+            result.append((bound, cumulative))
+        return result
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (None when empty)."""
+        if not self._count:
+            return None
+        rank = q * self._count
+        for bound, cumulative in self.cumulative_counts():
+            if cumulative >= rank:
+                return bound
+        return math.inf
+
+    def as_dict(self):
+        """Summary used by JSON reports: count, sum, mean, p50/p95 and cumulative buckets."""
+        return {
+            'count': self._count,
+            'sum': round(self._sum, 6),
+            'mean': round(self._sum / self._count, 6) if self._count else None,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'buckets': {_format_value(bound): count for bound, count in self.cumulative_counts()},
+        }
+
+    def samples(self, name):
+        for bound, cumulative in self.cumulative_counts():
+            yield name + '_bucket', f'le="{_format_value(float(bound))}"', cumulative
+        yield name + '_sum', '', self._sum
+        yield name + '_count', '', self._count
+
+
+class _Metric:
+    """A metric family: one series per combination of label values."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+        if not self.labelnames:
+            self._unlabeled = self._series[()] = self._new_value()
+
+    def _new_value(self):
+        raise NotImplementedError
+
+    def labels(self, **labels):
+        """Return the series for the given label values, creating it on first use."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(key, self._new_value())
+        return series
+
+    def series(self):
+        """Snapshot of (label values, series) pairs."""
+        with self._lock:
+            return list(self._series.items())
+
+    def expose(self):
+        """Lines of the Prometheus text format for this family."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, series in sorted(self.series()):
+            for sample_name, extra_label, value in series.samples(self.name):
+                labels = _format_labels(self.labelnames, values, extra_label)
+                lines.append(f"{sample_name}{labels} {_format_value(float(value))}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_value(self):
+        return _CounterValue()
+
+    def inc(self, amount=1.0):
+        self._unlabeled.inc(amount)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_value(self):
+        return _GaugeValue()
+
+    def set(self, value):
+        self._unlabeled.set(value)
+
+    def inc(self, amount=1.0):
+        self._unlabeled.inc(amount)
+
+    def dec(self, amount=1.0):
+        self._unlabeled.dec(amount)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(float(bound) for bound in buckets if bound != math.inf))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_value(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._unlabeled.observe(value)
+
+
+class MetricsRegistry:
+    """
+    Named metric families. Asking for an existing name returns the same
+    object, so modules can declare their metrics at import time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self.enabled = False  # set while an exporter consumes the registry
+
+    def enable(self):
+        """Mark the registry as exported so optional per-stage collection turns on."""
+        self.enabled = True
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} already registered with a different type or labels")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        """The whole registry in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """Write the registry for node_exporter's textfile collector (atomic replace)."""
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(temporary_path, path)
+
+
+class TextfileExporter:
+    """Background thread rewriting a .prom file every `interval` seconds and at exit."""
+
+    def __init__(self, registry, path, interval=15.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="MetricsTextfile", daemon=True)
+
+    def start(self):
+        self.registry.enable()
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stop.set()
+        self._write()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._write()
+
+    def _write(self):
+        try:
+            self.registry.write_textfile(self.path)
+        except OSError:
+            from app.utils.logger import logger
+            logger.exception("Could not write metrics textfile", path=self.path)
+
+
+# Process-wide registry
+metrics = MetricsRegistry()
+
+
+def _exporter_from_environment():
+    path = os.environ.get(METRICS_TEXTFILE_ENV, '').strip()
+    if not path:
+        return None
+    try:
+        interval = float(os.environ.get(METRICS_INTERVAL_ENV, '15'))
+    except ValueError:
+        interval = 15.0
+    exporter = TextfileExporter(metrics, os.path.abspath(path), interval)
+    exporter.start()
+    return exporter
+
+
+textfile_exporter = _exporter_from_environment()
@@ -0,0 +1,207 @@
+"""
+On-demand profiling of a single pipeline run.
+
+Set CAR_COUNTER_PROFILE to an output directory (or "1" for ./profiles), or
+run `main.py count IMAGE --profile-output DIR`, and every processed image
+produces:
+
+    <image>-<params hash>-<timestamp>-<pid>-<run>.prof       cProfile data (snakeviz, pstats)
+    <image>-<params hash>-<timestamp>-<pid>-<run>.collapsed  sampled stacks for flamegraph.pl / speedscope
+
+<run> numbers the profiled runs of the process, so runs within the same
+second (a batch, the watcher) never overwrite each other.
+
+The hottest functions are logged when the run finishes.
+"""
+
+import contextlib
+import cProfile
+import hashlib
+import io
+import itertools
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+from app.utils.logger import logger
+
+PROFILE_ENV = 'CAR_COUNTER_PROFILE'
+DEFAULT_PROFILE_DIR = 'profiles'
+
+_run_numbers = itertools.count(1)
+
+
+def parameters_hash(params):
+    """Short stable hash of a parameter set; 'auto' for automatic mode."""
+    if not params:
+        return 'auto'
+    canonical = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:10]
+
+
+def _frame_label(code):
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f"{os.path.basename(code.co_filename)}:{name}"
+
+
+class StackSampler:
+    """
+    Samples the Python stack of one thread at a fixed interval from a
+    background thread and aggregates the samples as collapsed stacks.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="StackSampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            labels.reverse()
+            self.stacks[';'.join(labels)] += 1
+            self.samples += 1
+
+    def write_collapsed(self, path):
+        """Write `stack count` lines, the input format of flamegraph.pl and speedscope."""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top_leaves(self, limit):
+        """Functions most often on top of the stack, as (label, samples)."""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        return leaves.most_common(limit)
+
+
+class ProfileSession:
+    """
+    Profiles the code run inside `with ProfileSession(...)` on the calling thread.
+
+    Args:
+        image_path: Image being processed; its name prefixes the output files
+        params: Parameters of the run; their hash is part of the file names
+        output_dir: Directory for the .prof and .collapsed files
+        top: Number of hot functions logged at the end
+        sample_interval: Seconds between stack samples
+    """
+
+    def __init__(self, image_path, params=None, output_dir=DEFAULT_PROFILE_DIR, top=15, sample_interval=0.005):
+        self.image_path = image_path
+        self.params = params
+        self.output_dir = output_dir
+        self.top = top
+        self.sample_interval = sample_interval
+        self.profile_path = None
+        self.collapsed_path = None
+        self._profiler = None
+        self._sampler = None
+        self._start = None
+
+    def _base_path(self):
+        stem = os.path.splitext(os.path.basename(self.image_path or 'image'))[0].replace(' ', '_')
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        run = f"{os.getpid()}-{next(_run_numbers)}"
+        return os.path.join(self.output_dir, f"{stem}-{parameters_hash(self.params)}-{stamp}-{run}")
+
+    def __enter__(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._sampler = StackSampler(threading.get_ident(), self.sample_interval)
+        self._sampler.start()
+        self._profiler = cProfile.Profile()
+        try:
+            self._profiler.enable()
+        except ValueError:
+            # Another profiler is active on this thread; keep the sampled stacks only
+            self._profiler = None
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        if self._profiler is not None:
+            self._profiler.disable()
+        self._sampler.stop()
+        try:
+            self._write(elapsed)
+        except OSError as e:
+            logger.error("Could not write profile", output_dir=self.output_dir, error=e)
+        return False
+
+    def _write(self, elapsed):
+        base_path = self._base_path()
+        self.collapsed_path = base_path + '.collapsed'
+        self._sampler.write_collapsed(self.collapsed_path)
+        if self._profiler is not None:
+            self.profile_path = base_path + '.prof'
+            self._profiler.dump_stats(self.profile_path)
+
+        logger.info(
+            "Profile written", image=os.path.basename(self.image_path or ''), wall_s=round(elapsed, 3),
+            profile=self.profile_path, collapsed=self.collapsed_path, samples=self._sampler.samples
+        )
+        logger.info("Hot functions:\n" + self.format_hot_functions())
+
+    def format_hot_functions(self):
+        """Table of the hottest functions by own time (cProfile) or by samples."""
+        if self._profiler is not None:
+            stream = io.StringIO()
+            stats = pstats.Stats(self._profiler, stream=stream)
+            stats.sort_stats(pstats.SortKey.TIME).print_stats(self.top)
+            lines = stream.getvalue().splitlines()
+            # Keep the table, drop pstats' preamble
+            for index, line in enumerate(lines):
+                if line.lstrip().startswith('ncalls'):
+                    return "\n".join(lines[index:]).rstrip()
+            return stream.getvalue().rstrip()
+        total = max(1, self._sampler.samples)
+        return "\n".join(
+            f"{count * 100.0 / total:6.1f}%  {label}" for label, count in self._sampler.top_leaves(self.top)
+        )
+
+
+def profile_directory_from_environment():
+    """Output directory requested through CAR_COUNTER_PROFILE, or None when disabled."""
+    value = os.environ.get(PROFILE_ENV, '').strip()
+    if value.lower() in ('', '0', 'false', 'no', 'off'):
+        return None
+    return DEFAULT_PROFILE_DIR if value.lower() in ('1', 'true', 'yes', 'on') else value
+
+
+def profile_run(image_path, params=None, output_dir=None):
+    """
+    Context manager profiling one run when profiling is requested.
+
+    `output_dir` overrides CAR_COUNTER_PROFILE; with neither set this
+    returns a no-op context manager.
+    """
+    output_dir = output_dir or profile_directory_from_environment()
+    if not output_dir:
+        return contextlib.nullcontext()
+    logger.ensure_level(logging.INFO)
+    return ProfileSession(image_path, params, output_dir)
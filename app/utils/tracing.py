@@ -0,0 +1,242 @@
+"""
+Opt-in timeline tracer writing Chrome trace-event JSON (viewable in Perfetto
+or chrome://tracing).
+
+Enable it by pointing CAR_COUNTER_TRACE at the output file:
+
+    CAR_COUNTER_TRACE=trace.json python main.py
+
+Spans from every thread are collected in memory and written when the process
+exits. Child processes inherit the setting and write `<name>.<pid>.json`
+next to it; merge_trace_files combines them into one timeline. Timestamps
+come from time.perf_counter_ns, a system-wide monotonic clock, so spans of
+different processes line up.
+
+When tracing is disabled, `tracer.span()` returns a shared no-op context
+manager and `traced` functions cost one attribute check.
+"""
+
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+TRACE_ENV = 'CAR_COUNTER_TRACE'
+_ROOT_PID_ENV = 'CAR_COUNTER_TRACE_ROOT_PID'
+
+# Events kept in memory at most; later events are counted and dropped
+MAX_EVENTS = 2_000_000
+
+
+class _NullSpan:
+    """Shared no-op span returned while tracing is disabled."""
+
+    __slots__ = ()
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """Context manager recording one complete ("X") event."""
+
+    __slots__ = ('_tracer', '_name', '_category', '_args', '_start')
+
+    def __init__(self, tracer, name, category, args):
+        self._tracer = tracer
+        self._name = name
+        self._category = category
+        self._args = args
+
+    def set(self, **args):
+        """Attach extra arguments, e.g. a result known only at the end of the span."""
+        self._args.update(args)
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self._args['error'] = exc_type.__name__
+        self._tracer.complete(self._name, self._start, end - self._start, self._category, **self._args)
+        return False
+
+
+class Tracer:
+    """
+    Collects trace events in memory.
+
+    Args:
+        path: Output file; None leaves the tracer disabled
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.enabled = bool(path)
+        self.dropped = 0
+        self._events = []
+        self._lock = threading.Lock()
+        self._named_threads = {}  # native thread id -> name written to the trace
+        self._pid = os.getpid()
+
+    def _thread_id(self):
+        tid = threading.get_native_id()
+        if tid not in self._named_threads:
+            self._set_thread_name(tid, threading.current_thread().name)
+        return tid
+
+    def _set_thread_name(self, tid, name):
+        self._named_threads[tid] = name
+        self._append({'name': 'thread_name', 'ph': 'M', 'pid': self._pid, 'tid': tid, 'args': {'name': name}})
+
+    def _append(self, event):
+        if len(self._events) >= MAX_EVENTS:
+            self.dropped += 1
+            return
+        self._events.append(event)  # list.append is atomic under the GIL
+
+    def name_thread(self, name):
+        """Label the calling thread in the timeline (QThreads otherwise show as Dummy-N)."""
+        if not self.enabled:
+            return
+        tid = threading.get_native_id()
+        if self._named_threads.get(tid) != name:
+            self._set_thread_name(tid, name)
+
+    def span(self, name, category='app', **args):
+        """Return a context manager that records `name` as a span of the calling thread."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, category, args)
+
+    def complete(self, name, start_ns, duration_ns, category='app', **args):
+        """Record a span that started at `start_ns` (perf_counter_ns) and lasted `duration_ns`."""
+        if not self.enabled:
+            return
+        event = {
+            'name': name, 'cat': category, 'ph': 'X', 'pid': self._pid, 'tid': self._thread_id(),
+            'ts': start_ns / 1000.0, 'dur': duration_ns / 1000.0,
+        }
+        if args:
+            event['args'] = args
+        self._append(event)
+
+    def instant(self, name, category='app', **args):
+        """Record a point in time on the calling thread."""
+        if not self.enabled:
+            return
+        event = {
+            'name': name, 'cat': category, 'ph': 'i', 's': 't', 'pid': self._pid,
+            'tid': self._thread_id(), 'ts': time.perf_counter_ns() / 1000.0,
+        }
+        if args:
+            event['args'] = args
+        self._append(event)
+
+    def counter(self, name, **values):
+        """Record the current value of one or more counters (drawn as a track)."""
+        if not self.enabled:
+            return
+        self._append({
+            'name': name, 'ph': 'C', 'pid': self._pid, 'tid': self._thread_id(),
+            'ts': time.perf_counter_ns() / 1000.0, 'args': values,
+        })
+
+    def flow_start(self, name, flow_id, category='flow'):
+        """Start an arrow from the calling thread's enclosing span, e.g. at a signal emit."""
+        self._flow('s', name, flow_id, category)
+
+    def flow_end(self, name, flow_id, category='flow'):
+        """End the arrow started with the same id at the enclosing span of the receiver."""
+        self._flow('f', name, flow_id, category)
+
+    def _flow(self, phase, name, flow_id, category):
+        if not self.enabled:
+            return
+        event = {
+            'name': name, 'cat': category, 'ph': phase, 'id': flow_id, 'pid': self._pid,
+            'tid': self._thread_id(), 'ts': time.perf_counter_ns() / 1000.0,
+        }
+        if phase == 'f':
+            event['bp'] = 'e'
+        self._append(event)
+
+    def events(self):
+        """Return a snapshot of the recorded events."""
+        with self._lock:
+            return list(self._events)
+
+    def output_path(self):
+        """The file this process writes: the configured path, or a per-pid variant in child processes."""
+        root_pid = os.environ.get(_ROOT_PID_ENV)
+        if root_pid is None or root_pid == str(self._pid):
+            return self.path
+        stem, extension = os.path.splitext(self.path)
+        return f"{stem}.{self._pid}{extension or '.json'}"
+
+    def save(self, path=None):
+        """Write the events as Chrome trace-event JSON; returns the path written."""
+        path = path or self.output_path()
+        if not path:
+            return None
+        document = {
+            'traceEvents': self.events(),
+            'displayTimeUnit': 'ms',
+            'otherData': {'pid': self._pid, 'dropped_events': self.dropped},
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(document, f)
+        return path
+
+
+def merge_trace_files(output_path, input_paths):
+    """Combine several trace files (e.g. one per process) into one timeline."""
+    events = []
+    for path in input_paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            events.extend(json.load(f).get('traceEvents', []))
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    return output_path
+
+
+def traced(name=None, category='app'):
+    """Decorator recording every call of the function as a span."""
+    def decorator(function):
+        span_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return function(*args, **kwargs)
+            with tracer.span(span_name, category):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _tracer_from_environment():
+    path = os.environ.get(TRACE_ENV, '').strip()
+    if not path:
+        return Tracer()
+    os.environ.setdefault(_ROOT_PID_ENV, str(os.getpid()))
+    instance = Tracer(os.path.abspath(path))
+    atexit.register(instance.save)
+    return instance
+
+
+# Process-wide tracer, enabled by CAR_COUNTER_TRACE
+tracer = _tracer_from_environment()
@@ -0,0 +1,176 @@
+"""
+Ingestion benchmark: serial walk + cv2.imread against the asyncio
+IngestionPipeline, on a cold and on a warm page cache.
+
+Usage:
+    python -m benchmarks.bench_ingestion
+    python -m benchmarks.bench_ingestion --files 2000 --count
+    python -m benchmarks.bench_ingestion --dataset /data/camaras --repeat 1
+
+Without --dataset, the sample images of img/ are copied `--files` times into
+a temporary tree of subdirectories. "Cold" rounds evict every file from the
+page cache first with posix_fadvise(DONTNEED), which needs no privileges but
+only drops clean pages (the generated tree is fsync'ed for that reason);
+"warm" rounds read everything once before timing. With --count each image is
+also run through the pipeline: serially in the baseline, on a worker pool
+fed by the ingestion pipeline otherwise.
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import cv2
+
+from app.core.image_processor import run_pipeline
+from app.services.ingestion import IngestionPipeline, count_images, iter_image_files
+from benchmarks.bench_pipeline import load_parameters
+from benchmarks.common import REPO_ROOT, add_baseline_arguments, finish, machine_metadata, summarize
+
+FILES_PER_DIRECTORY = 100
+
+
+def build_dataset(samples_dir, file_count, target_dir):
+    """Copy the sample images into `target_dir` until it holds `file_count` files."""
+    sources = [path for path in iter_image_files(samples_dir, recursive=False)]
+    if not sources:
+        raise SystemExit(f"No images found in {samples_dir}")
+    for index in range(file_count):
+        source = sources[index % len(sources)]
+        directory = os.path.join(target_dir, f"{index // FILES_PER_DIRECTORY:04d}")
+        os.makedirs(directory, exist_ok=True)
+        target = os.path.join(directory, f"{index:07d}{os.path.splitext(source)[1].lower()}")
+        shutil.copyfile(source, target)
+        with open(target, 'rb') as f:
+            os.fsync(f.fileno())
+
+
+def evict_from_page_cache(paths):
+    """Drop the cached pages of `paths`; returns False where posix_fadvise is unavailable."""
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    return True
+
+
+def warm_page_cache(paths):
+    for path in paths:
+        with open(path, 'rb') as f:
+            while f.read(1 << 20):
+                pass
+
+
+def run_serial(root, params, count):
+    images = 0
+    for directory, _, names in os.walk(root):
+        for name in sorted(names):
+            image = cv2.imread(os.path.join(directory, name))
+            if image is None:
+                continue
+            if count:
+                run_pipeline(image, params)
+            images += 1
+    return images
+
+
+def run_async(root, params, count, io_concurrency, workers):
+    async def consume():
+        pipeline = IngestionPipeline(root, io_concurrency=io_concurrency)
+        images = 0
+        if count:
+            async for result in count_images(pipeline, params, workers):
+                images += result.error is None
+        else:
+            async for ingested in pipeline.images():
+                images += ingested.image is not None
+        return images
+    return asyncio.run(consume())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark directory ingestion")
+    parser.add_argument('--dataset', help='Existing image tree (default: a generated copy of img/)')
+    parser.add_argument('--samples', default=os.path.join(REPO_ROOT, 'img'),
+                        help='Images copied into the generated tree (default: img/)')
+    parser.add_argument('--files', type=int, default=500, help='Files in the generated tree')
+    parser.add_argument('--count', action='store_true', help='Also run the counting pipeline on every image')
+    parser.add_argument('--config', default=os.path.join(REPO_ROOT, 'config.json'),
+                        help="Parameter file used with --count ('' for automatic mode)")
+    parser.add_argument('--io', type=int, default=16, help='Concurrent reads of the ingestion pipeline')
+    parser.add_argument('--workers', type=int, help='Counting threads with --count (default: CPU count)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed rounds per case')
+    add_baseline_arguments(parser)
+    parser.set_defaults(baseline=os.path.join(REPO_ROOT, 'benchmarks', 'baseline-ingestion.json'))
+    args = parser.parse_args(argv)
+
+    temporary_dir = None
+    root = args.dataset
+    if root is None:
+        temporary_dir = tempfile.mkdtemp(prefix='car-counter-ingestion-')
+        root = temporary_dir
+        print(f"Copying {args.files} files into {root} ...")
+        build_dataset(args.samples, args.files, root)
+
+    try:
+        paths = list(iter_image_files(root))
+        total_bytes = sum(os.path.getsize(path) for path in paths)
+        params = load_parameters(args.config) if args.count else None
+        results = {
+            'suite': 'ingestion',
+            'metadata': machine_metadata(),
+            'config': {
+                'files': len(paths), 'bytes': total_bytes, 'count': args.count, 'io_concurrency': args.io,
+                'workers': args.workers or os.cpu_count(), 'repeat': args.repeat, 'params': params,
+            },
+            'cases': {},
+            'benchmarks': {},
+        }
+        runners = {
+            'serial': lambda: run_serial(root, params, args.count),
+            'async': lambda: run_async(root, params, args.count, args.io, args.workers),
+        }
+
+        for cache in ('cold', 'warm'):
+            for name, runner in runners.items():
+                samples = []
+                for _ in range(args.repeat):
+                    if cache == 'cold':
+                        if not evict_from_page_cache(paths):
+                            print("posix_fadvise unavailable; skipping cold cases")
+                            break
+                    else:
+                        warm_page_cache(paths)
+                    start = time.perf_counter()
+                    images = runner()
+                    samples.append(time.perf_counter() - start)
+                if not samples:
+                    continue
+                case = f"{cache}/{name}"
+                summary = summarize(samples)
+                results['benchmarks'][case] = summary
+                results['cases'][case] = {
+                    'images': images,
+                    'images_per_second': round(images / summary['median'], 2),
+                    'megabytes_per_second': round(total_bytes / 1e6 / summary['median'], 2),
+                }
+                print(f"{case}: median {summary['median']:.2f}s, "
+                      f"{results['cases'][case]['images_per_second']} images/s, "
+                      f"{results['cases'][case]['megabytes_per_second']} MB/s")
+    finally:
+        if temporary_dir is not None:
+            shutil.rmtree(temporary_dir, ignore_errors=True)
+
+    return finish(results, args, 'ingestion')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
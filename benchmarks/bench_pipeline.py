@@ -0,0 +1,163 @@
+"""
+Pipeline benchmark: per-stage and end-to-end timings on the bundled sample
+images, on synthetic upscales of one of them and on generated traffic scenes
+with a known number of cars.
+
+Usage:
+    python -m benchmarks.bench_pipeline
+    python -m benchmarks.bench_pipeline --sizes 1,4 --repeat 3 --save-baseline
+    python -m benchmarks.bench_pipeline --threshold 0.15
+    python -m benchmarks.bench_pipeline --sizes '' --objects 10,100,1000 --repeat 1
+
+Every case runs `run_pipeline` with PipelineInstrumentation; the end-to-end
+time and each stage's wall time are summarized over `--repeat` rounds after
+`--warmup` untimed rounds. Results are written as JSON together with machine
+metadata and, when a baseline exists, compared against it; the exit status
+is 1 when any median regressed by more than `--threshold`.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+
+from app.core.image_processor import run_pipeline
+from app.core.instrumentation import PipelineInstrumentation
+from app.core.synthetic_scene import SceneSettings, generate_scene, size_for_car_count
+from benchmarks.common import REPO_ROOT, add_baseline_arguments, finish, machine_metadata, summarize
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+# Generated scenes use the generator's default cars, which the default
+# parameters count, and run in automatic mode: the --config parameters are
+# tuned for the sample photos and their max_aspect rejects horizontal cars
+SCENE_SETTINGS = SceneSettings(orientation=(-20.0, 20.0))
+SCENE_PARAMS = None
+
+
+def load_samples(samples_dir):
+    """Return [(name, image)] for the image files directly inside `samples_dir`."""
+    samples = []
+    for entry in sorted(os.scandir(samples_dir), key=lambda e: e.name):
+        if not entry.is_file() or not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        image = cv2.imread(entry.path)
+        if image is not None:
+            samples.append((os.path.splitext(entry.name)[0], image))
+    return samples
+
+
+def upscale_to_megapixels(image, megapixels):
+    """Resize `image` to roughly `megapixels` million pixels, keeping its aspect ratio."""
+    height, width = image.shape[:2]
+    scale = (megapixels * 1e6 / (height * width)) ** 0.5
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    interpolation = cv2.INTER_CUBIC if scale > 1.0 else cv2.INTER_AREA
+    return cv2.resize(image, size, interpolation=interpolation)
+
+
+def load_parameters(config_path):
+    """Read the 'parameters' section of a configuration file, or None for auto mode."""
+    if not config_path:
+        return None
+    with open(config_path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('parameters')
+
+
+def bench_case(image, params, repeat, warmup):
+    """Time one image; returns (end-to-end samples, {stage: samples}, car count)."""
+    for _ in range(warmup):
+        run_pipeline(image, params)
+
+    total_samples = []
+    stage_samples = {}
+    car_count = None
+    for _ in range(repeat):
+        instrumentation = PipelineInstrumentation()
+        start = time.perf_counter()
+        result = run_pipeline(image, params, instrumentation=instrumentation)
+        total_samples.append(time.perf_counter() - start)
+        car_count = result.car_count
+        for record in instrumentation.records:
+            stage_samples.setdefault(record.name, []).append(record.wall_time)
+    return total_samples, stage_samples, car_count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the car counting pipeline")
+    parser.add_argument('--samples', default=os.path.join(REPO_ROOT, 'img'),
+                        help='Directory with the sample images (default: img/)')
+    parser.add_argument('--sizes', default='1,4,12,50',
+                        help='Comma-separated synthetic upscale sizes in megapixels; empty to skip')
+    parser.add_argument('--objects', default='',
+                        help='Comma-separated car counts of generated scenes, e.g. 10,100,1000')
+    parser.add_argument('--source', help='Sample name used for the upscales (default: the first sample)')
+    parser.add_argument('--config', default=os.path.join(REPO_ROOT, 'config.json'),
+                        help="Parameter file ('' for automatic mode)")
+    parser.add_argument('--repeat', type=int, default=5, help='Timed rounds per case')
+    parser.add_argument('--warmup', type=int, default=1, help='Untimed rounds per case')
+    parser.add_argument('--skip-samples', action='store_true', help='Only run the synthetic cases')
+    add_baseline_arguments(parser)
+    args = parser.parse_args(argv)
+
+    samples = load_samples(args.samples)
+    if not samples:
+        parser.error(f"No images found in {args.samples}")
+    params = load_parameters(args.config)
+    sizes = [float(size) for size in args.sizes.split(',') if size.strip()]
+
+    cases = []
+    if not args.skip_samples:
+        cases.extend((f"sample/{name}", image) for name, image in samples)
+    source_name, source_image = samples[0]
+    if args.source:
+        matches = [sample for sample in samples if sample[0] == args.source]
+        if not matches:
+            parser.error(f"Unknown sample: {args.source}")
+        source_name, source_image = matches[0]
+    for megapixels in sizes:
+        cases.append((f"synthetic/{megapixels:g}MP", upscale_to_megapixels(source_image, megapixels)))
+    expected_counts = {}
+    for car_count in (int(count) for count in args.objects.split(',') if count.strip()):
+        width, height = size_for_car_count(car_count, SCENE_SETTINGS)
+        scene = generate_scene(width, height, car_count, seed=car_count, settings=SCENE_SETTINGS)
+        cases.append((f"scene/{car_count}cars", scene.image))
+        expected_counts[f"scene/{car_count}cars"] = scene.car_count
+
+    results = {
+        'suite': 'pipeline',
+        'metadata': machine_metadata(),
+        'config': {
+            'repeat': args.repeat,
+            'warmup': args.warmup,
+            'params': params,
+            'scene_params': SCENE_PARAMS,
+            'scene_settings': SCENE_SETTINGS.as_dict(),
+            'synthetic_source': source_name,
+        },
+        'cases': {},
+        'benchmarks': {},
+    }
+
+    for case_name, image in cases:
+        height, width = image.shape[:2]
+        print(f"{case_name} ({width}x{height}) ...", end=' ', flush=True)
+        case_params = SCENE_PARAMS if case_name in expected_counts else params
+        total_samples, stage_samples, car_count = bench_case(image, case_params, args.repeat, args.warmup)
+        total = summarize(total_samples)
+        print(f"median {total['median'] * 1000:.1f}ms, {car_count} cars")
+
+        results['cases'][case_name] = {'width': width, 'height': height, 'car_count': car_count}
+        if case_name in expected_counts:
+            results['cases'][case_name]['expected_count'] = expected_counts[case_name]
+        results['benchmarks'][f"{case_name}/total"] = total
+        for stage, stage_timings in stage_samples.items():
+            results['benchmarks'][f"{case_name}/{stage}"] = summarize(stage_timings)
+
+    return finish(results, args, 'pipeline')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Rendering benchmark: label colouring and the two component overlays on a
+frame with many components, with every text level of detail.
+
+Usage:
+    python -m benchmarks.bench_rendering
+    python -m benchmarks.bench_rendering --components 1000,10000,50000 --repeat 3
+    python -m benchmarks.bench_rendering --save-baseline
+
+Every case lays `--components` rectangles of random size on a regular grid,
+labels them with connectedComponentsWithStats and marks every other one as
+a counted car, so the timings depend only on the number and size of the
+components, not on the pipeline parameters.
+"""
+
+import argparse
+import os
+import sys
+
+import cv2
+import numpy as np
+
+from app.core.image_processor import draw_detections, draw_enhanced_component_stats, visualize_labels
+from benchmarks.common import REPO_ROOT, add_baseline_arguments, finish, machine_metadata, summarize, time_call
+
+# Grid cell of one component, (width, height) in pixels
+CELL_SIZE = (40, 30)
+TEXT_LEVELS = (('text_all', True), ('text_auto', 'auto'), ('text_none', False))
+
+
+def build_components(count, seed=0):
+    """Return (image, labels, num_labels, stats, centroids, valid) for `count` components."""
+    rng = np.random.default_rng(seed)
+    columns = max(1, int(np.ceil(np.sqrt(count * CELL_SIZE[1] / CELL_SIZE[0]))))
+    rows = -(-count // columns)
+    mask = np.zeros((rows * CELL_SIZE[1], columns * CELL_SIZE[0]), np.uint8)
+    for index in range(count):
+        x = (index % columns) * CELL_SIZE[0] + 2
+        y = (index // columns) * CELL_SIZE[1] + 2
+        w = int(rng.integers(6, CELL_SIZE[0] - 4))
+        h = int(rng.integers(4, CELL_SIZE[1] - 4))
+        cv2.rectangle(mask, (x, y), (x + w, y + h), 255, -1)
+    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    image = np.full(mask.shape + (3,), 96, np.uint8)
+    valid = list(range(1, num_labels, 2))
+    return image, labels, num_labels, stats, centroids, valid
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the visualization rendering")
+    parser.add_argument('--components', default='10000',
+                        help='Comma-separated component counts (default: 10000)')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed rounds per case')
+    parser.add_argument('--warmup', type=int, default=1, help='Untimed rounds per case')
+    add_baseline_arguments(parser)
+    parser.set_defaults(baseline=os.path.join(REPO_ROOT, 'benchmarks', 'baseline-rendering.json'))
+    args = parser.parse_args(argv)
+
+    results = {
+        'suite': 'rendering',
+        'metadata': machine_metadata(),
+        'config': {'repeat': args.repeat, 'warmup': args.warmup, 'cell_size': CELL_SIZE},
+        'cases': {},
+        'benchmarks': {},
+    }
+
+    for count in (int(value) for value in args.components.split(',') if value.strip()):
+        image, labels, num_labels, stats, centroids, valid = build_components(count)
+        height, width = image.shape[:2]
+        case = f"{count}components"
+        results['cases'][case] = {'width': width, 'height': height, 'components': num_labels - 1}
+        print(f"{case} ({width}x{height})")
+
+        runners = {
+            'label_colors': lambda: visualize_labels(labels, max_label=num_labels - 1),
+        }
+        for level_name, level in TEXT_LEVELS:
+            runners[f"stats_overlay/{level_name}"] = (
+                lambda level=level: draw_enhanced_component_stats(image, stats, centroids, valid, 100, 20000,
+                                                                  text=level)
+            )
+            runners[f"final_overlay/{level_name}"] = (
+                lambda level=level: draw_detections(image, stats, valid, text=level)
+            )
+        for name, runner in runners.items():
+            summary = summarize(time_call(runner, args.repeat, args.warmup))
+            results['benchmarks'][f"{case}/{name}"] = summary
+            print(f"  {name}: median {summary['median'] * 1000:.1f}ms")
+
+    return finish(results, args, 'rendering')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
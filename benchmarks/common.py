@@ -0,0 +1,162 @@
+"""
+Shared helpers for the benchmark scripts: timing statistics, machine
+metadata, JSON result files and comparison against a stored baseline.
+"""
+
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, 'benchmarks', 'baseline.json')
+
+
+def summarize(samples):
+    """Return min/median/mean/stdev/max (seconds) of a list of timings."""
+    samples = list(samples)
+    return {
+        'rounds': len(samples),
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.fmean(samples) if hasattr(statistics, 'fmean') else statistics.mean(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'max': max(samples),
+    }
+
+
+def time_call(function, repeat=5, warmup=1):
+    """Call `function` warmup + repeat times and return the timed samples in seconds."""
+    for _ in range(warmup):
+        function()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _git_revision():
+    try:
+        output = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+            capture_output=True, text=True, timeout=5
+        )
+        return output.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def machine_metadata():
+    """Describe the machine and library versions the benchmark ran on."""
+    import cv2
+    import numpy as np
+
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'hostname': socket.gethostname(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'opencv_threads': cv2.getNumThreads(),
+        'git_revision': _git_revision(),
+    }
+
+
+def write_results(results, output_path=None, prefix='bench'):
+    """Write `results` as JSON; defaults to benchmarks/results/<prefix>-<timestamp>.json."""
+    if output_path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output_path = os.path.join(RESULTS_DIR, f'{prefix}-{stamp}.json')
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    return output_path
+
+
+def load_results(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_to_baseline(current, baseline, threshold=0.10, min_delta=0.0005, statistic='median'):
+    """
+    Compare the benchmarks of two result files.
+
+    Both files map benchmark names to timing summaries under 'benchmarks'.
+    A benchmark regresses when its `statistic` grew by more than `threshold`
+    (a fraction, 0.10 = 10%) relative to the baseline and by more than
+    `min_delta` seconds, so sub-millisecond stages do not flag timer noise.
+
+    Returns:
+        list of dicts with name, baseline, current, ratio and regressed flag,
+        for every benchmark present in both files
+    """
+    rows = []
+    baseline_benchmarks = baseline.get('benchmarks', {})
+    for name, summary in sorted(current.get('benchmarks', {}).items()):
+        reference = baseline_benchmarks.get(name)
+        if reference is None or not reference.get(statistic):
+            continue
+        ratio = summary[statistic] / reference[statistic]
+        rows.append({
+            'name': name,
+            'baseline': reference[statistic],
+            'current': summary[statistic],
+            'ratio': ratio,
+            'regressed': ratio > 1.0 + threshold and summary[statistic] - reference[statistic] > min_delta,
+        })
+    return rows
+
+
+def print_comparison(rows, threshold):
+    """Print a comparison table and return the number of regressions."""
+    regressions = 0
+    print(f"\n{'benchmark':<58} {'baseline':>10} {'current':>10} {'change':>8}")
+    for row in rows:
+        marker = '  REGRESSION' if row['regressed'] else ''
+        regressions += row['regressed']
+        print(f"{row['name']:<58} {row['baseline'] * 1000:>8.2f}ms {row['current'] * 1000:>8.2f}ms "
+              f"{(row['ratio'] - 1.0) * 100:>+7.1f}%{marker}")
+    print(f"\n{regressions} regression(s) above {threshold * 100:.0f}%")
+    return regressions
+
+
+def add_baseline_arguments(parser):
+    """Add the output/baseline options shared by every benchmark script."""
+    parser.add_argument('--output', help='JSON file for the results (default: benchmarks/results/)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='Baseline JSON to compare against (default: benchmarks/baseline.json)')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Allowed slowdown before flagging a regression, as a fraction (default: 0.10)')
+    parser.add_argument('--min-delta-ms', type=float, default=0.5,
+                        help='Ignore slowdowns smaller than this many milliseconds (default: 0.5)')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Also store these results as the new baseline')
+
+
+def finish(results, args, prefix):
+    """Write results, optionally refresh the baseline and compare; returns the exit code."""
+    output_path = write_results(results, args.output, prefix)
+    print(f"\nResults written to {output_path}")
+    if args.save_baseline:
+        write_results(results, args.baseline)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+    if os.path.exists(args.baseline):
+        rows = compare_to_baseline(results, load_results(args.baseline), args.threshold,
+                                   args.min_delta_ms / 1000.0)
+        return 1 if print_comparison(rows, args.threshold) else 0
+    print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+    return 0
@@ -1,9 +1,15 @@
 import sys
 import os
-from PyQt5.QtWidgets import QApplication
-from app.ui.main_window import MainWindow
 
 def main():
+    # Any argument selects the command line interface (evaluate, generate, ...)
+    if len(sys.argv) > 1:
+        from app.cli import main as cli_main
+        sys.exit(cli_main(sys.argv[1:]))
+
+    from PyQt5.QtWidgets import QApplication
+    from app.ui.main_window import MainWindow
+
     app = QApplication(sys.argv)
     
     # Set application properties
@@ -0,0 +1,69 @@
+"""
+Cancel-to-return latency of the pipeline on a 12 MP frame.
+
+A timer thread cancels the run at points spread over its whole duration;
+every run must raise ProcessingCancelled within CANCEL_LATENCY_BOUND of the
+cancel() call, whichever stage it interrupts.
+"""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.core.cancellation import CancellationToken, ProcessingCancelled
+from app.core.image_processor import run_pipeline
+from app.core.synthetic_scene import generate_scene
+
+CANCEL_LATENCY_BOUND = 0.05
+FRAME_SIZE = (4000, 3000)  # 12 MP
+CANCEL_POINTS = 16
+
+
+@pytest.fixture(scope='module')
+def frame():
+    return generate_scene(*FRAME_SIZE, car_count=200, seed=26).image
+
+
+def cancelled_run_latency(frame, delay):
+    """
+    Cancel a run after `delay` seconds; returns the seconds from cancel() to
+    the exception, or None when the run finished before the cancel.
+    """
+    token = CancellationToken()
+    cancelled_at = []
+
+    def cancel():
+        cancelled_at.append(time.perf_counter())
+        token.cancel()
+
+    timer = threading.Timer(delay, cancel)
+    timer.start()
+    try:
+        run_pipeline(frame, None, cancel_token=token)
+    except ProcessingCancelled:
+        return time.perf_counter() - cancelled_at[0]
+    finally:
+        timer.cancel()
+    return None
+
+
+def test_cancel_latency_is_bounded(frame):
+    start = time.perf_counter()
+    run_pipeline(frame, None)
+    duration = time.perf_counter() - start
+
+    latencies = [cancelled_run_latency(frame, delay)
+                 for delay in np.linspace(0.02, 0.9, CANCEL_POINTS) * duration]
+    # Run times vary; a late cancel may miss a run that finished early
+    latencies = [latency for latency in latencies if latency is not None]
+    assert len(latencies) >= CANCEL_POINTS // 2
+    assert max(latencies) < CANCEL_LATENCY_BOUND, [round(latency * 1000, 1) for latency in latencies]
+
+
+def test_cancel_before_start_raises_immediately(frame):
+    token = CancellationToken()
+    token.cancel()
+    with pytest.raises(ProcessingCancelled):
+        run_pipeline(frame, None, cancel_token=token)
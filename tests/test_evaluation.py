@@ -0,0 +1,16 @@
+"""The evaluation of a generated dataset measures real accuracy, not an empty match."""
+
+from app.core.evaluation import EvaluationProfile, evaluate_profiles, load_labeled_set
+from app.core.synthetic_scene import generate_dataset
+
+
+def test_generated_scene_has_nonzero_f1(tmp_path):
+    generate_dataset(str(tmp_path), 1, 1600, 1200, 40, seed=32)
+    labeled = load_labeled_set(str(tmp_path))
+    assert len(labeled) == 1 and labeled[0].has_boxes
+
+    reports = evaluate_profiles(labeled, [EvaluationProfile('auto')])
+
+    summary = reports[0].summary()
+    assert summary['f1'] > 0.5
+    assert summary['mae'] <= 2
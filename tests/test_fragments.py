@@ -0,0 +1,60 @@
+"""Sub-threshold fragments of one car are regrouped; unrelated fragments stay apart."""
+
+import cv2
+import numpy as np
+
+from app.core.fragments import FRAGMENT_MAX_GAP, merge_fragments
+from app.core.image_processor import run_pipeline
+
+
+def tables(boxes, areas, centroids):
+    """Stats and centroid tables with a background row 0."""
+    stats = np.array([(0, 0, 1000, 1000, 0)] + [box + (area,) for box, area in zip(boxes, areas)], np.int32)
+    return stats, np.array([(0.0, 0.0)] + centroids, np.float64)
+
+
+def test_aligned_fragments_are_joined():
+    stats, centroids = tables([(10, 0, 20, 10), (10, 15, 20, 10)], [150, 50], [(20.0, 5.0), (20.0, 20.0)])
+
+    rows, merged_centroids, members = merge_fragments(stats, centroids, [1, 2])
+
+    assert rows.tolist() == [[10, 0, 20, 25, 200]]
+    assert np.allclose(merged_centroids, [(20.0, 8.75)])
+    assert members == [[1, 2]]
+
+
+def test_diagonal_and_distant_fragments_stay_apart():
+    gap = FRAGMENT_MAX_GAP + 1
+    stats, centroids = tables(
+        [(100, 100, 20, 10), (125, 115, 20, 10), (300, 0, 20, 10), (300, 10 + gap, 20, 10)],
+        [150, 150, 150, 150],
+        [(110.0, 105.0), (135.0, 120.0), (310.0, 5.0), (310.0, 15.0 + gap)],
+    )
+
+    rows, merged_centroids, members = merge_fragments(stats, centroids, [1, 2, 3, 4])
+
+    assert len(rows) == len(merged_centroids) == len(members) == 0
+
+
+def test_fewer_than_two_fragments_is_empty():
+    stats, centroids = tables([(10, 0, 20, 10)], [150], [(20.0, 5.0)])
+
+    for indices in ([], [1]):
+        rows, merged_centroids, members = merge_fragments(stats, centroids, indices)
+        assert rows.shape == (0, 5) and merged_centroids.shape == (0, 2) and members == []
+
+
+def test_pipeline_counts_regrouped_fragments():
+    # Two dark halves of one car, each below min_area, 12 px apart: more
+    # than the closing bridges, within the fragment gap
+    image = np.full((400, 400, 3), 150, np.uint8)
+    cv2.rectangle(image, (100, 100), (135, 115), (40, 40, 40), -1)
+    cv2.rectangle(image, (100, 128), (135, 143), (40, 40, 40), -1)
+
+    assert run_pipeline(image, {'merge_fragments': False}).car_count == 0
+    result = run_pipeline(image, {'merge_fragments': True})
+
+    assert result.car_count == 1
+    assert "+1 grupos de fragmentos" in result.descriptions[-2]
+    car = result.detections[0]
+    assert car['y'] < 110 and car['y'] + car['h'] > 135
@@ -0,0 +1,154 @@
+"""Connection handling and endpoints of the counting server, over localhost."""
+
+import asyncio
+import json
+import threading
+
+import cv2
+import numpy as np
+
+from app.core import image_processor
+from app.core.synthetic_scene import generate_scene
+from app.services import http_server
+from app.services.http_server import CountingServer
+
+
+async def exchange(port, payload):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(payload)
+    await writer.drain()
+    response = await asyncio.wait_for(reader.read(), timeout=30)
+    writer.close()
+    return response
+
+
+async def request(port, method, path, body=b'', content_type='application/octet-stream'):
+    """Send one request; returns (status, headers, decoded JSON body)."""
+    head = f"{method} {path} HTTP/1.1\r\nConnection: close\r\n"
+    if method == 'POST':
+        head += f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+    response = await exchange(port, head.encode('latin-1') + b'\r\n' + body)
+    head, _, payload = response.partition(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    headers = dict(line.split(': ', 1) for line in lines[1:])
+    return int(lines[0].split()[1]), headers, json.loads(payload)
+
+
+def run_with_server(session, **options):
+    """Run `session(server)` against a started server and return its result."""
+    async def run():
+        server = CountingServer(port=0, **dict({'workers': 1, 'queue_size': 1}, **options))
+        await server.start()
+        try:
+            return await session(server)
+        finally:
+            await server.stop()
+    return asyncio.run(run())
+
+
+def scene_png():
+    scene = generate_scene(800, 600, car_count=8, seed=36)
+    return cv2.imencode('.png', scene.image)[1].tobytes(), scene.car_count
+
+
+def test_error_before_body_closes_connection():
+    # The unread body must not be parsed as a second request
+    body = b'GET /health HTTP/1.1\r\n\r\n'
+    response = run_with_server(
+        lambda server: exchange(server.port, b'POST /count HTTP/1.1\r\nContent-Length: x\r\n\r\n' + body)
+    )
+    assert response.startswith(b'HTTP/1.1 400')
+    assert b'Connection: close' in response
+    assert response.count(b'HTTP/1.1 ') == 1
+
+
+def test_keep_alive_after_complete_request():
+    response = run_with_server(lambda server: exchange(
+        server.port, b'GET /health HTTP/1.1\r\n\r\nGET /health HTTP/1.1\r\nConnection: close\r\n\r\n'
+    ))
+    assert response.count(b'HTTP/1.1 200') == 2
+
+
+def test_count_upload_and_path(tmp_path):
+    data, car_count = scene_png()
+    image_path = tmp_path / 'scene.png'
+    image_path.write_bytes(data)
+
+    async def session(server):
+        upload = await request(server.port, 'POST', '/count', data)
+        by_path = await request(server.port, 'POST', '/count?detections=0',
+                                json.dumps({'path': str(image_path)}).encode('utf-8'), 'application/json')
+        return upload, by_path
+
+    (status, _, upload), (path_status, _, by_path) = run_with_server(session, root=str(tmp_path))
+    assert status == path_status == 200
+    assert abs(upload['count'] - car_count) <= 1
+    assert (upload['width'], upload['height']) == (800, 600)
+    assert len(upload['detections']) == upload['count']
+    assert by_path['count'] == upload['count']
+    assert 'detections' not in by_path
+
+
+def test_unknown_route_missing_file_and_undecodable_upload(tmp_path):
+    async def session(server):
+        return (
+            await request(server.port, 'GET', '/nowhere'),
+            await request(server.port, 'POST', '/count',
+                          json.dumps({'path': str(tmp_path / 'missing.png')}).encode('utf-8'), 'application/json'),
+            await request(server.port, 'POST', '/count', b'not an image'),
+        )
+
+    route, missing, undecodable = run_with_server(session)
+    assert route[0] == 404 and 'error' in route[2]
+    assert missing[0] == 404
+    assert undecodable[0] == 422
+
+
+def test_pipeline_failure_answers_500(monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("labeling broke")
+    monkeypatch.setattr(image_processor, 'connected_components_in_bands', fail)
+
+    status, _, document = run_with_server(lambda server: request(server.port, 'POST', '/count', scene_png()[0]))
+    assert status == 500
+    assert 'labeling broke' in document['error']
+
+
+def test_full_queue_answers_503_with_retry_after(monkeypatch):
+    release = threading.Event()
+
+    def blocked_count(request):
+        release.wait(10)
+        return {'count': 0}
+    monkeypatch.setattr(http_server, 'count_image', blocked_count)
+
+    async def session(server):
+        # One upload occupies the worker and one the single queue slot; each
+        # has its own bytes so they are not shared as one run
+        running = asyncio.create_task(request(server.port, 'POST', '/count', b'first'))
+        while server._busy == 0:
+            await asyncio.sleep(0.01)
+        queued = asyncio.create_task(request(server.port, 'POST', '/count', b'second'))
+        while server._queue.qsize() == 0:
+            await asyncio.sleep(0.01)
+        rejected = await request(server.port, 'POST', '/count', b'third')
+        release.set()
+        return rejected, await running, await queued
+
+    (status, headers, _), running, queued = run_with_server(session)
+    assert status == 503
+    assert headers['Retry-After'] == '1'
+    assert running[0] == queued[0] == 200
+
+
+def test_stats_reports_latency_histograms():
+    async def session(server):
+        await request(server.port, 'GET', '/health')
+        return await request(server.port, 'GET', '/stats')
+
+    status, _, stats = run_with_server(session)
+    assert status == 200
+    health = stats['latency_seconds']['GET /health']
+    assert health['count'] >= 1
+    assert {'sum', 'mean', 'p50', 'p95', 'buckets'} <= set(health)
+    assert stats['responses']['GET /health']['200'] >= 1
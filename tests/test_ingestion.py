@@ -0,0 +1,45 @@
+"""Unreadable files surface as per-image errors instead of aborting the batch."""
+
+import asyncio
+
+import cv2
+import numpy as np
+
+from app.core import image_processor
+from app.services.ingestion import IngestionPipeline, count_directory
+
+
+def collect(pipeline):
+    async def run():
+        return [item async for item in pipeline.images()]
+    return {item.path: item for item in asyncio.run(run())}
+
+
+def test_empty_and_corrupt_files_yield_errors(tmp_path):
+    valid = tmp_path / 'valid.png'
+    cv2.imwrite(str(valid), np.full((8, 8, 3), 128, np.uint8))
+    empty = tmp_path / 'empty.jpg'
+    empty.write_bytes(b'')
+    corrupt = tmp_path / 'corrupt.png'
+    corrupt.write_bytes(b'\x89PNG not really')
+
+    items = collect(IngestionPipeline(str(tmp_path), io_concurrency=2, decode_workers=2))
+
+    assert set(items) == {str(valid), str(empty), str(corrupt)}
+    assert items[str(valid)].error is None and items[str(valid)].image.shape == (8, 8, 3)
+    for path in (empty, corrupt):
+        assert items[str(path)].image is None
+        assert items[str(path)].error
+
+
+def test_pipeline_failure_counts_as_failed(tmp_path, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("labeling broke")
+    monkeypatch.setattr(image_processor, 'connected_components_in_bands', fail)
+    cv2.imwrite(str(tmp_path / 'valid.png'), np.full((64, 64, 3), 128, np.uint8))
+
+    results = []
+    counted, failed, _ = count_directory(str(tmp_path), on_result=results.append, workers=1)
+
+    assert (counted, failed) == (0, 1)
+    assert 'labeling broke' in results[0].error
@@ -0,0 +1,22 @@
+"""The console output follows sys.stdout, so a replaced and closed stdout is never flushed."""
+
+import contextlib
+import io
+import logging
+
+from app.utils.logger import StructuredLogger
+
+
+def test_console_writes_to_current_stdout_and_survives_closed_stream(capsys):
+    logger = StructuredLogger(name='CarCounterTest', level=logging.INFO)
+    captured = io.StringIO()
+    with contextlib.redirect_stdout(captured):
+        logger.info("Inside redirect", step_index=3)
+        logger.shutdown()
+    assert "Inside redirect | step_index=3" in captured.getvalue()
+
+    captured.close()
+    logger.info("After redirect")
+    logger.shutdown()
+
+    assert "After redirect" in capsys.readouterr().out
@@ -0,0 +1,31 @@
+"""Re-processing an image replaces its stored result."""
+
+import numpy as np
+
+from app.core.detections import DETECTION_DTYPE
+from app.services.results_store import ResultsStore
+
+
+def detections(count):
+    return np.zeros(count, dtype=DETECTION_DTYPE)
+
+
+def test_same_version_and_profile_is_replaced(tmp_path):
+    image = tmp_path / 'norte' / 'frame.jpg'
+    image.parent.mkdir()
+    image.write_bytes(b'x')
+    store = ResultsStore(str(tmp_path / 'results.sqlite'))
+
+    store.add(str(image), 3, detections(3), {'min_area': 100})
+    store.flush()
+    store.add(str(image), 5, detections(5), {'min_area': 100})
+    store.add(str(image), 4, detections(4), {'min_area': 200})
+    store.close()
+
+    store = ResultsStore(str(tmp_path / 'results.sqlite'))
+    rows = store.images()
+    assert sorted(row['count'] for row in rows) == [4, 5]
+    assert [(images, cars) for _, images, cars in store.hourly_counts()] == [(2, 9)]
+    assert sum(len(store.detections(row['id'])) for row in rows) == 9
+    store.close()
+
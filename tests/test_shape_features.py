@@ -0,0 +1,82 @@
+"""Shape features of known shapes, measured only for the filter or for the overlay that shows them."""
+
+import cv2
+import numpy as np
+import pytest
+
+from app.core.features import component_features, feature_column
+from app.core.image_processor import run_pipeline
+from app.core.instrumentation import PipelineInstrumentation
+from app.core.synthetic_scene import generate_scene
+
+PARAMS = {'c_value': 10}
+
+
+@pytest.fixture(scope='module')
+def frame():
+    return generate_scene(1600, 1200, car_count=60, seed=48).image
+
+
+def stage_names(instrumentation):
+    return {record.name for record in instrumentation.records}
+
+
+def test_features_skipped_unless_requested(frame):
+    instrumentation = PipelineInstrumentation()
+    run_pipeline(frame, PARAMS, instrumentation=instrumentation, lazy_visualizations=True)
+    assert 'shape_features' not in stage_names(instrumentation)
+
+    instrumentation = PipelineInstrumentation()
+    run_pipeline(frame, dict(PARAMS, shape_features=True), instrumentation=instrumentation,
+                 lazy_visualizations=True)
+    assert 'shape_features' in stage_names(instrumentation)
+
+
+def test_lazy_overlay_measures_features_on_render(frame):
+    eager = run_pipeline(frame, PARAMS)
+    lazy = run_pipeline(frame, PARAMS, lazy_visualizations=True)
+
+    stats_stage = len(lazy.images) - 2
+    assert lazy.images[stats_stage] is None
+    assert np.array_equal(lazy.stage_sources[stats_stage].render(), eager.images[stats_stage])
+
+
+@pytest.fixture(scope='module')
+def shapes():
+    """Labels 1-3: a 40x20 rectangle, an L of two 90x40 bars and an ellipse rotated by 30 degrees."""
+    mask = np.zeros((200, 300), np.uint8)
+    mask[20:40, 20:60] = 255
+    mask[60:150, 40:80] = 255
+    mask[150:190, 40:130] = 255
+    cv2.ellipse(mask, (220, 100), (50, 20), 30, 0, 360, 255, -1)
+    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    assert num_labels == 4
+    return labels, stats
+
+
+def test_rectangle_features(shapes):
+    labels, stats = shapes
+    rectangle = component_features(labels, stats, [1])[0]
+
+    assert rectangle['solidity'] == pytest.approx(1.0)
+    assert rectangle['perimeter'] == pytest.approx(2 * (40 + 20), rel=0.05)
+    assert rectangle['orientation'] == pytest.approx(0.0)
+
+
+def test_l_shape_and_rotated_ellipse(shapes):
+    labels, stats = shapes
+    l_shape, ellipse = component_features(labels, stats, [2, 3])
+
+    assert l_shape['solidity'] == pytest.approx(0.8, abs=0.05)
+    assert ellipse['orientation'] == pytest.approx(30.0, abs=1.0)
+    assert ellipse['solidity'] > 0.95
+
+
+def test_unmeasured_labels_stay_nan(shapes):
+    labels, stats = shapes
+    features = component_features(labels, stats, [2])
+
+    solidity = feature_column(features, 'solidity', len(stats))
+
+    assert np.isnan(solidity[[0, 1, 3]]).all()
+    assert solidity[2] == pytest.approx(features['solidity'][0])
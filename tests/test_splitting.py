@@ -0,0 +1,75 @@
+"""Welded cars split along their notches and bridges; a single car stays whole."""
+
+import cv2
+import numpy as np
+import pytest
+
+from app.core.splitting import split_component
+
+
+def canvas():
+    return np.zeros((200, 360), np.uint8)
+
+
+def bridge():
+    mask = canvas()
+    mask[50:140, 40:80] = 255
+    mask[50:140, 100:140] = 255
+    mask[90:98, 80:100] = 255
+    return mask
+
+
+def side_by_side():
+    mask = canvas()
+    mask[50:140, 40:80] = 255
+    mask[50:140, 86:126] = 255
+    mask[75:115, 80:86] = 255
+    return mask
+
+
+def row_of_three():
+    mask = canvas()
+    mask[80:120, 30:300] = 255
+    for x in (120, 210):
+        mask[80:88, x - 3:x + 3] = 0
+        mask[112:120, x - 3:x + 3] = 0
+    return mask
+
+
+def l_shape():
+    mask = canvas()
+    mask[30:120, 40:80] = 255
+    mask[120:160, 40:130] = 255
+    return mask
+
+
+def rotated_pair():
+    mask = canvas()
+    for center_x in (140, 185):
+        corners = cv2.boxPoints(((center_x, 100), (90, 40), 60)).astype(np.int32)
+        cv2.fillPoly(mask, [corners], 255)
+    return mask
+
+
+@pytest.mark.parametrize('shape, parts', [
+    (bridge, 2), (side_by_side, 2), (row_of_three, 3), (l_shape, 2), (rotated_pair, 2),
+])
+def test_welded_cars_split(shape, parts):
+    mask = shape()
+    _, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+
+    rows, centroids = split_component(labels, stats, 1, min_part_area=800)
+
+    assert len(rows) == parts == len(centroids)
+    assert rows[:, 4].sum() == stats[1, 4]
+    assert rows[:, 4].min() >= 0.5 * stats[1, 4] / parts
+
+
+def test_single_car_stays_whole():
+    mask = canvas()
+    mask[60:100, 60:150] = 255
+    _, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+
+    rows, _ = split_component(labels, stats, 1, min_part_area=800, part_area=3600)
+
+    assert len(rows) == 0
@@ -0,0 +1,14 @@
+"""The default pipeline counts the cars of a default generated scene."""
+
+from app.core.image_processor import run_pipeline
+from app.core.synthetic_scene import generate_scene
+
+COUNT_TOLERANCE = 2
+
+
+def test_default_pipeline_counts_default_scene():
+    scene = generate_scene(1600, 1200, car_count=40, seed=31)
+
+    result = run_pipeline(scene.image)
+
+    assert abs(result.car_count - scene.car_count) <= COUNT_TOLERANCE
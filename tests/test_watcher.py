@@ -0,0 +1,46 @@
+"""Per-file processing of the watch daemon."""
+
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from app.services.watcher import WatchDaemon, _process_file
+
+
+def test_undecodable_files_are_errors_not_exceptions(tmp_path):
+    empty = tmp_path / 'empty.jpg'
+    empty.write_bytes(b'')
+    corrupt = tmp_path / 'corrupt.png'
+    corrupt.write_bytes(b'\x89PNG not really')
+    for path in (empty, corrupt):
+        stat = os.stat(path)
+        result = _process_file(str(path), stat.st_mtime_ns, stat.st_size, None, None, time.time())
+        assert result.error and result.car_count is None
+
+
+def test_latency_counts_from_observation_not_mtime(tmp_path):
+    image = tmp_path / 'old.png'
+    cv2.imwrite(str(image), np.full((64, 64, 3), 128, np.uint8))
+    os.utime(image, (0, 0))  # a copy that kept a 1970 timestamp
+    stat = os.stat(image)
+    result = _process_file(str(image), stat.st_mtime_ns, stat.st_size, None, None, time.time())
+    assert result.error is None
+    assert result.latency < 60
+
+
+def test_failed_file_is_indexed_and_not_retried(tmp_path):
+    (tmp_path / 'empty.jpg').write_bytes(b'')
+    index = str(tmp_path / 'index.sqlite')
+    results = []
+    for _ in range(2):
+        daemon = WatchDaemon(str(tmp_path), index, on_result=results.append, workers=1, polling=True,
+                             interval=0.05)
+        thread = threading.Thread(target=daemon.run)
+        thread.start()
+        time.sleep(0.5)  # the initial scan plus a few polls
+        daemon.stop()
+        thread.join(5)
+    assert len(results) == 1 and results[0].error